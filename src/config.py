@@ -1,3 +1,4 @@
+from typing import Dict, List
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -7,18 +8,154 @@ class Settings(BaseSettings):
     GITLAB_PROJECT_ID: str
 
     # GitHub Config
-    GITHUB_TOKEN: str
+    GITHUB_TOKEN: str = ""  # not needed when authenticating as a GitHub App
     GITHUB_REPO: str
+    GITHUB_API_URL: str = "https://api.github.com"
+    # PyGithub throttles requests to respect GitHub's secondary rate limits.
+    GITHUB_SECONDS_BETWEEN_REQUESTS: float = 0.25
+    GITHUB_SECONDS_BETWEEN_WRITES: float = 1.0
     STARTING_BRANCH_NAME: str = "master"
+    # GitHub App authentication, used instead of GITHUB_TOKEN when GITHUB_APP_ID
+    # is set. The installation is looked up from GITHUB_REPO unless given.
+    GITHUB_APP_ID: int = 0
+    GITHUB_APP_PRIVATE_KEY_PATH: str = ""
+    GITHUB_APP_INSTALLATION_ID: int = 0
+    GITHUB_APP_TOKEN_CACHE_PATH: str = "data/github_app_token.json"
+    GITHUB_APP_TOKEN_REFRESH_MARGIN: int = 300
 
     # Jules AI Config
     JULES_API_KEY: str
+    # Further keys (accounts) pooled with JULES_API_KEY, as a JSON list. Each key
+    # runs up to JULES_MAX_CONCURRENT_SESSIONS sessions and, once rate limited or
+    # rejected, is skipped for JULES_KEY_COOLDOWN_SECONDS (or the Retry-After).
+    JULES_API_KEYS: List[str] = []
+    JULES_API_URL: str = "https://jules.googleapis.com/v1alpha"
     JULES_MAX_CONCURRENT_SESSIONS: int = 3
+    JULES_KEY_COOLDOWN_SECONDS: int = 300
+    JULES_ACTIVITY_PAGE_SIZE: int = 50
+    JULES_STALL_MINUTES: int = 60
+    # Sessions are polled less often while far from their expected completion,
+    # once at least JULES_ETA_MIN_SAMPLES sessions of the same type have completed.
+    JULES_ETA_MIN_SAMPLES: int = 5
+    JULES_MAX_POLL_INTERVAL: int = 1800
+
+    # Prompt size budget for delegated issues (estimated at ~4 characters per token)
+    PROMPT_MAX_TOKENS: int = 12000
+    PROMPT_GUIDELINES_MAX_TOKENS: int = 3000
+
+    # Image attachments sent to Jules: larger images are downscaled and re-encoded
+    # ("webp" or "jpeg"), near-duplicates within ATTACHMENT_DUPLICATE_DISTANCE bits
+    # of dHash are dropped, and the base64 payload is capped at ATTACHMENT_PAYLOAD_BUDGET.
+    ATTACHMENT_MAX_DIMENSION: int = 2048
+    ATTACHMENT_IMAGE_FORMAT: str = "webp"
+    ATTACHMENT_IMAGE_QUALITY: int = 85
+    ATTACHMENT_DUPLICATE_DISTANCE: int = 4
+    ATTACHMENT_PAYLOAD_BUDGET: int = 8 * 1024 * 1024
+    ATTACHMENT_WORKERS: int = 2
+
+    # Delegation priority: higher scores are delegated first. Every hour of
+    # task age adds DELEGATION_AGE_WEIGHT, so a red PR is worth
+    # DELEGATION_RED_PR_WEIGHT hours of waiting by default.
+    DELEGATION_LABEL_WEIGHTS: Dict[str, float] = {}
+    DELEGATION_AGE_WEIGHT: float = 1.0
+    DELEGATION_RED_PR_WEIGHT: float = 24.0
+
+    # Resilience: HTTP timeouts, retries and circuit breakers
+    HTTP_CONNECT_TIMEOUT: float = 5.0
+    HTTP_READ_TIMEOUT: float = 30.0
+    GITHUB_MAX_RETRIES: int = 2
+    BREAKER_ENABLED: bool = True
+    # Consecutive failures that open an endpoint-class breaker / a whole-backend breaker.
+    BREAKER_FAILURE_THRESHOLD: int = 5
+    BREAKER_BACKEND_FAILURE_THRESHOLD: int = 15
+    BREAKER_RESET_SECONDS: float = 30.0
+
+    # Conditional-request (ETag / If-Modified-Since) cache for GitHub and GitLab reads
+    HTTP_CACHE_ENABLED: bool = True
+    HTTP_CACHE_PATH: str = "data/http_cache.db"
+    HTTP_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+
+    # Content-addressed store of GitHub blobs fetched for PR syncs
+    BLOB_STORE_ENABLED: bool = True
+    BLOB_STORE_PATH: str = "data/blobs"
+    BLOB_STORE_MAX_BYTES: int = 512 * 1024 * 1024
+
+    # Outbox of pending writes (PR comments and closes)
+    OUTBOX_WORKERS: int = 4
+    OUTBOX_MAX_ATTEMPTS: int = 8
+    OUTBOX_RETRY_BASE_SECONDS: float = 5.0
+    OUTBOX_RETRY_MAX_SECONDS: float = 900.0
+    OUTBOX_POLL_INTERVAL: float = 5.0
 
     # App Config
     LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "text"  # console format, "text" or "json"
+    LOG_DIR: str = ""  # rotating JSON-lines file sink, disabled when empty
+    LOG_FILE_MAX_BYTES: int = 10 * 1024 * 1024
+    LOG_FILE_BACKUP_COUNT: int = 5
+    LOG_SAMPLE_BURST: int = 20
+    LOG_SAMPLE_RATE: int = 50
     POLLING_INTERVAL: int = 60
 
+    # Local mirror of GitHub PR state: incremental refreshes list only PRs
+    # updated since the last one; a full re-listing runs at this interval.
+    PR_MIRROR_FULL_SYNC_INTERVAL: int = 3600
+
+    # Retention: terminal sessions older than RETENTION_DAYS are archived (their
+    # activities exported to RETENTION_EXPORT_DIR, dropped when empty) and the
+    # database is compacted, at most once every RETENTION_INTERVAL seconds.
+    RETENTION_ENABLED: bool = True
+    RETENTION_DAYS: int = 30
+    RETENTION_INTERVAL: int = 86400
+    RETENTION_EXPORT_DIR: str = "data/archive"
+    RETENTION_VACUUM_PAGES: int = 2000
+
+    # Warm restarts: in-memory caches and open circuit breakers are written to
+    # SNAPSHOT_PATH every SNAPSHOT_INTERVAL seconds and at shutdown, and restored
+    # at startup unless the snapshot is older than SNAPSHOT_MAX_AGE.
+    SNAPSHOT_ENABLED: bool = True
+    SNAPSHOT_PATH: str = "data/state_snapshot.json"
+    SNAPSHOT_INTERVAL: int = 300
+    SNAPSHOT_MAX_AGE: int = 86400
+
+    # Cycle time budget, split between phases by relative share; a phase that
+    # runs out of time carries its remaining items over to the next cycle.
+    CYCLE_TIME_BUDGET: float = 300.0
+    CYCLE_PHASE_MIN_SECONDS: float = 5.0
+    CYCLE_PHASE_SHARES: Dict[str, float] = {
+        "refresh_pr_mirror": 1.0,
+        "monitor_sessions": 2.0,
+        "delegate_tasks": 3.0,
+        "sync_github_to_gitlab": 3.0,
+        "sync_gitlab_closures": 1.0,
+        "check_conflicts": 1.0,
+    }
+
+    # Observability
+    METRICS_ENABLED: bool = False
+    METRICS_HOST: str = "0.0.0.0"
+    METRICS_PORT: int = 9100
+    HEALTH_MAX_CYCLE_LAG: int = 600
+    TRACING_ENABLED: bool = False
+    TRACE_EXPORT_FORMAT: str = "jsonl"  # "jsonl" or "otlp"
+    TRACE_EXPORT_PATH: str = ""
+    TRACE_SLOW_CYCLE_THRESHOLD: float = 300.0
+    TRACE_SLOW_CYCLE_DIR: str = "logs/slow_cycles"
+    TRACE_MAX_SPANS_PER_CYCLE: int = 20000
+    # tracemalloc reports every MEMORY_PROFILE_INTERVAL cycles; growth past
+    # MEMORY_GROWTH_ALERT_BYTES logs a warning and dumps an allocation snapshot.
+    MEMORY_PROFILING_ENABLED: bool = False
+    MEMORY_PROFILE_INTERVAL: int = 10
+    MEMORY_PROFILE_FRAMES: int = 1
+    MEMORY_PROFILE_TOP: int = 20
+    MEMORY_GROWTH_ALERT_BYTES: int = 100 * 1024 * 1024
+    MEMORY_REPORT_DIR: str = "logs/memory"
+
+    # Record/replay of API traffic ("off", "record" or "replay")
+    CASSETTE_MODE: str = "off"
+    CASSETTE_PATH: str = "data/cassette.jsonl.gz"
+    CASSETTE_SIMULATE_LATENCY: bool = False
+
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", extra="ignore")
 
 settings = Settings()  # type: ignore
@@ -1,15 +1,20 @@
 import sqlite3
 import os
 import threading
+import time
 from enum import Enum
 from typing import Optional, List, Tuple, Dict
 from src.utils.logger import logger
+from src.utils.metrics import instrument_queries
+from src.utils.tracing import traced
 
 class SessionStatus(str, Enum):
     ACTIVE = "active"
     COMPLETED = "completed"
     FAILED = "failed"
 
+@traced
+@instrument_queries
 class Database:
     def __init__(self, db_path: str = "data/ato.db"):
         self.db_path = db_path
@@ -37,11 +42,132 @@ class Database:
                         status TEXT NOT NULL
                     )
                 """)
+                # Lifecycle columns were added after the first release; migrate older databases in place.
+                cursor.execute("PRAGMA table_info(sessions)")
+                columns = {row[1] for row in cursor.fetchall()}
+                for column in ("created_at", "completed_at", "next_poll_at"):
+                    if column not in columns:
+                        cursor.execute(f"ALTER TABLE sessions ADD COLUMN {column} REAL")
+                # ID of the Jules API key that owns the session; NULL for sessions created before the key pool,
+                # which belong to the first key.
+                if "api_key_id" not in columns:
+                    cursor.execute("ALTER TABLE sessions ADD COLUMN api_key_id TEXT")
+                cursor.execute("CREATE INDEX IF NOT EXISTS idx_sessions_task ON sessions (task_id, task_type)")
+                # Terminal sessions past the retention period (see src/logic/retention.py).
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS sessions_archive (
+                        session_id TEXT PRIMARY KEY,
+                        task_id TEXT NOT NULL,
+                        task_type TEXT NOT NULL,
+                        github_pr_id INTEGER,
+                        gitlab_mr_id INTEGER,
+                        status TEXT NOT NULL,
+                        created_at REAL,
+                        completed_at REAL,
+                        archived_at REAL NOT NULL
+                    )
+                """)
+                cursor.execute("CREATE INDEX IF NOT EXISTS idx_sessions_archive_task ON sessions_archive (task_id, task_type)")
+                # Recreated on every start so databases with the older, sessions-only view pick up the archive.
+                cursor.execute("DROP VIEW IF EXISTS session_duration_stats")
+                cursor.execute("""
+                    CREATE VIEW session_duration_stats AS
+                    SELECT task_type,
+                           COUNT(*) AS samples,
+                           AVG(completed_at - created_at) AS mean_seconds,
+                           MIN(completed_at - created_at) AS min_seconds,
+                           MAX(completed_at - created_at) AS max_seconds
+                    FROM (SELECT task_type, status, created_at, completed_at FROM sessions
+                          UNION ALL
+                          SELECT task_type, status, created_at, completed_at FROM sessions_archive)
+                    WHERE status = 'completed' AND created_at IS NOT NULL AND completed_at IS NOT NULL
+                    GROUP BY task_type
+                """)
                 cursor.execute("""
                     CREATE TABLE IF NOT EXISTS synced_prs (
                         github_pr_id INTEGER PRIMARY KEY,
                         gitlab_mr_iid INTEGER NOT NULL,
-                        gitlab_issue_id INTEGER
+                        gitlab_issue_id INTEGER,
+                        head_sha TEXT
+                    )
+                """)
+                cursor.execute("PRAGMA table_info(synced_prs)")
+                if "head_sha" not in {row[1] for row in cursor.fetchall()}:
+                    cursor.execute("ALTER TABLE synced_prs ADD COLUMN head_sha TEXT")
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS activity_cursors (
+                        session_id TEXT PRIMARY KEY,
+                        page_token TEXT,
+                        last_activity_id TEXT,
+                        last_create_time TEXT,
+                        last_activity_at REAL NOT NULL
+                    )
+                """)
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS session_activities (
+                        session_id TEXT NOT NULL,
+                        activity_id TEXT NOT NULL,
+                        create_time TEXT,
+                        kind TEXT NOT NULL,
+                        summary TEXT,
+                        PRIMARY KEY (session_id, activity_id)
+                    )
+                """)
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS work_queue (
+                        task_type TEXT NOT NULL,
+                        task_id TEXT NOT NULL,
+                        sort_key REAL NOT NULL,
+                        head_sha TEXT,
+                        PRIMARY KEY (task_type, task_id)
+                    )
+                """)
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS outbox (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        idempotency_key TEXT NOT NULL UNIQUE,
+                        action TEXT NOT NULL,
+                        payload TEXT NOT NULL,
+                        status TEXT NOT NULL,
+                        attempts INTEGER NOT NULL DEFAULT 0,
+                        next_attempt_at REAL NOT NULL,
+                        created_at REAL NOT NULL,
+                        last_error TEXT
+                    )
+                """)
+                cursor.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, next_attempt_at)")
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS pr_mirror (
+                        number INTEGER PRIMARY KEY,
+                        state TEXT NOT NULL,
+                        draft INTEGER NOT NULL,
+                        title TEXT NOT NULL,
+                        html_url TEXT,
+                        head_sha TEXT NOT NULL,
+                        head_ref TEXT,
+                        base_sha TEXT,
+                        created_at TEXT,
+                        updated_at TEXT NOT NULL,
+                        mergeable INTEGER,
+                        ci_status TEXT,
+                        comment_count INTEGER,
+                        last_comment TEXT,
+                        comments_at TEXT
+                    )
+                """)
+                cursor.execute("CREATE INDEX IF NOT EXISTS idx_pr_mirror_state ON pr_mirror (state)")
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS kv_state (
+                        key TEXT PRIMARY KEY,
+                        value TEXT
+                    )
+                """)
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS carry_over (
+                        phase TEXT NOT NULL,
+                        item_id TEXT NOT NULL,
+                        position INTEGER NOT NULL,
+                        PRIMARY KEY (phase, item_id)
                     )
                 """)
                 self.conn.commit()
@@ -54,14 +180,15 @@ class Database:
     def add_session(self, session_id: str, task_id: str, task_type: str,
                     github_pr_id: Optional[int] = None,
                     gitlab_mr_id: Optional[int] = None,
-                    status: SessionStatus = SessionStatus.ACTIVE):
+                    status: SessionStatus = SessionStatus.ACTIVE,
+                    api_key_id: Optional[str] = None):
         with self._lock:
             try:
                 cursor = self.conn.cursor()
                 try:
                     cursor.execute(
-                        "INSERT INTO sessions (session_id, task_id, task_type, github_pr_id, gitlab_mr_id, status) VALUES (?, ?, ?, ?, ?, ?)",
-                        (session_id, str(task_id), task_type, github_pr_id, gitlab_mr_id, status.value)
+                        "INSERT INTO sessions (session_id, task_id, task_type, github_pr_id, gitlab_mr_id, status, created_at, api_key_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (session_id, str(task_id), task_type, github_pr_id, gitlab_mr_id, status.value, time.time(), api_key_id)
                     )
                     self.conn.commit()
                 except:
@@ -76,9 +203,10 @@ class Database:
         with self._lock:
             cursor = self.conn.cursor()
             try:
+                completed_at = None if status == SessionStatus.ACTIVE else time.time()
                 cursor.execute(
-                    "UPDATE sessions SET status = ? WHERE session_id = ?",
-                    (status.value, session_id)
+                    "UPDATE sessions SET status = ?, completed_at = ? WHERE session_id = ?",
+                    (status.value, completed_at, session_id)
                 )
                 self.conn.commit()
             except:
@@ -111,6 +239,49 @@ class Database:
             finally:
                 cursor.close()
 
+    def get_session_api_keys(self) -> Dict[str, str]:
+        """Returns {session_id: api_key_id} for active sessions owned by a pooled key."""
+        with self._lock:
+            cursor = self.conn.cursor()
+            try:
+                cursor.execute("SELECT session_id, api_key_id FROM sessions WHERE status = ? AND api_key_id IS NOT NULL",
+                               (SessionStatus.ACTIVE.value,))
+                return dict(cursor.fetchall())
+            finally:
+                cursor.close()
+
+    def get_session_poll_schedule(self) -> Dict[str, Tuple[Optional[float], Optional[float]]]:
+        """Returns {session_id: (created_at, next_poll_at)} for active sessions."""
+        with self._lock:
+            cursor = self.conn.cursor()
+            try:
+                cursor.execute("SELECT session_id, created_at, next_poll_at FROM sessions WHERE status = ?", (SessionStatus.ACTIVE.value,))
+                return {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+            finally:
+                cursor.close()
+
+    def set_next_poll_at(self, session_id: str, next_poll_at: Optional[float]):
+        with self._lock:
+            cursor = self.conn.cursor()
+            try:
+                cursor.execute("UPDATE sessions SET next_poll_at = ? WHERE session_id = ?", (next_poll_at, session_id))
+                self.conn.commit()
+            except:
+                self.conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def get_session_duration_stats(self) -> Dict[str, Tuple[int, float, float, float]]:
+        """Returns {task_type: (samples, mean, min, max)} durations in seconds of completed sessions."""
+        with self._lock:
+            cursor = self.conn.cursor()
+            try:
+                cursor.execute("SELECT task_type, samples, mean_seconds, min_seconds, max_seconds FROM session_duration_stats")
+                return {row[0]: tuple(row[1:]) for row in cursor.fetchall()}
+            finally:
+                cursor.close()
+
     def get_session_by_task(self, task_id: str, task_type: str):
         with self._lock:
             cursor = self.conn.cursor()
@@ -119,20 +290,30 @@ class Database:
                     "SELECT session_id, status FROM sessions WHERE task_id = ? AND task_type = ?",
                     (str(task_id), task_type)
                 )
-                return cursor.fetchone()
+                row = cursor.fetchone()
+                if row is None:
+                    # An archived session still counts as the task having been delegated.
+                    cursor.execute(
+                        "SELECT session_id, status FROM sessions_archive WHERE task_id = ? AND task_type = ?",
+                        (str(task_id), task_type)
+                    )
+                    row = cursor.fetchone()
+                return row
             finally:
                 cursor.close()
 
     # Methods for synced_prs
 
-    def add_synced_pr(self, github_pr_id: int, gitlab_mr_iid: int, gitlab_issue_id: Optional[int] = None):
+    def add_synced_pr(self, github_pr_id: int, gitlab_mr_iid: int, gitlab_issue_id: Optional[int] = None,
+                      head_sha: Optional[str] = None):
         with self._lock:
             try:
                 cursor = self.conn.cursor()
                 try:
                     cursor.execute(
-                        "INSERT OR REPLACE INTO synced_prs (github_pr_id, gitlab_mr_iid, gitlab_issue_id) VALUES (?, ?, ?)",
-                        (github_pr_id, gitlab_mr_iid, gitlab_issue_id)
+                        "INSERT OR REPLACE INTO synced_prs (github_pr_id, gitlab_mr_iid, gitlab_issue_id, head_sha) "
+                        "VALUES (?, ?, ?, ?)",
+                        (github_pr_id, gitlab_mr_iid, gitlab_issue_id, head_sha)
                     )
                     self.conn.commit()
                 except:
@@ -162,6 +343,28 @@ class Database:
             finally:
                 cursor.close()
 
+    def get_synced_pr_heads(self) -> Dict[int, Optional[str]]:
+        """Returns a dict mapping GitHub PR IDs to the head SHA last synced to GitLab (None if never recorded)."""
+        with self._lock:
+            cursor = self.conn.cursor()
+            try:
+                cursor.execute("SELECT github_pr_id, head_sha FROM synced_prs")
+                return {row[0]: row[1] for row in cursor.fetchall()}
+            finally:
+                cursor.close()
+
+    def set_synced_pr_head(self, github_pr_id: int, head_sha: str):
+        with self._lock:
+            cursor = self.conn.cursor()
+            try:
+                cursor.execute("UPDATE synced_prs SET head_sha = ? WHERE github_pr_id = ?", (head_sha, github_pr_id))
+                self.conn.commit()
+            except:
+                self.conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
     def delete_synced_pr(self, github_pr_id: int):
         with self._lock:
             cursor = self.conn.cursor()
@@ -186,7 +389,12 @@ class Database:
                     return row[0]
 
                 # Then check sessions table
-                cursor.execute("SELECT task_id FROM sessions WHERE github_pr_id = ? AND task_type = 'gitlab_issue'", (github_pr_id,))
+                cursor.execute(
+                    "SELECT task_id FROM sessions WHERE github_pr_id = ? AND task_type = 'gitlab_issue' "
+                    "UNION ALL SELECT task_id FROM sessions_archive WHERE github_pr_id = ? AND task_type = 'gitlab_issue' "
+                    "LIMIT 1",
+                    (github_pr_id, github_pr_id)
+                )
                 row = cursor.fetchone()
                 if row:
                     try:
@@ -196,3 +404,468 @@ class Database:
                 return None
             finally:
                 cursor.close()
+
+    # Methods for Jules activity streaming
+
+    def get_activity_cursor(self, session_id: str) -> Optional[Tuple]:
+        """Returns (page_token, last_activity_id, last_create_time, last_activity_at) or None."""
+        with self._lock:
+            cursor = self.conn.cursor()
+            try:
+                cursor.execute(
+                    "SELECT page_token, last_activity_id, last_create_time, last_activity_at FROM activity_cursors WHERE session_id = ?",
+                    (session_id,)
+                )
+                return cursor.fetchone()
+            finally:
+                cursor.close()
+
+    def save_activities(self, session_id: str, activities: List[Tuple[str, Optional[str], str, Optional[str]]],
+                        page_token: Optional[str], last_activity_id: Optional[str],
+                        last_create_time: Optional[str], last_activity_at: float):
+        """Append (activity_id, create_time, kind, summary) rows to the log and move the cursor, atomically."""
+        with self._lock:
+            cursor = self.conn.cursor()
+            try:
+                cursor.executemany(
+                    "INSERT OR IGNORE INTO session_activities (session_id, activity_id, create_time, kind, summary) VALUES (?, ?, ?, ?, ?)",
+                    [(session_id, *row) for row in activities]
+                )
+                cursor.execute(
+                    "INSERT OR REPLACE INTO activity_cursors (session_id, page_token, last_activity_id, last_create_time, last_activity_at) VALUES (?, ?, ?, ?, ?)",
+                    (session_id, page_token, last_activity_id, last_create_time, last_activity_at)
+                )
+                self.conn.commit()
+            except:
+                self.conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def get_session_activities(self, session_id: str, limit: int = 50) -> List[Tuple]:
+        """Returns the most recent (activity_id, create_time, kind, summary) rows, newest first."""
+        with self._lock:
+            cursor = self.conn.cursor()
+            try:
+                cursor.execute(
+                    "SELECT activity_id, create_time, kind, summary FROM session_activities WHERE session_id = ? ORDER BY rowid DESC LIMIT ?",
+                    (session_id, limit)
+                )
+                return cursor.fetchall()
+            finally:
+                cursor.close()
+
+    # Methods for the delegation work queue
+
+    def get_work_queue(self) -> List[Tuple]:
+        """Returns all queued (task_type, task_id, sort_key, head_sha) rows."""
+        with self._lock:
+            cursor = self.conn.cursor()
+            try:
+                cursor.execute("SELECT task_type, task_id, sort_key, head_sha FROM work_queue")
+                return cursor.fetchall()
+            finally:
+                cursor.close()
+
+    def upsert_work_item(self, task_type: str, task_id: str, sort_key: float, head_sha: Optional[str] = None):
+        with self._lock:
+            cursor = self.conn.cursor()
+            try:
+                cursor.execute(
+                    "INSERT OR REPLACE INTO work_queue (task_type, task_id, sort_key, head_sha) VALUES (?, ?, ?, ?)",
+                    (task_type, str(task_id), sort_key, head_sha)
+                )
+                self.conn.commit()
+            except:
+                self.conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def delete_work_item(self, task_type: str, task_id: str):
+        with self._lock:
+            cursor = self.conn.cursor()
+            try:
+                cursor.execute("DELETE FROM work_queue WHERE task_type = ? AND task_id = ?", (task_type, str(task_id)))
+                self.conn.commit()
+            except:
+                self.conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    # Methods for the local mirror of GitHub PR state
+
+    def upsert_mirror_prs(self, rows: List[Tuple]):
+        """Insert or update (number, state, draft, title, html_url, head_sha, head_ref, base_sha, created_at, updated_at) rows.
+
+        Mergeability and comments are reset when ``updated_at`` changed, and the
+        CI status when the head SHA changed, so they are re-read on demand.
+        """
+        with self._lock:
+            cursor = self.conn.cursor()
+            try:
+                cursor.executemany("""
+                    INSERT INTO pr_mirror (number, state, draft, title, html_url, head_sha, head_ref, base_sha, created_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(number) DO UPDATE SET
+                        state = excluded.state, draft = excluded.draft, title = excluded.title,
+                        html_url = excluded.html_url, head_ref = excluded.head_ref, base_sha = excluded.base_sha,
+                        created_at = excluded.created_at,
+                        mergeable = CASE WHEN pr_mirror.updated_at = excluded.updated_at THEN pr_mirror.mergeable END,
+                        comments_at = CASE WHEN pr_mirror.updated_at = excluded.updated_at THEN pr_mirror.comments_at END,
+                        ci_status = CASE WHEN pr_mirror.head_sha = excluded.head_sha THEN pr_mirror.ci_status END,
+                        head_sha = excluded.head_sha, updated_at = excluded.updated_at
+                """, rows)
+                self.conn.commit()
+            except:
+                self.conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def get_mirror_prs(self, state: str = "open") -> List[Tuple]:
+        """Returns mirrored PRs in ``state``, newest first, as full pr_mirror rows."""
+        with self._lock:
+            cursor = self.conn.cursor()
+            try:
+                cursor.execute("""
+                    SELECT number, state, draft, title, html_url, head_sha, head_ref, base_sha, created_at, updated_at,
+                           mergeable, ci_status, comment_count, last_comment, comments_at
+                    FROM pr_mirror WHERE state = ? ORDER BY number DESC
+                """, (state,))
+                return cursor.fetchall()
+            finally:
+                cursor.close()
+
+    def close_missing_mirror_prs(self, open_numbers: List[int]) -> int:
+        """Mark mirrored open PRs that are not in ``open_numbers`` as closed; returns how many."""
+        with self._lock:
+            cursor = self.conn.cursor()
+            try:
+                still_open = set(open_numbers)
+                cursor.execute("SELECT number FROM pr_mirror WHERE state = 'open'")
+                missing = [(row[0],) for row in cursor.fetchall() if row[0] not in still_open]
+                cursor.executemany("UPDATE pr_mirror SET state = 'closed' WHERE number = ?", missing)
+                self.conn.commit()
+                return len(missing)
+            except:
+                self.conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def reset_mirror_mergeable(self):
+        """Forget all mergeability results, e.g. because the base branch may have moved."""
+        with self._lock:
+            cursor = self.conn.cursor()
+            try:
+                cursor.execute("UPDATE pr_mirror SET mergeable = NULL")
+                self.conn.commit()
+            except:
+                self.conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def set_mirror_mergeable(self, number: int, mergeable: Optional[bool]):
+        with self._lock:
+            cursor = self.conn.cursor()
+            try:
+                cursor.execute("UPDATE pr_mirror SET mergeable = ? WHERE number = ?",
+                               (None if mergeable is None else int(mergeable), number))
+                self.conn.commit()
+            except:
+                self.conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def set_mirror_ci_status(self, number: int, head_sha: str, status: str):
+        """Store the CI result of the PR head; ignored if the head moved on meanwhile."""
+        with self._lock:
+            cursor = self.conn.cursor()
+            try:
+                cursor.execute("UPDATE pr_mirror SET ci_status = ? WHERE number = ? AND head_sha = ?", (status, number, head_sha))
+                self.conn.commit()
+            except:
+                self.conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def set_mirror_comments(self, number: int, comment_count: int, last_comment: Optional[str], comments_at: Optional[str]):
+        with self._lock:
+            cursor = self.conn.cursor()
+            try:
+                cursor.execute(
+                    "UPDATE pr_mirror SET comment_count = ?, last_comment = ?, comments_at = ? WHERE number = ?",
+                    (comment_count, last_comment, comments_at, number)
+                )
+                self.conn.commit()
+            except:
+                self.conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    # Methods for small pieces of persisted state (watermarks, timestamps)
+
+    def get_state(self, key: str) -> Optional[str]:
+        with self._lock:
+            cursor = self.conn.cursor()
+            try:
+                cursor.execute("SELECT value FROM kv_state WHERE key = ?", (key,))
+                row = cursor.fetchone()
+                return row[0] if row else None
+            finally:
+                cursor.close()
+
+    def set_state(self, key: str, value: Optional[str]):
+        with self._lock:
+            cursor = self.conn.cursor()
+            try:
+                cursor.execute("INSERT OR REPLACE INTO kv_state (key, value) VALUES (?, ?)", (key, value))
+                self.conn.commit()
+            except:
+                self.conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    # Methods for items carried over to the next cycle
+
+    def get_carry_over(self, phase: str) -> List[str]:
+        """Returns the item IDs a phase left unprocessed, in the order they should be resumed."""
+        with self._lock:
+            cursor = self.conn.cursor()
+            try:
+                cursor.execute("SELECT item_id FROM carry_over WHERE phase = ? ORDER BY position", (phase,))
+                return [row[0] for row in cursor.fetchall()]
+            finally:
+                cursor.close()
+
+    def set_carry_over(self, phase: str, item_ids: List[str]):
+        """Replace the carried-over items of a phase."""
+        with self._lock:
+            cursor = self.conn.cursor()
+            try:
+                cursor.execute("DELETE FROM carry_over WHERE phase = ?", (phase,))
+                cursor.executemany(
+                    "INSERT OR IGNORE INTO carry_over (phase, item_id, position) VALUES (?, ?, ?)",
+                    [(phase, str(item_id), position) for position, item_id in enumerate(item_ids)]
+                )
+                self.conn.commit()
+            except:
+                self.conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    # Methods for the outbox of pending writes
+
+    def enqueue_outbox(self, idempotency_key: str, action: str, payload: str, now: float) -> bool:
+        """Add a pending write; returns False if one with the same key was ever enqueued."""
+        with self._lock:
+            cursor = self.conn.cursor()
+            try:
+                cursor.execute(
+                    "INSERT OR IGNORE INTO outbox (idempotency_key, action, payload, status, next_attempt_at, created_at) VALUES (?, ?, ?, 'pending', ?, ?)",
+                    (idempotency_key, action, payload, now, now)
+                )
+                self.conn.commit()
+                return cursor.rowcount > 0
+            except:
+                self.conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def claim_outbox_entries(self, now: float, limit: int) -> List[Tuple]:
+        """Mark up to ``limit`` due entries as running and return their (id, action, payload, attempts)."""
+        with self._lock:
+            cursor = self.conn.cursor()
+            try:
+                cursor.execute(
+                    "SELECT id, action, payload, attempts FROM outbox WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY next_attempt_at LIMIT ?",
+                    (now, limit)
+                )
+                rows = cursor.fetchall()
+                cursor.executemany("UPDATE outbox SET status = 'running' WHERE id = ?", [(row[0],) for row in rows])
+                self.conn.commit()
+                return rows
+            except:
+                self.conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def finish_outbox_entry(self, entry_id: int, status: str, attempts: int,
+                            next_attempt_at: Optional[float] = None, error: Optional[str] = None):
+        """Record the outcome of a delivery: 'done', 'pending' (retry at next_attempt_at) or 'dead'."""
+        with self._lock:
+            cursor = self.conn.cursor()
+            try:
+                cursor.execute(
+                    "UPDATE outbox SET status = ?, attempts = ?, next_attempt_at = COALESCE(?, next_attempt_at), last_error = ? WHERE id = ?",
+                    (status, attempts, next_attempt_at, error, entry_id)
+                )
+                self.conn.commit()
+            except:
+                self.conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def requeue_running_outbox_entries(self) -> int:
+        """Return entries left running by a crashed process to the pending state."""
+        with self._lock:
+            cursor = self.conn.cursor()
+            try:
+                cursor.execute("UPDATE outbox SET status = 'pending' WHERE status = 'running'")
+                self.conn.commit()
+                return cursor.rowcount
+            except:
+                self.conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def get_outbox_stats(self) -> Tuple[int, Optional[float], int]:
+        """Returns (undelivered count, oldest undelivered created_at, dead count)."""
+        with self._lock:
+            cursor = self.conn.cursor()
+            try:
+                cursor.execute("SELECT COUNT(*), MIN(created_at) FROM outbox WHERE status IN ('pending', 'running')")
+                depth, oldest = cursor.fetchone()
+                cursor.execute("SELECT COUNT(*) FROM outbox WHERE status = 'dead'")
+                return depth, oldest, cursor.fetchone()[0]
+            finally:
+                cursor.close()
+
+    # Methods for retention and compaction
+
+    def get_archivable_sessions(self, cutoff: float, limit: int) -> List[str]:
+        """IDs of completed/failed sessions that finished before ``cutoff``; rows without timestamps predate them."""
+        with self._lock:
+            cursor = self.conn.cursor()
+            try:
+                cursor.execute(
+                    "SELECT session_id FROM sessions WHERE status IN ('completed', 'failed') "
+                    "AND COALESCE(completed_at, created_at, 0) < ? LIMIT ?",
+                    (cutoff, limit)
+                )
+                return [row[0] for row in cursor.fetchall()]
+            finally:
+                cursor.close()
+
+    def get_activities_for_sessions(self, session_ids: List[str]) -> List[Tuple]:
+        placeholders = ",".join("?" * len(session_ids))
+        with self._lock:
+            cursor = self.conn.cursor()
+            try:
+                cursor.execute(
+                    "SELECT session_id, activity_id, create_time, kind, summary FROM session_activities "
+                    f"WHERE session_id IN ({placeholders}) ORDER BY rowid",
+                    session_ids
+                )
+                return cursor.fetchall()
+            finally:
+                cursor.close()
+
+    def archive_sessions(self, session_ids: List[str], now: float) -> int:
+        """Move sessions to ``sessions_archive`` and drop their activities and cursors; returns the number moved."""
+        placeholders = ",".join("?" * len(session_ids))
+        with self._lock:
+            cursor = self.conn.cursor()
+            try:
+                cursor.execute(
+                    "INSERT OR REPLACE INTO sessions_archive (session_id, task_id, task_type, github_pr_id, gitlab_mr_id, "
+                    "status, created_at, completed_at, archived_at) "
+                    "SELECT session_id, task_id, task_type, github_pr_id, gitlab_mr_id, status, created_at, completed_at, ? "
+                    f"FROM sessions WHERE session_id IN ({placeholders})",
+                    [now, *session_ids]
+                )
+                cursor.execute(f"DELETE FROM session_activities WHERE session_id IN ({placeholders})", session_ids)
+                cursor.execute(f"DELETE FROM activity_cursors WHERE session_id IN ({placeholders})", session_ids)
+                cursor.execute(f"DELETE FROM sessions WHERE session_id IN ({placeholders})", session_ids)
+                self.conn.commit()
+                return cursor.rowcount
+            except:
+                self.conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def prune_legacy_synced_prs(self) -> int:
+        """Delete synced_prs rows without an MR (old JSON state) whose PR the mirror no longer lists as open."""
+        with self._lock:
+            cursor = self.conn.cursor()
+            try:
+                # Without mirror data every PR could still be open, and dropping its row would sync it again.
+                cursor.execute(
+                    "DELETE FROM synced_prs WHERE gitlab_mr_iid = 0 "
+                    "AND github_pr_id NOT IN (SELECT number FROM pr_mirror WHERE state = 'open') "
+                    "AND EXISTS (SELECT 1 FROM pr_mirror)"
+                )
+                self.conn.commit()
+                return cursor.rowcount
+            except:
+                self.conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def purge_delivered_outbox(self, cutoff: float) -> int:
+        """Delete delivered outbox entries created before ``cutoff``; their idempotency keys are no longer needed."""
+        with self._lock:
+            cursor = self.conn.cursor()
+            try:
+                cursor.execute("DELETE FROM outbox WHERE status = 'done' AND created_at < ?", (cutoff,))
+                self.conn.commit()
+                return cursor.rowcount
+            except:
+                self.conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def purge_closed_mirror_prs(self, cutoff: str) -> int:
+        """Delete mirrored PRs that are closed and were last updated before the ISO timestamp ``cutoff``."""
+        with self._lock:
+            cursor = self.conn.cursor()
+            try:
+                cursor.execute("DELETE FROM pr_mirror WHERE state != 'open' AND updated_at < ?", (cutoff,))
+                self.conn.commit()
+                return cursor.rowcount
+            except:
+                self.conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def compact(self, max_pages: int) -> int:
+        """Return up to ``max_pages`` free pages to the file system and refresh planner statistics.
+
+        Incremental vacuum needs ``auto_vacuum = INCREMENTAL``, which only takes effect
+        after a full VACUUM; databases created without it are converted once here.
+        Returns the number of pages freed.
+        """
+        with self._lock:
+            cursor = self.conn.cursor()
+            try:
+                cursor.execute("PRAGMA freelist_count")
+                free_before = cursor.fetchone()[0]
+                cursor.execute("PRAGMA auto_vacuum")
+                if cursor.fetchone()[0] != 2:
+                    cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                    cursor.execute("VACUUM")
+                else:
+                    cursor.execute(f"PRAGMA incremental_vacuum({int(max_pages)})")
+                    cursor.fetchall()
+                cursor.execute("ANALYZE")
+                self.conn.commit()
+                cursor.execute("PRAGMA freelist_count")
+                return free_before - cursor.fetchone()[0]
+            finally:
+                cursor.close()
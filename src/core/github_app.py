@@ -0,0 +1,145 @@
+"""GitHub App authentication for ``GitHubClient``.
+
+A personal token shares one 5,000 requests/hour limit. An App installation
+token is rate limited per installation, and that limit grows with the
+organisation. The App signs a short-lived JWT with its private key and
+exchanges it for an installation token that is valid for an hour. The token
+is cached in memory and in ``GITHUB_APP_TOKEN_CACHE_PATH``, so a restart
+reuses it. It is replaced ``GITHUB_APP_TOKEN_REFRESH_MARGIN`` seconds before
+it expires, so no request is made with a token that is about to lapse.
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional
+import jwt
+import requests
+from github import Auth
+from src.config import settings
+from src.utils.http_cache import http_cache
+from src.utils.logger import logger
+from src.utils.metrics import metrics
+
+# GitHub rejects App JWTs valid for more than ten minutes; iat is backdated to allow for clock drift.
+JWT_LIFETIME = 540
+JWT_CLOCK_SKEW = 60
+
+
+class InstallationTokenAuth(Auth.Auth):
+    """PyGithub auth that sends a cached GitHub App installation token, refreshing it before it expires."""
+
+    def __init__(self, app_id: int, private_key: str, installation_id: Optional[int] = None,
+                 cache_path: Optional[str] = None, refresh_margin: float = 300):
+        self.app_id = app_id
+        self.private_key = private_key
+        self.installation_id = installation_id or None
+        self.cache_path = cache_path
+        self.refresh_margin = refresh_margin
+        self._token: Optional[str] = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+        self._load_cached()
+
+    @property
+    def token_type(self) -> str:
+        return "token"
+
+    @property
+    def token(self) -> str:
+        with self._lock:
+            if self._expires_at - time.time() <= self.refresh_margin:
+                try:
+                    self._refresh()
+                except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+                    # The margin leaves time for a later request to retry the refresh.
+                    if self._token is None or self._expires_at <= time.time():
+                        raise
+                    logger.warning(f"Could not refresh the GitHub App installation token, "
+                                   f"using the current one for {self._expires_at - time.time():.0f}s more: {e}")
+            return self._token
+
+    def _alias_token(self):
+        # Tokens change hourly; cached GitHub responses are keyed on the App installation instead.
+        http_cache.alias_credential(f"{self.token_type} {self._token}",
+                                    f"github-app:{self.app_id}:{self.installation_id}")
+
+    @property
+    def _masked_token(self) -> str:
+        return "token (installation token removed)"
+
+    def app_jwt(self) -> str:
+        now = int(time.time())
+        claims = {"iat": now - JWT_CLOCK_SKEW, "exp": now + JWT_LIFETIME, "iss": str(self.app_id)}
+        return jwt.encode(claims, self.private_key, algorithm="RS256")
+
+    def _app_request(self, method: str, path: str) -> Dict:
+        headers = {"Authorization": f"Bearer {self.app_jwt()}", "Accept": "application/vnd.github+json"}
+        response = requests.request(method, f"{settings.GITHUB_API_URL.rstrip('/')}/{path}", headers=headers,
+                                    timeout=(settings.HTTP_CONNECT_TIMEOUT, settings.HTTP_READ_TIMEOUT))
+        response.raise_for_status()
+        return response.json()
+
+    def _refresh(self):
+        if not self.installation_id:
+            self.installation_id = self._app_request("GET", f"repos/{settings.GITHUB_REPO}/installation")["id"]
+        data = self._app_request("POST", f"app/installations/{self.installation_id}/access_tokens")
+        self._token = data["token"]
+        self._expires_at = datetime.strptime(data["expires_at"], "%Y-%m-%dT%H:%M:%SZ").replace(
+            tzinfo=timezone.utc).timestamp()
+        self._alias_token()
+        metrics.inc("ato_github_app_tokens_total")
+        logger.info(f"Minted a GitHub App installation token for installation {self.installation_id}, "
+                    f"valid for {self._expires_at - time.time():.0f}s.")
+        self._save_cached()
+
+    def _load_cached(self):
+        if not self.cache_path:
+            return
+        try:
+            with open(self.cache_path) as f:
+                cached = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable GitHub App token cache {self.cache_path}: {e}")
+            return
+        # A token minted for another App or installation would act with the wrong permissions.
+        if cached.get("app_id") != self.app_id or (self.installation_id and
+                                                   cached.get("installation_id") != self.installation_id):
+            return
+        self.installation_id = cached["installation_id"]
+        self._token = cached["token"]
+        self._expires_at = cached["expires_at"]
+        self._alias_token()
+
+    def _save_cached(self):
+        if not self.cache_path:
+            return
+        cached = {"app_id": self.app_id, "installation_id": self.installation_id, "token": self._token,
+                  "expires_at": self._expires_at}
+        try:
+            if os.path.dirname(self.cache_path):
+                os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            tmp_path = f"{self.cache_path}.tmp"
+            # Readable by the orchestrator's user only: the token grants the App's repository access.
+            with os.fdopen(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as f:
+                json.dump(cached, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logger.warning(f"Could not write the GitHub App token cache {self.cache_path}: {e}")
+
+
+def github_auth() -> Auth.Auth:
+    """GitHub App installation auth when ``GITHUB_APP_ID`` is set, the personal ``GITHUB_TOKEN`` otherwise."""
+    if settings.GITHUB_APP_ID:
+        with open(settings.GITHUB_APP_PRIVATE_KEY_PATH) as f:
+            private_key = f.read()
+        # A cached token would skip the token request a cassette recorded, or that a replay expects.
+        cache_path = settings.GITHUB_APP_TOKEN_CACHE_PATH if settings.CASSETTE_MODE == "off" else None
+        return InstallationTokenAuth(settings.GITHUB_APP_ID, private_key, settings.GITHUB_APP_INSTALLATION_ID,
+                                     cache_path, settings.GITHUB_APP_TOKEN_REFRESH_MARGIN)
+    if not settings.GITHUB_TOKEN:
+        raise ValueError("Set GITHUB_TOKEN, or GITHUB_APP_ID and GITHUB_APP_PRIVATE_KEY_PATH.")
+    return Auth.Token(settings.GITHUB_TOKEN)
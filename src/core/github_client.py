@@ -1,15 +1,42 @@
-from typing import Any
-from github import Github
+import base64
+from typing import Any, Optional
+from github import Github, GithubRetry, UnknownObjectException
 from src.config import settings
+from src.core.github_app import github_auth
+from src.utils.blob_store import blob_store
+from src.utils.metrics import instrument_api
+from src.utils.tracing import traced
 
+@traced
+@instrument_api("github")
 class GitHubClient:
     def __init__(self):
-        self.gh = Github(settings.GITHUB_TOKEN)
+        self.gh = Github(
+            auth=github_auth(),
+            base_url=settings.GITHUB_API_URL,
+            seconds_between_requests=settings.GITHUB_SECONDS_BETWEEN_REQUESTS,
+            seconds_between_writes=settings.GITHUB_SECONDS_BETWEEN_WRITES,
+            # PyGithub only takes a single (read) timeout; the connect timeout is applied by the breaker middleware.
+            timeout=int(settings.HTTP_READ_TIMEOUT),
+            # The default retries up to 10 times with backoff, which stalls a cycle during an outage.
+            retry=GithubRetry(total=settings.GITHUB_MAX_RETRIES),
+        )
         self.repo = self.gh.get_repo(settings.GITHUB_REPO)
+        # Objects from a lazy handle are not fetched on creation, so sub-resources cost one request.
+        self.lazy_repo = self.gh.withLazy(True).get_repo(settings.GITHUB_REPO)
 
-    def get_pull_requests(self, state: str = "open"):
-        """Fetch pull requests from GitHub."""
-        return self.repo.get_pulls(state=state)
+    def get_pull_requests(self, state: str = "open", sort: Optional[str] = None, direction: Optional[str] = None):
+        """Fetch pull requests from GitHub, optionally sorted (e.g. ``sort="updated", direction="desc"``)."""
+        ordering = {key: value for key, value in (("sort", sort), ("direction", direction)) if value}
+        return self.repo.get_pulls(state=state, **ordering)
+
+    def get_pull_request(self, pr_number: int):
+        """Fetch a single Pull Request, including its mergeability."""
+        return self.repo.get_pull(pr_number)
+
+    def get_pr_comments(self, pr_number: int):
+        """List the conversation comments of a Pull Request without fetching the PR itself."""
+        return self.lazy_repo.get_issue(pr_number).get_comments()
 
     def get_pr_status(self, sha: str) -> str:
         """
@@ -35,8 +62,18 @@ class GitHubClient:
         # If no failures and everything is completed/success
         return "success"
 
-    def get_file_content(self, path: str, ref: str) -> str | bytes:
-        content = self.repo.get_contents(path, ref=ref).decoded_content
+    def get_blob(self, sha: str) -> bytes:
+        """Raw content of a git blob (no 1 MB limit), read from the local blob store when fetched before."""
+        content = blob_store.get(sha)
+        if content is None:
+            blob = self.lazy_repo.get_git_blob(sha)
+            content = base64.b64decode(blob.content) if blob.encoding == "base64" else blob.content.encode("utf-8")
+            blob_store.put(sha, content)
+        return content
+
+    def get_file_content(self, path: str, ref: str, sha: Optional[str] = None) -> str | bytes:
+        """Content of ``path`` at ``ref``; with the file's blob ``sha`` (as listed for PR files) it is fetched by SHA."""
+        content = self.get_blob(sha) if sha else self.repo.get_contents(path, ref=ref).decoded_content
         try:
             return content.decode("utf-8")
         except UnicodeDecodeError:
@@ -48,6 +85,13 @@ class GitHubClient:
             pr = self.repo.get_pull(pr_number)
         return pr.get_files()
 
+    def compare(self, base: str, head: str):
+        """Compare two commits; ``status`` is ``ahead`` when head descends from base. None if base no longer exists."""
+        try:
+            return self.repo.compare(base, head)
+        except UnknownObjectException:
+            return None
+
     def add_pr_comment(self, pr_number: int, message: str, pr: Any = None):
         """Add a comment to a Pull Request."""
         if not pr:
@@ -1,11 +1,18 @@
+import posixpath
 import gitlab
-from typing import Optional
+from typing import Dict, Iterable, List, Optional
 from src.config import settings
 from src.utils.logger import logger
+from src.utils.metrics import instrument_api
+from src.utils.resilience import raise_if_transient
+from src.utils.tracing import traced
 
+@traced
+@instrument_api("gitlab")
 class GitLabClient:
     def __init__(self):
-        self.gl = gitlab.Gitlab(settings.GITLAB_URL, private_token=settings.GITLAB_TOKEN)
+        self.gl = gitlab.Gitlab(settings.GITLAB_URL, private_token=settings.GITLAB_TOKEN,
+                                timeout=(settings.HTTP_CONNECT_TIMEOUT, settings.HTTP_READ_TIMEOUT))
         self.project = self.gl.projects.get(settings.GITLAB_PROJECT_ID)
 
     def get_open_ai_issues(self):
@@ -28,14 +35,23 @@ class GitLabClient:
             mrs = issue.related_merge_requests()
             return any(mr["state"] == "opened" for mr in mrs)
         except Exception as e:
+            raise_if_transient(e)
             logger.error(f"Error checking open MRs for issue {issue_iid}: {e}")
             return False
 
-    def get_merge_request(self, iid: int):
-        """Get a specific Merge Request."""
+    def get_merge_requests(self, iids: Optional[List[int]] = None, updated_after: Optional[str] = None):
+        """
+        List Merge Requests in any state, filtered by IID and/or by last update (ISO 8601).
+        Returns None if the listing failed, so callers can tell it from an empty result.
+        """
+        filters = {"iids": iids} if iids is not None else {}
+        if updated_after:
+            filters["updated_after"] = updated_after
         try:
-            return self.project.mergerequests.get(iid)
-        except Exception:
+            return self.project.mergerequests.list(state="all", get_all=True, **filters)
+        except Exception as e:
+            raise_if_transient(e)
+            logger.error(f"Error listing merge requests: {e}")
             return None
 
     def get_file_content(self, file_path: str, ref: str = "master"):
@@ -43,7 +59,8 @@ class GitLabClient:
         try:
             f = self.project.files.get(file_path=file_path, ref=ref)
             return f.decode().decode("utf-8")
-        except Exception:
+        except Exception as e:
+            raise_if_transient(e)
             return None
 
     def file_exists(self, file_path: str, ref: str = "master") -> bool:
@@ -51,9 +68,25 @@ class GitLabClient:
         try:
             self.project.files.get(file_path=file_path, ref=ref)
             return True
-        except Exception:
+        except Exception as e:
+            raise_if_transient(e)
             return False
 
+    def get_blob_ids(self, paths: Iterable[str], ref: str = "master") -> Dict[str, str]:
+        """
+        Map the files in the directories containing 'paths' on 'ref' to their git blob IDs.
+        One tree listing per directory tells whether each file exists and whether its bytes changed.
+        """
+        blob_ids = {}
+        for directory in sorted({posixpath.dirname(path) for path in paths}):
+            try:
+                entries = self.project.repository_tree(path=directory, ref=ref, get_all=True)
+            except Exception as e:
+                raise_if_transient(e)
+                continue  # The directory does not exist on this ref.
+            blob_ids.update({entry["path"]: entry["id"] for entry in entries if entry["type"] == "blob"})
+        return blob_ids
+
     def create_branch(self, branch_name: str, ref: str = "master"):
         """Create a new branch in GitLab."""
         try:
@@ -61,6 +94,7 @@ class GitLabClient:
             logger.info(f"Created branch {branch_name} from {ref}")
             return True
         except Exception as e:
+            raise_if_transient(e)
             logger.error(f"Error creating branch {branch_name}: {e}")
             return False
 
@@ -71,6 +105,7 @@ class GitLabClient:
             issue = self.project.issues.get(issue_iid)
             return issue.notes.list(sort='asc', order_by='created_at')
         except Exception as e:
+            raise_if_transient(e)
             logger.error(f"Error fetching notes for issue {issue_iid}: {e}")
             return []
 
@@ -89,22 +124,27 @@ class GitLabClient:
             response.raise_for_status()
             return response.content
         except Exception as e:
+            raise_if_transient(e)
             logger.error(f"Error downloading file from {url}: {e}")
             return None
-    def commit_changes(self, branch_name: str, commit_message: str, actions: list):
+    def commit_changes(self, branch_name: str, commit_message: str, actions: list, start_branch: Optional[str] = None):
         """
         Create a commit with multiple file actions.
         'actions' is a list of dicts: {'action': 'create'|'update', 'file_path': '...', 'content': '...'}
+        With 'start_branch', the branch is reset to that branch before the commit (a force update).
         """
         data = {
             "branch": branch_name,
             "commit_message": commit_message,
             "actions": actions
         }
+        if start_branch:
+            data.update(start_branch=start_branch, force=True)
         try:
             self.project.commits.create(data)
             logger.info(f"Committed changes to branch {branch_name}")
             return True
         except Exception as e:
+            raise_if_transient(e)
             logger.error(f"Error committing changes to {branch_name}: {e}")
             return False
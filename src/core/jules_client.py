@@ -1,32 +1,117 @@
 import requests
 from src.config import settings
 from src.utils.logger import logger
+from src.utils.metrics import instrument_api, metrics
+from src.utils.resilience import raise_if_transient
+from src.utils.tracing import traced
 import threading
 from typing import Optional, List, Dict
+import hashlib
 import json
+import time
 
-class JulesClient:
-    BASE_URL = "https://jules.googleapis.com/v1alpha"
+# The source name only changes if the repository is reconnected to Jules.
+SOURCE_NAME_TTL = 86400
 
-    def __init__(self):
-        self.api_key = settings.JULES_API_KEY
+
+def api_keys() -> List[str]:
+    """The pool of Jules API keys: ``JULES_API_KEY`` first, then ``JULES_API_KEYS``, without duplicates."""
+    return list(dict.fromkeys([settings.JULES_API_KEY, *settings.JULES_API_KEYS]))
+
+
+def _session_id(session_id: str) -> str:
+    return session_id.split("/", 1)[1] if session_id.startswith("sessions/") else session_id
+
+
+class JulesKey:
+    """One Jules API key (one account): its session capacity, current load and health."""
+
+    def __init__(self, api_key: str, capacity: int):
+        # Stored with sessions and used in logs and metrics, so it must not reveal the key.
+        self.id = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
         self.headers = {
-            "x-goog-api-key": self.api_key,
+            "x-goog-api-key": api_key,
             "Content-Type": "application/json"
         }
+        self.capacity = capacity
+        self.active = 0
+        self.cooldown_until = 0.0
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.cooldown_until
+
+    def cool_down(self, retry_after: Optional[str]):
+        seconds = float(retry_after) if retry_after and retry_after.isdigit() else settings.JULES_KEY_COOLDOWN_SECONDS
+        self.cooldown_until = time.monotonic() + seconds
+        metrics.inc("ato_jules_key_cooldowns_total", {"key": self.id})
+        logger.warning(f"Jules API key {self.id} is rate limited or rejected. Not using it for {seconds:.0f}s.")
+
+
+@traced
+@instrument_api("jules")
+class JulesClient:
+    def __init__(self):
+        self.base_url = settings.JULES_API_URL.rstrip("/")
+        self.keys = [JulesKey(api_key, settings.JULES_MAX_CONCURRENT_SESSIONS) for api_key in api_keys()]
+        # Sessions created before the pool, and sessions of unknown owner, belong to the first key.
+        self.primary_key = self.keys[0]
+        self.api_key = settings.JULES_API_KEY
+        self.headers = self.primary_key.headers
         self.active_sessions_count = 0
+        self._source_name: Optional[str] = None
+        self._source_name_fetched_at = 0.0
+        # Session ID -> ID of the key that created it.
+        self._session_keys: Dict[str, str] = {}
         self._lock = threading.Lock()
 
-    def _get(self, endpoint: str, params: Optional[Dict] = None):
-        response = requests.get(f"{self.BASE_URL}/{endpoint}", headers=self.headers, params=params, timeout=30)
+    def _cool_down_if_rejected(self, key: JulesKey, error: Exception):
+        """Set ``key`` aside after a rate limit or auth error on a request that only it could have made.
+
+        Session requests are not checked: a session of unknown owner falls back to
+        the first key, and its rejection says nothing about that key's health.
+        """
+        response = getattr(error, "response", None)
+        if response is not None and response.status_code in (401, 403, 429):
+            key.cool_down(response.headers.get("Retry-After"))
+
+    def _get(self, endpoint: str, params: Optional[Dict] = None, key: Optional[JulesKey] = None):
+        key = key or self.primary_key
+        response = requests.get(f"{self.base_url}/{endpoint}", headers=key.headers, params=params, timeout=(settings.HTTP_CONNECT_TIMEOUT, settings.HTTP_READ_TIMEOUT))
         response.raise_for_status()
         return response.json()
 
-    def _post(self, endpoint: str, data: Optional[Dict] = None):
-        response = requests.post(f"{self.BASE_URL}/{endpoint}", headers=self.headers, json=data, timeout=30)
+    def _post(self, endpoint: str, data: Optional[Dict] = None, key: Optional[JulesKey] = None):
+        key = key or self.primary_key
+        response = requests.post(f"{self.base_url}/{endpoint}", headers=key.headers, json=data, timeout=(settings.HTTP_CONNECT_TIMEOUT, settings.HTTP_READ_TIMEOUT))
         response.raise_for_status()
         return response.json()
 
+    def _key_for(self, session_id: str) -> JulesKey:
+        key_id = self._session_keys.get(_session_id(session_id))
+        return next((key for key in self.keys if key.id == key_id), self.primary_key)
+
+    def assign_session_keys(self, session_keys: Dict[str, str]):
+        """Record which key owns each session (as stored in the database) so later calls use its credentials."""
+        with self._lock:
+            self._session_keys.update(session_keys)
+
+    def has_free_key(self) -> bool:
+        """Whether any healthy key has room for another session."""
+        with self._lock:
+            return any(key.healthy and key.active < key.capacity for key in self.keys)
+
+    def _pick_key(self) -> Optional[JulesKey]:
+        """The healthy key with the most free capacity, relative to its size."""
+        with self._lock:
+            available = [key for key in self.keys if key.healthy and key.active < key.capacity]
+            if not available:
+                return None
+            key = min(available, key=lambda k: k.active / k.capacity)
+            # Counted now, so concurrent or back-to-back creations spread over the pool.
+            key.active += 1
+            return key
+
     def _log_error(self, message_prefix: str, error: Exception):
         """Log errors safely without exposing sensitive information."""
         if isinstance(error, requests.exceptions.HTTPError):
@@ -39,17 +124,31 @@ class JulesClient:
 
     def get_source_name(self) -> Optional[str]:
         """Find the source name for the configured GitHub repo."""
+        metrics.record_cache("jules_source_name", self._source_name is not None)
+        if self._source_name:
+            return self._source_name
         try:
             sources = self._get("sources").get("sources", [])
             owner_repo = settings.GITHUB_REPO.lower()
             for source in sources:
                 if source.get("id", "").lower() == f"github/{owner_repo}":
-                    return source.get("name")
+                    self._source_name = source.get("name")
+                    self._source_name_fetched_at = time.time()
+                    return self._source_name
         except Exception as e:
             self._log_error("Error fetching sources", e)
         return f"sources/github/{settings.GITHUB_REPO}"
 
+    def dump_state(self) -> Dict:
+        return {"source_name": self._source_name, "fetched_at": self._source_name_fetched_at}
+
+    def load_state(self, state: Dict):
+        if state.get("source_name") and time.time() - state["fetched_at"] < SOURCE_NAME_TTL:
+            self._source_name = state["source_name"]
+            self._source_name_fetched_at = state["fetched_at"]
+
     def create_session(self, prompt: str, title: str, branch: str = "main", attachments: Optional[List[Dict]] = None) -> Optional[Dict]:
+        """Create a session with the least-loaded healthy key; ``apiKeyId`` in the result names that key."""
         source_name = self.get_source_name()
         if not source_name:
             logger.error("Could not determine Jules source name.")
@@ -68,64 +167,94 @@ class JulesClient:
         }
         if attachments:
             data["attachments"] = attachments
+        key = self._pick_key()
+        if key is None:
+            logger.warning("No Jules API key has free capacity. Not creating a session.")
+            return None
         try:
-            return self._post("sessions", data)
+            session = self._post("sessions", data, key=key)
         except Exception as e:
+            with self._lock:
+                key.active -= 1
+            self._cool_down_if_rejected(key, e)
             self._log_error("Error creating Jules session", e)
             return None
+        with self._lock:
+            self._session_keys[_session_id(str(session.get("id") or session.get("name") or ""))] = key.id
+        session["apiKeyId"] = key.id
+        return session
 
     def get_session(self, session_id: str) -> Optional[Dict]:
         try:
             name = session_id if session_id.startswith("sessions/") else f"sessions/{session_id}"
-            return self._get(name)
+            return self._get(name, key=self._key_for(session_id))
         except Exception as e:
+            # An outage must not look like a missing session, which would be marked FAILED.
+            raise_if_transient(e)
             self._log_error(f"Error getting Jules session {session_id}", e)
             return None
 
-    def list_sessions(self, page_size: int = 100, page_token: Optional[str] = None) -> Dict:
-        """List sessions with pagination."""
+    def list_sessions(self, page_size: int = 100, page_token: Optional[str] = None, key: Optional[JulesKey] = None) -> Dict:
+        """List the sessions of one key (the first by default) with pagination."""
         params = {"pageSize": page_size}
         if page_token:
             params["pageToken"] = page_token
         try:
-            return self._get("sessions", params=params)
+            return self._get("sessions", params=params, key=key)
         except Exception as e:
+            self._cool_down_if_rejected(key or self.primary_key, e)
             self._log_error("Error listing Jules sessions", e)
             return {}
 
     def get_active_sessions_count_from_api(self) -> int:
         """
-        Count active sessions on Jules by iterating through all sessions.
-        Note: The API doesn't seem to have a filter for 'active',
-        so we might need to check if they have outputs/PRs or use our local DB.
-        But the user specifically asked to track active sessions via list_sessions.
+        Count active sessions on Jules by iterating through all sessions of every key.
+        The API has no filter for 'active', so each key's sessions are listed in full;
+        this also refreshes each key's load and learns which key owns which session.
         """
-        count = 0
-        page_token = None
-        while True:
-            data = self.list_sessions(page_size=100, page_token=page_token)
-            sessions = data.get("sessions", [])
-            for s in sessions:
-                if s.get("state", False) == 'IN_PROGRESS':
-                    count += 1
-
-            page_token = data.get("nextPageToken")
-            if not page_token:
-                break
-        return count
-
-    def list_activities(self, session_id: str) -> List[Dict]:
+        total = 0
+        for key in self.keys:
+            if not key.healthy:
+                # Its load is kept from the last listing; it is not picked until it recovers.
+                total += key.active
+                continue
+            count = 0
+            owned = {}
+            page_token = None
+            while True:
+                data = self.list_sessions(page_size=100, page_token=page_token, key=key)
+                sessions = data.get("sessions", [])
+                for s in sessions:
+                    owned[_session_id(str(s.get("id") or s.get("name") or ""))] = key.id
+                    if s.get("state", False) == 'IN_PROGRESS':
+                        count += 1
+
+                page_token = data.get("nextPageToken")
+                if not page_token:
+                    break
+            with self._lock:
+                key.active = count
+                self._session_keys.update(owned)
+            metrics.set_gauge("ato_jules_key_active_sessions", count, {"key": key.id})
+            total += count
+        return total
+
+    def list_activities_page(self, session_id: str, page_size: int = 50, page_token: Optional[str] = None) -> Optional[Dict]:
+        """Fetch one page of activities; returns None on error so callers can keep their cursor."""
+        params: Dict = {"pageSize": page_size}
+        if page_token:
+            params["pageToken"] = page_token
         try:
             name = session_id if session_id.startswith("sessions/") else f"sessions/{session_id}"
-            return self._get(f"{name}/activities").get("activities", [])
+            return self._get(f"{name}/activities", params=params, key=self._key_for(session_id))
         except Exception as e:
             self._log_error(f"Error listing activities for session {session_id}", e)
-            return []
+            return None
 
     def send_message(self, session_id: str, prompt: str):
         try:
             name = session_id if session_id.startswith("sessions/") else f"sessions/{session_id}"
-            return self._post(f"{name}:sendMessage", {"prompt": prompt})
+            return self._post(f"{name}:sendMessage", {"prompt": prompt}, key=self._key_for(session_id))
         except Exception as e:
             self._log_error(f"Error sending message to session {session_id}", e)
             return None
@@ -134,6 +263,6 @@ class JulesClient:
         # We'll use the API count if possible
         try:
             active_count = self.get_active_sessions_count_from_api()
-            return active_count < settings.JULES_MAX_CONCURRENT_SESSIONS
+            return active_count < settings.JULES_MAX_CONCURRENT_SESSIONS * len(self.keys)
         except Exception:
             return True
@@ -0,0 +1,130 @@
+"""Durable outbox for outbound writes.
+
+Side effects such as PR comments and PR closes are persisted to the ``outbox``
+table with an idempotency key and delivered by a background worker pool, so a
+slow or failing write never blocks the cycle and a crash never loses one. Failed deliveries are retried with exponential backoff and
+parked as ``dead`` after ``OUTBOX_MAX_ATTEMPTS``.
+"""
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional
+from src.config import settings
+from src.core.database import Database
+from src.utils.logger import log_context, logger
+from src.utils.metrics import metrics
+
+Handler = Callable[[Dict[str, Any]], Any]
+
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with full jitter, capped at OUTBOX_RETRY_MAX_SECONDS."""
+    ceiling = min(settings.OUTBOX_RETRY_BASE_SECONDS * (2 ** (attempts - 1)), settings.OUTBOX_RETRY_MAX_SECONDS)
+    return random.uniform(ceiling / 2, ceiling)
+
+
+class Outbox:
+    def __init__(self, db: Database, workers: Optional[int] = None):
+        self.db = db
+        self.workers = workers or settings.OUTBOX_WORKERS
+        self._handlers: Dict[str, Handler] = {}
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+
+    def register(self, action: str, handler: Handler):
+        self._handlers[action] = handler
+
+    def enqueue(self, action: str, payload: Dict[str, Any], idempotency_key: str) -> bool:
+        """Persist a write for delivery; a key that was already enqueued is ignored."""
+        if action not in self._handlers:
+            raise ValueError(f"No outbox handler registered for {action}")
+        added = self.db.enqueue_outbox(idempotency_key, action, json.dumps(payload), time.time())
+        if added:
+            self._wake.set()
+        else:
+            logger.debug("Outbox entry %s already exists. Skipping.", idempotency_key)
+        return added
+
+    def start(self):
+        requeued = self.db.requeue_running_outbox_entries()
+        if requeued:
+            logger.info(f"Requeued {requeued} outbox entries interrupted by the last shutdown.")
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="outbox")
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="outbox-dispatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        self._stopping.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+        if self._pool:
+            self._pool.shutdown(wait=True)
+        self._thread = self._pool = None
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                delivered = self.process_due()
+            except Exception as e:
+                logger.error(f"Outbox dispatcher error: {e}", exc_info=True)
+                delivered = 0
+            if not delivered:
+                self._wake.wait(settings.OUTBOX_POLL_INTERVAL)
+                self._wake.clear()
+
+    def process_due(self) -> int:
+        """Deliver all entries that are due, concurrently; returns how many were attempted."""
+        entries = self.db.claim_outbox_entries(time.time(), self.workers * 4)
+        if entries:
+            if self._pool:
+                wait([self._pool.submit(self._deliver, *entry) for entry in entries])
+            else:
+                for entry in entries:
+                    self._deliver(*entry)
+        self.update_metrics()
+        return len(entries)
+
+    def drain(self, timeout: float = 30.0) -> bool:
+        """Deliver due entries until none are left or ``timeout`` passes; True if the outbox is empty."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if not self.process_due():
+                break
+        return self.db.get_outbox_stats()[0] == 0
+
+    def _deliver(self, entry_id: int, action: str, payload: str, attempts: int):
+        with log_context(correlation_id=f"outbox:{entry_id}"):
+            attempts += 1
+            try:
+                self._handlers[action](json.loads(payload))
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                metrics.inc("ato_outbox_deliveries_total", {"action": action, "outcome": "error"})
+                if attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+                    logger.error(f"Outbox {action} #{entry_id} failed {attempts} times, giving up: {error}")
+                    self.db.finish_outbox_entry(entry_id, "dead", attempts, error=error)
+                else:
+                    delay = retry_delay(attempts)
+                    logger.warning(f"Outbox {action} #{entry_id} failed (attempt {attempts}), retrying in {delay:.0f}s: {error}")
+                    self.db.finish_outbox_entry(entry_id, "pending", attempts, time.time() + delay, error)
+                return
+            metrics.inc("ato_outbox_deliveries_total", {"action": action, "outcome": "success"})
+            self.db.finish_outbox_entry(entry_id, "done", attempts)
+
+    def update_metrics(self):
+        depth, oldest, dead = self.db.get_outbox_stats()
+        metrics.set_gauge("ato_outbox_depth", depth)
+        metrics.set_gauge("ato_outbox_oldest_age_seconds", time.time() - oldest if oldest else 0)
+        metrics.set_gauge("ato_outbox_dead", dead)
+
+
+def register_client_handlers(outbox: Outbox, gh_client):
+    """Register the write actions issued by TaskMonitor and PRSync."""
+    outbox.register("github.add_pr_comment", lambda p: gh_client.add_pr_comment(p["pr_number"], p["message"]))
+    outbox.register("github.close_pr", lambda p: gh_client.close_pr(p["pr_number"]))
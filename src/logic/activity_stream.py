@@ -0,0 +1,106 @@
+import time
+from typing import TYPE_CHECKING, Dict, List, Optional
+from src.config import settings
+from src.core.database import Database
+from src.utils.logger import logger
+from src.utils.metrics import metrics
+from src.utils.tracing import traced
+
+if TYPE_CHECKING:
+    from src.core.jules_client import JulesClient
+
+ACTIVITY_KINDS = (
+    "sessionFailed", "sessionCompleted", "planGenerated", "planApproved",
+    "progressUpdated", "agentMessaged", "userMessaged", "artifacts",
+)
+SUMMARY_LENGTH = 200
+
+
+def activity_kind(activity: Dict) -> str:
+    return next((kind for kind in ACTIVITY_KINDS if kind in activity), "unknown")
+
+
+def activity_summary(activity: Dict, kind: str) -> Optional[str]:
+    payload = activity.get(kind)
+    if isinstance(payload, dict):
+        text = next((v for v in payload.values() if isinstance(v, str) and v), None)
+    else:
+        text = activity.get("description")
+    return text[:SUMMARY_LENGTH] if text else None
+
+
+@traced
+class ActivityStream:
+    """Incrementally fetches Jules session activities using a persisted per-session cursor.
+
+    The cursor stores the page token of the last non-empty page and the last
+    activity seen on it, so each poll re-reads at most that one page plus any
+    pages added since. New activities are appended to a compact local log.
+    """
+
+    def __init__(self, jules_client: "JulesClient", db: Database):
+        self.jules_client = jules_client
+        self.db = db
+
+    def poll(self, session_id: str) -> List[Dict]:
+        """Return activities that appeared since the previous poll, oldest first."""
+        cursor = self.db.get_activity_cursor(session_id)
+        page_token, last_id, last_time, last_activity_at = cursor if cursor else (None, None, None, time.time())
+
+        new_activities = self._fetch_since(session_id, page_token, last_id, last_time)
+        if new_activities is None and page_token:
+            # The stored page token may have expired; rescan and de-duplicate by create time.
+            logger.info(f"Activity cursor for session {session_id} rejected. Rescanning from the start.")
+            new_activities = self._fetch_since(session_id, None, last_id, last_time)
+        if new_activities is None:
+            return []
+
+        fetched, resume_token = new_activities
+        metrics.inc("ato_jules_activities_fetched_total", value=len(fetched))
+        if fetched:
+            last = fetched[-1]
+            last_id, last_time, last_activity_at = last.get("id") or last.get("name"), last.get("createTime"), time.time()
+        rows = []
+        for activity in fetched:
+            kind = activity_kind(activity)
+            rows.append((activity.get("id") or activity.get("name"), activity.get("createTime"), kind,
+                         activity_summary(activity, kind)))
+        if fetched or cursor is None or resume_token != page_token:
+            self.db.save_activities(session_id, rows, resume_token, last_id, last_time, last_activity_at)
+        return fetched
+
+    def _fetch_since(self, session_id: str, page_token: Optional[str], last_id: Optional[str],
+                     last_time: Optional[str]):
+        """Walk pages from ``page_token``; returns (new activities, token of the last non-empty page) or None on error."""
+        token = page_token
+        resume_token = page_token
+        scanned: List[Dict] = []
+        while True:
+            page = self.jules_client.list_activities_page(session_id, settings.JULES_ACTIVITY_PAGE_SIZE, token)
+            if page is None:
+                return None
+            activities = page.get("activities", [])
+            scanned.extend(activities)
+            if activities:
+                resume_token = token
+            token = page.get("nextPageToken")
+            if not token:
+                break
+
+        if last_id is None:
+            return scanned, resume_token
+        ids = [a.get("id") or a.get("name") for a in scanned]
+        if last_id in ids:
+            return scanned[ids.index(last_id) + 1:], resume_token
+        # The last seen activity is not on the scanned pages; fall back to create times.
+        return [a for a in scanned if not last_time or (a.get("createTime") or "") > last_time], resume_token
+
+    def is_failed(self, activities: List[Dict]) -> bool:
+        return any(activity_kind(a) == "sessionFailed" for a in activities)
+
+    def is_stalled(self, session_id: str, now: Optional[float] = None) -> bool:
+        """True if the session produced no new activity for JULES_STALL_MINUTES."""
+        cursor = self.db.get_activity_cursor(session_id)
+        if not cursor:
+            return False
+        return ((now or time.time()) - cursor[3]) > settings.JULES_STALL_MINUTES * 60
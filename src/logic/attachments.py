@@ -0,0 +1,170 @@
+"""Normalisation of image attachments before they are sent to Jules.
+
+Images above ``ATTACHMENT_MAX_DIMENSION`` are downscaled and re-encoded: as
+lossless WebP when they need exact pixels (transparency or few colours, as in
+UI screenshots), as lossy WebP/JPEG otherwise. Near-duplicates are dropped by
+perceptual hash (dHash), and attachments stop being added once the encoded
+payload would exceed ``ATTACHMENT_PAYLOAD_BUDGET``. Decoding and encoding run
+in a process pool; results are cached by the SHA-256 of the source bytes.
+
+Pillow is optional (the ``images`` extra). Without it images are sent as
+uploaded, exact duplicates are dropped and the payload budget still applies.
+"""
+import atexit
+import base64
+import hashlib
+import importlib.util
+import io
+import mimetypes
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from src.config import settings
+from src.utils.logger import logger
+from src.utils.metrics import metrics
+from src.utils.tracing import traced
+
+# Pillow is optional (see the README) and only imported by the worker processes that use it.
+PILLOW_AVAILABLE = importlib.util.find_spec("PIL") is not None
+NORMALIZED_CACHE_SIZE = 256
+# Images with at most this many distinct colours are treated as graphics and kept lossless.
+LOSSLESS_MAX_COLORS = 256
+EXIF_ORIENTATION = 0x0112
+
+
+class Normalized(NamedTuple):
+    data: bytes
+    mime_type: Optional[str]  # None keeps the type guessed from the file name
+    dhash: Optional[int]
+
+
+def _dhash(image) -> int:
+    """64-bit difference hash: whether each pixel of a 9x8 greyscale thumbnail is brighter than its right neighbour."""
+    from PIL import Image
+
+    pixels = image.convert("L").resize((9, 8), Image.Resampling.LANCZOS).tobytes()
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return bits
+
+
+def normalize_image(content: bytes, max_dimension: int, image_format: str, quality: int) -> Normalized:
+    """Downscale and re-encode one image; runs in a worker process. Non-images are returned unchanged."""
+    from PIL import Image, ImageOps
+
+    try:
+        image = Image.open(io.BytesIO(content))
+        image.load()
+    except Exception:
+        return Normalized(content, None, None)
+    # Re-encoding drops the EXIF orientation tag, so phone photos are rotated upright first.
+    rotated = image.getexif().get(EXIF_ORIENTATION, 1) != 1
+    if rotated:
+        image = ImageOps.exif_transpose(image)
+    dhash = _dhash(image)
+    resized = max(image.size) > max_dimension
+    if resized:
+        image.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+
+    has_alpha = image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info)
+    lossless = has_alpha or image.convert("RGB").getcolors(LOSSLESS_MAX_COLORS) is not None
+    out = io.BytesIO()
+    if image_format == "webp":
+        image = image.convert("RGBA" if has_alpha else "RGB")
+        if lossless:
+            image.save(out, "WEBP", lossless=True, method=4)
+        else:
+            image.save(out, "WEBP", quality=quality, method=4)
+        mime_type = "image/webp"
+    elif lossless:  # JPEG has no lossless mode or transparency, so graphics stay PNG.
+        image.save(out, "PNG", optimize=True)
+        mime_type = "image/png"
+    else:
+        image.convert("RGB").save(out, "JPEG", quality=quality, optimize=True, progressive=True)
+        mime_type = "image/jpeg"
+
+    # Re-encoding a small, already well-compressed image can make it larger.
+    if not resized and not rotated and out.tell() >= len(content):
+        return Normalized(content, None, dhash)
+    return Normalized(out.getvalue(), mime_type, dhash)
+
+
+@traced
+class AttachmentProcessor:
+    def __init__(self):
+        self._cache: "OrderedDict[str, Normalized]" = OrderedDict()
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # Spawned, not forked: the parent runs outbox and log threads.
+            self._pool = ProcessPoolExecutor(max_workers=settings.ATTACHMENT_WORKERS,
+                                             mp_context=multiprocessing.get_context("spawn"))
+            atexit.register(self._pool.shutdown, cancel_futures=True)
+        return self._pool
+
+    def _normalize(self, contents: List[bytes]) -> List[Normalized]:
+        keys = [hashlib.sha256(content).hexdigest() for content in contents]
+        pending: Dict[str, bytes] = {}
+        for key, content in zip(keys, contents):
+            metrics.record_cache("attachments", key in self._cache)
+            if key in self._cache:
+                self._cache.move_to_end(key)
+            elif not PILLOW_AVAILABLE:
+                self._cache[key] = Normalized(content, None, None)
+            else:
+                pending[key] = content
+
+        if pending:
+            args = (settings.ATTACHMENT_MAX_DIMENSION, settings.ATTACHMENT_IMAGE_FORMAT, settings.ATTACHMENT_IMAGE_QUALITY)
+            futures = {key: self._executor().submit(normalize_image, content, *args) for key, content in pending.items()}
+            for key, future in futures.items():
+                try:
+                    self._cache[key] = future.result()
+                except Exception as e:
+                    logger.error(f"Error normalizing attachment {key[:12]}: {e}")
+                    self._cache[key] = Normalized(pending[key], None, None)
+        while len(self._cache) > NORMALIZED_CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return [self._cache[key] for key in keys]
+
+    def prepare(self, files: List[Tuple[str, bytes]]) -> List[Dict]:
+        """Turn downloaded ``(url, content)`` pairs into Jules attachments, in order, within the payload budget."""
+        attachments = []
+        seen_hashes: List[int] = []
+        seen_digests = set()
+        payload = 0
+        for (url, content), normalized in zip(files, self._normalize([content for _, content in files])):
+            digest = hashlib.sha256(normalized.data).digest()
+            if digest in seen_digests or (normalized.dhash is not None and any(
+                    bin(normalized.dhash ^ h).count("1") <= settings.ATTACHMENT_DUPLICATE_DISTANCE for h in seen_hashes)):
+                logger.info(f"Skipping attachment {url}: duplicate of an earlier image")
+                metrics.inc("ato_attachments_dropped_total", {"reason": "duplicate"})
+                continue
+            data = base64.b64encode(normalized.data).decode("utf-8")
+            if payload + len(data) > settings.ATTACHMENT_PAYLOAD_BUDGET:
+                logger.warning(f"Skipping attachment {url}: {len(data)} bytes would exceed the attachment budget")
+                metrics.inc("ato_attachments_dropped_total", {"reason": "budget"})
+                continue
+            payload += len(data)
+            seen_digests.add(digest)
+            if normalized.dhash is not None:
+                seen_hashes.append(normalized.dhash)
+
+            name = url.split("/")[-1]
+            mime_type = normalized.mime_type
+            if mime_type is None:
+                mime_type, _ = mimetypes.guess_type(url)
+            elif mime_type != mimetypes.guess_type(url)[0]:
+                name = f"{name.rsplit('.', 1)[0]}{mimetypes.guess_extension(mime_type)}"
+            metrics.inc("ato_attachment_bytes_total", {"stage": "downloaded"}, value=len(content))
+            metrics.inc("ato_attachment_bytes_total", {"stage": "sent"}, value=len(normalized.data))
+            attachments.append({
+                "name": name,
+                "mimeType": mime_type or "application/octet-stream",
+                "data": data
+            })
+        return attachments
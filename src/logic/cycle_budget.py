@@ -0,0 +1,77 @@
+import time
+from typing import Callable, Dict, Iterable, Iterator, Optional, TypeVar
+from src.config import settings
+from src.core.database import Database
+from src.utils.logger import logger
+from src.utils.metrics import metrics
+
+T = TypeVar("T")
+
+
+class Deadline:
+    """A point in time a phase should finish by; checked cooperatively between items."""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(self.at - time.monotonic(), 0.0)
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.at
+
+
+class CycleBudget:
+    """Splits the cycle time budget between phases.
+
+    Each phase gets its share of the time still left, relative to the shares of
+    the phases that have not run yet, so time a phase does not use goes to the
+    later ones. Every phase gets at least ``CYCLE_PHASE_MIN_SECONDS`` even when
+    an earlier phase overran, so none of them is starved.
+    """
+
+    def __init__(self, seconds: Optional[float] = None, shares: Optional[Dict[str, float]] = None):
+        self.seconds = seconds or settings.CYCLE_TIME_BUDGET
+        self.at = time.monotonic() + self.seconds
+        self._pending = dict(shares if shares is not None else settings.CYCLE_PHASE_SHARES)
+
+    def phase_deadline(self, phase: str) -> Deadline:
+        share = self._pending.pop(phase, 0.0)
+        total = share + sum(self._pending.values())
+        remaining = max(self.at - time.monotonic(), 0.0)
+        seconds = remaining * share / total if total else remaining
+        return Deadline(max(seconds, settings.CYCLE_PHASE_MIN_SECONDS))
+
+
+class CarryOver:
+    """Persisted per-phase list of items a phase ran out of time for.
+
+    ``iterate`` yields carried items first and, once the deadline passes,
+    stores the rest for the next cycle instead of processing them.
+    """
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    def iterate(self, phase: str, items: Iterable[T], key: Callable[[T], object],
+                deadline: Optional[Deadline]) -> Iterator[T]:
+        if deadline is None:
+            yield from items
+            return
+        carried = {item_id: position for position, item_id in enumerate(self.db.get_carry_over(phase))}
+        ordered = sorted(items, key=lambda item: carried.get(str(key(item)), len(carried)))
+        for index, item in enumerate(ordered):
+            # The first item always runs, so a phase makes progress even on an exhausted budget.
+            if index and deadline.expired():
+                left = [str(key(i)) for i in ordered[index:]]
+                self.db.set_carry_over(phase, left)
+                metrics.inc("ato_phase_deadline_exceeded_total", {"phase": phase})
+                metrics.set_gauge("ato_carry_over_items", len(left), {"phase": phase})
+                logger.warning(f"Phase {phase} reached its {deadline.seconds:.0f}s deadline. "
+                               f"Carrying {len(left)} item(s) over to the next cycle.")
+                return
+            yield item
+        if carried:
+            self.db.set_carry_over(phase, [])
+        metrics.set_gauge("ato_carry_over_items", 0, {"phase": phase})
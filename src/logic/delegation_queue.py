@@ -0,0 +1,128 @@
+import heapq
+import time
+from datetime import datetime
+from typing import Any, Container, Dict, Iterable, List, Optional, Tuple
+from src.config import settings
+from src.core.database import Database
+
+QueueItem = Tuple[str, str]  # (task_type, task_id)
+
+
+def _timestamp(value: Any) -> float:
+    """Convert a GitLab ISO string or PyGithub datetime to epoch seconds; unknown values count as now."""
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            pass
+    return time.time()
+
+
+def _sort_key(score: float, created_at: Any) -> float:
+    # Lower keys are dequeued first. Age is folded in through the creation time
+    # rather than "now", so keys do not drift with time; they change only with labels or weights.
+    return settings.DELEGATION_AGE_WEIGHT * _timestamp(created_at) / 3600 - score
+
+
+def issue_sort_key(issue) -> float:
+    labels = getattr(issue, "labels", None)
+    labels = labels if isinstance(labels, (list, tuple)) else []
+    score = sum(settings.DELEGATION_LABEL_WEIGHTS.get(label, 0.0) for label in labels)
+    return _sort_key(score, getattr(issue, "created_at", None))
+
+
+def red_pr_sort_key(pr) -> float:
+    return _sort_key(settings.DELEGATION_RED_PR_WEIGHT, getattr(pr, "created_at", None))
+
+
+class DelegationQueue:
+    """Persisted min-heap of tasks waiting for a free Jules slot.
+
+    Rows live in the ``work_queue`` table so the order survives restarts; the
+    in-memory heap uses lazy deletion, so push, pop and remove are O(log n).
+    ``objects`` holds the latest listed issue/PR for each task so slots can be
+    refilled between listings without another API call.
+    """
+
+    def __init__(self, db: Database):
+        self.db = db
+        self._heap: List[Tuple[float, str, str]] = []
+        self._keys: Dict[QueueItem, float] = {}
+        self._shas: Dict[QueueItem, Optional[str]] = {}
+        self.objects: Dict[QueueItem, Any] = {}
+        for task_type, task_id, sort_key, head_sha in self.db.get_work_queue():
+            self._keys[(task_type, task_id)] = sort_key
+            self._shas[(task_type, task_id)] = head_sha
+            self._heap.append((sort_key, task_type, task_id))
+        heapq.heapify(self._heap)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, item: QueueItem) -> bool:
+        return item in self._keys
+
+    def head_sha(self, item: QueueItem) -> Optional[str]:
+        return self._shas.get(item)
+
+    def push(self, task_type: str, task_id: str, sort_key: float, head_sha: Optional[str] = None):
+        item = (task_type, str(task_id))
+        if self._keys.get(item) == sort_key and self._shas.get(item) == head_sha:
+            return
+        self.db.upsert_work_item(task_type, item[1], sort_key, head_sha)
+        if self._keys.get(item) != sort_key:
+            heapq.heappush(self._heap, (sort_key, task_type, item[1]))
+        self._keys[item] = sort_key
+        self._shas[item] = head_sha
+
+    def peek(self, skip: Container[QueueItem] = ()) -> Optional[QueueItem]:
+        """Return the highest-priority task not in ``skip`` without removing it, or None if there is none."""
+        set_aside = []
+        found = None
+        while self._heap:
+            sort_key, task_type, task_id = self._heap[0]
+            item = (task_type, task_id)
+            if self._keys.get(item) != sort_key:
+                heapq.heappop(self._heap)  # Stale entry left behind by remove() or a re-keyed push().
+            elif item in skip:
+                set_aside.append(heapq.heappop(self._heap))
+            else:
+                found = item
+                break
+        for entry in set_aside:
+            heapq.heappush(self._heap, entry)
+        return found
+
+    def pop(self) -> Optional[QueueItem]:
+        """Remove and return the highest-priority task, or None if the queue is empty."""
+        while self._heap:
+            sort_key, task_type, task_id = heapq.heappop(self._heap)
+            item = (task_type, task_id)
+            if self._keys.get(item) != sort_key:
+                continue  # Stale entry left behind by remove() or a re-keyed push().
+            self._forget(item)
+            return item
+        return None
+
+    def remove(self, task_type: str, task_id: str):
+        item = (task_type, str(task_id))
+        if item in self._keys:
+            self._forget(item)
+
+    def retain(self, task_type: str, task_ids: Iterable[str]):
+        """Drop queued tasks of ``task_type`` that are no longer listed (closed, unlabelled, merged)."""
+        keep = set(task_ids)
+        for item in [i for i in self._keys if i[0] == task_type and i[1] not in keep]:
+            self._forget(item)
+            self.objects.pop(item, None)
+
+    def _forget(self, item: QueueItem):
+        del self._keys[item]
+        self._shas.pop(item, None)
+        self.db.delete_work_item(*item)
+        # Rebuild once stale entries dominate so the heap stays proportional to the queue.
+        if len(self._heap) > 2 * len(self._keys) + 64:
+            self._heap = [(k, t, i) for (t, i), k in self._keys.items()]
+            heapq.heapify(self._heap)
@@ -0,0 +1,143 @@
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Any, List, Optional, Tuple
+from src.config import settings
+from src.core.database import Database
+from src.utils.logger import logger
+from src.utils.metrics import metrics
+from src.utils.tracing import traced
+
+if TYPE_CHECKING:
+    from src.core.github_client import GitHubClient
+
+WATERMARK_KEY = "pr_mirror.watermark"
+FULL_SYNC_KEY = "pr_mirror.full_sync_at"
+
+
+def _iso(value: Any) -> Optional[str]:
+    """Normalise a PyGithub datetime (or ISO string) to a sortable UTC ISO string."""
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    return value if isinstance(value, str) else None
+
+
+@dataclass
+class PRRef:
+    sha: str
+    ref: Optional[str]
+
+
+@dataclass
+class MirroredPR:
+    """A PR as stored in ``pr_mirror``; ``head`` mirrors PyGithub's shape so callers can use either."""
+    number: int
+    state: str
+    draft: bool
+    title: str
+    html_url: Optional[str]
+    head: PRRef
+    base_sha: Optional[str]
+    created_at: Optional[str]
+    updated_at: str
+    mergeable: Optional[bool]
+    ci_status: Optional[str]
+    comment_count: Optional[int]
+    last_comment: Optional[str]
+    comments_at: Optional[str]
+
+    @classmethod
+    def from_row(cls, row: Tuple) -> "MirroredPR":
+        (number, state, draft, title, html_url, head_sha, head_ref, base_sha, created_at, updated_at,
+         mergeable, ci_status, comment_count, last_comment, comments_at) = row
+        return cls(number, state, bool(draft), title, html_url, PRRef(head_sha, head_ref), base_sha, created_at,
+                   updated_at, None if mergeable is None else bool(mergeable), ci_status, comment_count,
+                   last_comment, comments_at)
+
+
+def _row(pr) -> Tuple:
+    return (pr.number, pr.state, int(bool(pr.draft)), pr.title, pr.html_url, pr.head.sha, pr.head.ref,
+            pr.base.sha, _iso(pr.created_at), _iso(pr.updated_at))
+
+
+@traced
+class PRMirror:
+    """Local SQLite copy of GitHub PR state, refreshed from the PRs updated since the last pass.
+
+    PRs are listed sorted by ``updated`` (newest first) and the listing stops at
+    the stored watermark, so a steady-state refresh is a single request. Fields
+    the list endpoint does not return (mergeability, comments) and the CI
+    result are fetched on demand and kept until the PR (or its head) changes.
+    Every ``PR_MIRROR_FULL_SYNC_INTERVAL`` seconds the open PRs are listed in
+    full and mergeability is re-checked, since a moving base branch does not
+    bump a PR's ``updated_at``.
+    """
+
+    def __init__(self, gh_client: "GitHubClient", db: Database):
+        self.gh_client = gh_client
+        self.db = db
+
+    def refresh(self):
+        watermark = self.db.get_state(WATERMARK_KEY)
+        last_full_sync = float(self.db.get_state(FULL_SYNC_KEY) or 0)
+        if watermark is None or time.time() - last_full_sync >= settings.PR_MIRROR_FULL_SYNC_INTERVAL:
+            self._full_sync(watermark)
+        else:
+            self._incremental_sync(watermark)
+        metrics.set_gauge("ato_pr_mirror_open_prs", len(self.db.get_mirror_prs("open")))
+
+    def _full_sync(self, watermark: Optional[str]):
+        rows = [_row(pr) for pr in self.gh_client.get_pull_requests(state="open")]
+        self.db.upsert_mirror_prs(rows)
+        closed = self.db.close_missing_mirror_prs([row[0] for row in rows])
+        self.db.reset_mirror_mergeable()
+        watermark = max([row[9] for row in rows if row[9]] + ([watermark] if watermark else []), default=None)
+        self.db.set_state(WATERMARK_KEY, watermark or _iso(datetime.now(timezone.utc)))
+        self.db.set_state(FULL_SYNC_KEY, str(time.time()))
+        metrics.inc("ato_pr_mirror_updates_total", {"kind": "full"}, value=len(rows))
+        logger.info(f"PR mirror: full sync of {len(rows)} open PR(s), {closed} closed since the last sync.")
+
+    def _incremental_sync(self, watermark: str):
+        rows = []
+        # Newest first, so the listing (and its pagination) stops at the first PR not updated since the watermark.
+        # PRs updated in the same second as the watermark are re-read; their cached fields are kept.
+        for pr in self.gh_client.get_pull_requests(state="all", sort="updated", direction="desc"):
+            updated_at = _iso(pr.updated_at)
+            if updated_at is None or updated_at < watermark:
+                break
+            rows.append(_row(pr))
+        if rows:
+            self.db.upsert_mirror_prs(rows)
+            self.db.set_state(WATERMARK_KEY, max(row[9] for row in rows))
+        metrics.inc("ato_pr_mirror_updates_total", {"kind": "incremental"}, value=len(rows))
+        logger.debug("PR mirror: %d PR(s) updated since %s", len(rows), watermark)
+
+    def open_prs(self) -> List[MirroredPR]:
+        return [MirroredPR.from_row(row) for row in self.db.get_mirror_prs("open")]
+
+    def mergeable(self, pr: MirroredPR) -> Optional[bool]:
+        """Mergeability of a PR, fetched only when unknown; None while GitHub is still computing it."""
+        metrics.record_cache("pr_mirror_mergeable", pr.mergeable is not None)
+        if pr.mergeable is None:
+            pr.mergeable = self.gh_client.get_pull_request(pr.number).mergeable
+            if pr.mergeable is not None:
+                self.db.set_mirror_mergeable(pr.number, pr.mergeable)
+        return pr.mergeable
+
+    def comments(self, pr: MirroredPR) -> Tuple[int, Optional[str]]:
+        """Number of comments and body of the last one, re-read only after the PR was updated."""
+        fresh = pr.comments_at is not None and pr.comments_at == pr.updated_at
+        metrics.record_cache("pr_mirror_comments", fresh)
+        if not fresh:
+            comments = list(self.gh_client.get_pr_comments(pr.number))
+            pr.comment_count = len(comments)
+            pr.last_comment = comments[-1].body if comments else None
+            pr.comments_at = pr.updated_at
+            self.db.set_mirror_comments(pr.number, pr.comment_count, pr.last_comment, pr.comments_at)
+        return pr.comment_count or 0, pr.last_comment
+
+    def record_ci_status(self, pr: MirroredPR, status: str):
+        pr.ci_status = status
+        self.db.set_mirror_ci_status(pr.number, pr.head.sha, status)
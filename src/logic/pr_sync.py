@@ -1,18 +1,41 @@
 import json
 import os
 import re
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Optional, Tuple
 from src.config import settings
-from src.core.gitlab_client import GitLabClient
-from src.core.github_client import GitHubClient
 from src.core.database import Database
-from src.utils.logger import logger
+from src.logic.cycle_budget import CarryOver, Deadline
+from src.logic.pr_mirror import MirroredPR
+from src.utils.logger import logger, set_correlation_id
+from src.utils.metrics import metrics
+from src.utils.tracing import traced
 
+if TYPE_CHECKING:
+    from src.core.gitlab_client import GitLabClient
+    from src.core.github_client import GitHubClient
+    from src.core.outbox import Outbox
+    from src.logic.pr_mirror import PRMirror
+
+# The compare API returns at most this many changed files.
+COMPARE_FILE_LIMIT = 300
+CLOSURES_WATERMARK_KEY = "pr_sync.closures_updated_after"
+# GitLab stamps updated_at with its own clock, so the watermark is moved back to allow for drift.
+CLOSURES_CLOCK_SKEW = 300
+MR_IIDS_PER_REQUEST = 100
+
+
+@traced
 class PRSync:
-    def __init__(self, gl_client: GitLabClient, gh_client: GitHubClient, db: Database, state_file: str = "data/synced_prs.json"):
+    def __init__(self, gl_client: "GitLabClient", gh_client: "GitHubClient", db: Database, state_file: str = "data/synced_prs.json",
+                 outbox: Optional["Outbox"] = None, pr_mirror: Optional["PRMirror"] = None):
         self.gl_client = gl_client
         self.gh_client = gh_client
         self.db = db
+        self.outbox = outbox
+        self.pr_mirror = pr_mirror
         self.state_file = state_file
+        self.carry_over = CarryOver(db)
         self._migrate_from_json()
 
     def _migrate_from_json(self):
@@ -34,18 +57,32 @@ class PRSync:
             except Exception as e:
                 logger.error(f"Error during migration from {self.state_file}: {e}")
 
-    def sync_github_to_gitlab(self):
+    def _open_prs(self):
+        """Open PRs from the local mirror when there is one, else from a live listing."""
+        if self.pr_mirror:
+            return self.pr_mirror.open_prs()
+        return self.gh_client.get_pull_requests(state="open")
+
+    def sync_github_to_gitlab(self, deadline: Optional[Deadline] = None):
         """Module C: GitHub -> GitLab Sync"""
         logger.info("Checking for GitHub PRs to sync to GitLab...")
-        prs = self.gh_client.get_pull_requests(state="open")
+        prs = self._open_prs()
         synced_prs = self.db.get_all_synced_prs()
+        synced_heads = self.db.get_synced_pr_heads() if synced_prs else {}
 
-        for pr in prs:
+        for pr in self.carry_over.iterate("sync_github_to_gitlab", prs, lambda pr: pr.number, deadline):
+            set_correlation_id(f"github_pr:{pr.number}")
             if pr.draft:
                 continue
 
             if pr.number in synced_prs:
-                continue
+                if synced_prs[pr.number] != 0:
+                    self._resync(pr, synced_heads.get(pr.number))
+                    continue
+                # MR 0 is an old format entry we can't track, or a head whose files were all identical on GitLab.
+                # The latter is looked at again once the PR moves on.
+                if synced_heads.get(pr.number) in (None, pr.head.sha):
+                    continue
 
             # Detect GitLab Issue ID
             # Priority 1: Check database (sessions or synced_prs)
@@ -62,41 +99,25 @@ class PRSync:
 
             logger.info(f"Syncing GitHub PR #{pr.number} to GitLab MR")
 
-            files = self.gh_client.get_pr_diff(pr.number, pr=pr)
-            actions = []
-
-            for f in files:
-                try:
-                    if f.status == "removed":
-                        actions.append({
-                            "action": "delete",
-                            "file_path": f.filename
-                        })
-                    elif f.status == "renamed":
-                        content = self.gh_client.get_file_content(f.filename, pr.head.sha)
-                        actions.append({
-                            "action": "move",
-                            "file_path": f.filename,
-                            "previous_path": f.previous_filename,
-                            "content": content
-                        })
-                    else: # added or modified
-                        content = self.gh_client.get_file_content(f.filename, pr.head.sha)
-                        action = "update" if self.gl_client.file_exists(f.filename) else "create"
-                        actions.append({
-                            "action": action,
-                            "file_path": f.filename,
-                            "content": content
-                        })
-                except Exception as e:
-                    logger.error(f"Error retrieving content for file {f.filename} in PR #{pr.number}: {e}")
+            files = self.gh_client.get_pr_diff(pr.number, pr=None if isinstance(pr, MirroredPR) else pr)
+            base = settings.STARTING_BRANCH_NAME
+            actions, unchanged, failed = self._file_actions(pr, files, ref=base)
 
+            if failed:
+                # A partial MR would silently differ from the PR; nothing is recorded, so the next cycle retries.
+                logger.warning(f"Could not fetch {failed} file(s) of PR #{pr.number}; retrying next cycle")
+                continue
             if not actions:
-                logger.warning(f"No actions could be generated for PR #{pr.number}")
+                if unchanged:
+                    logger.info(f"All files of PR #{pr.number} are already identical on GitLab; nothing to sync")
+                    # Recorded with its head, so the PR's files are not listed again until it is pushed to.
+                    self.db.add_synced_pr(pr.number, 0, gl_issue_id, head_sha=pr.head.sha)
+                else:
+                    logger.warning(f"No actions could be generated for PR #{pr.number}")
                 continue
 
             source_branch = f"sync-gh-{pr.number}"
-            if self.gl_client.create_branch(source_branch):
+            if self.gl_client.create_branch(source_branch, ref=base):
                 if self.gl_client.commit_changes(source_branch, f"Sync from GH PR #{pr.number}", actions):
                     try:
                         description = f"Synchronized from GitHub PR #{pr.number}\n\nOriginal link: {pr.html_url}"
@@ -106,37 +127,167 @@ class PRSync:
 
                         mr = self.gl_client.create_merge_request(
                             source_branch=source_branch,
-                            target_branch=settings.STARTING_BRANCH_NAME,
+                            target_branch=base,
                             title=f"Sync: {pr.title}",
                             description=description
                         )
-                        self.db.add_synced_pr(pr.number, mr.iid, gl_issue_id)
+                        self.db.add_synced_pr(pr.number, mr.iid, gl_issue_id, head_sha=pr.head.sha)
                         logger.info(f"Successfully created GitLab MR !{mr.iid} for GitHub PR #{pr.number}")
                     except Exception as e:
                         logger.error(f"Failed to create GitLab MR for PR #{pr.number}: {e}")
 
-    def sync_gitlab_closures_to_github(self):
+    def _file_actions(self, pr, files, ref: str) -> Tuple[list, int, int]:
+        """
+        GitLab commit actions that bring ``ref`` to the PR head for ``files``.
+        Files whose GitHub blob SHA matches the git blob ID on ``ref`` are already
+        byte-identical and are left out. Returns the actions, how many files were left out
+        and how many could not be fetched from GitHub.
+        """
+        files = list(files)
+        paths = [f.filename for f in files] + [f.previous_filename for f in files if f.status == "renamed"]
+        blob_ids = self.gl_client.get_blob_ids(paths, ref=ref)
+        actions, unchanged, failed = [], 0, 0
+        for f in files:
+            try:
+                if f.status == "removed":
+                    if f.filename not in blob_ids:
+                        unchanged += 1
+                        continue
+                    actions.append({
+                        "action": "delete",
+                        "file_path": f.filename
+                    })
+                    continue
+                moved = f.status == "renamed" and f.previous_filename in blob_ids
+                if not moved and blob_ids.get(f.filename) == f.sha:
+                    unchanged += 1
+                    continue
+                content = self.gh_client.get_file_content(f.filename, pr.head.sha, sha=f.sha)
+                if moved:
+                    actions.append({
+                        "action": "move",
+                        "file_path": f.filename,
+                        "previous_path": f.previous_filename,
+                        "content": content
+                    })
+                else: # added or modified
+                    action = "update" if f.filename in blob_ids else "create"
+                    actions.append({
+                        "action": action,
+                        "file_path": f.filename,
+                        "content": content
+                    })
+            except Exception as e:
+                failed += 1
+                logger.error(f"Error retrieving content for file {f.filename} in PR #{pr.number}: {e}")
+        if unchanged:
+            metrics.inc("ato_sync_unchanged_files_total", value=unchanged)
+            logger.debug("PR #%d: %d file(s) already identical on %s", pr.number, unchanged, ref,
+                         extra={"sample": True})
+        return actions, unchanged, failed
+
+    def _resync(self, pr, synced_head: Optional[str]):
+        """Bring the MR branch of an already synced PR up to its current head.
+
+        A head that fast-forwards from the synced one only needs the files the
+        compare API reports between the two, committed on top of the branch.
+        Anything else (a force-push, a rebase, or a PR synced before heads were
+        recorded) rebuilds the branch from the starting branch with the whole PR.
+        """
+        if synced_head == pr.head.sha:
+            return
+        source_branch = f"sync-gh-{pr.number}"
+        comparison = self.gh_client.compare(synced_head, pr.head.sha) if synced_head else None
+        # The compare API lists at most 300 files, so a larger delta is synced in full.
+        if comparison is not None and comparison.status == "ahead" and len(comparison.files) < COMPARE_FILE_LIMIT:
+            files = comparison.files
+            actions, _, failed = self._file_actions(pr, files, ref=source_branch)
+            if failed:
+                # The synced head is kept, so the next cycle compares from it again and retries every file.
+                logger.warning(f"Could not fetch {failed} file(s) of GitHub PR #{pr.number}; retrying next cycle")
+                return
+            if actions:
+                committed = self.gl_client.commit_changes(
+                    source_branch, f"Sync {pr.head.sha[:7]} from GH PR #{pr.number}", actions)
+            else:
+                committed = True  # The branch already holds the new head's content, or the delta changed no files.
+            if committed:
+                self.db.set_synced_pr_head(pr.number, pr.head.sha)
+                metrics.inc("ato_pr_resyncs_total", {"mode": "delta"})
+                metrics.inc("ato_pr_resync_files_total", {"mode": "delta"}, value=len(actions))
+                logger.info(f"Re-synced {len(actions)} changed file(s) of GitHub PR #{pr.number} to {source_branch}")
+                return
+            logger.warning(f"Incremental re-sync of GitHub PR #{pr.number} failed; rebuilding {source_branch}")
+        else:
+            logger.info(f"GitHub PR #{pr.number} moved from {synced_head} to {pr.head.sha} without a fast-forward; "
+                        f"rebuilding {source_branch}")
+
+        files = list(self.gh_client.get_pr_diff(pr.number, pr=None if isinstance(pr, MirroredPR) else pr))
+        base = settings.STARTING_BRANCH_NAME
+        actions, _, failed = self._file_actions(pr, files, ref=base)
+        if failed:
+            logger.warning(f"Could not fetch {failed} file(s) of GitHub PR #{pr.number}; retrying next cycle")
+            return
+        if not actions:
+            # Nothing differs from the starting branch; the head is stored so the PR is not rebuilt every cycle.
+            self.db.set_synced_pr_head(pr.number, pr.head.sha)
+            return
+        if self.gl_client.commit_changes(source_branch, f"Resync from GH PR #{pr.number}", actions, start_branch=base):
+            self.db.set_synced_pr_head(pr.number, pr.head.sha)
+            metrics.inc("ato_pr_resyncs_total", {"mode": "full"})
+            metrics.inc("ato_pr_resync_files_total", {"mode": "full"}, value=len(actions))
+
+    def sync_gitlab_closures_to_github(self, deadline: Optional[Deadline] = None):
         """Track GitLab MR status and close corresponding GitHub PR if GitLab MR is closed/merged."""
         logger.info("Checking for GitLab MR closures to sync back to GitHub...")
         synced_prs = self.db.get_all_synced_prs()
-        for gh_pr_id, gl_mr_iid in synced_prs.items():
-            if gl_mr_iid == 0:
-                continue # Skip old format entries we can't track
+        # Old format entries (MR 0) can't be tracked.
+        gh_pr_by_mr = {gl_mr_iid: gh_pr_id for gh_pr_id, gl_mr_iid in synced_prs.items() if gl_mr_iid}
+        if not gh_pr_by_mr:
+            return
+        started = datetime.now(timezone.utc) - timedelta(seconds=CLOSURES_CLOCK_SKEW)
+        watermark = self.db.get_state(CLOSURES_WATERMARK_KEY)
+        if watermark:
+            # One listing of the MRs updated since the last pass, however many PRs are synced.
+            mrs = self.gl_client.get_merge_requests(updated_after=watermark)
+        else:
+            # The first pass looks the synced MRs up by IID, a page at a time.
+            iids = sorted(gh_pr_by_mr)
+            mrs = []
+            for start in range(0, len(iids), MR_IIDS_PER_REQUEST):
+                page = self.gl_client.get_merge_requests(iids=iids[start:start + MR_IIDS_PER_REQUEST])
+                if page is None:
+                    mrs = None
+                    break
+                mrs.extend(page)
+        if mrs is None:
+            return  # Retried from the same watermark next cycle.
 
-            mr = self.gl_client.get_merge_request(gl_mr_iid)
-            if mr and mr.state in ["closed", "merged"]:
-                logger.info(f"GitLab MR !{gl_mr_iid} is {mr.state}. Closing GitHub PR #{gh_pr_id}")
-                try:
+        closed = [(gh_pr_by_mr[mr.iid], mr) for mr in mrs
+                  if mr.iid in gh_pr_by_mr and mr.state in ["closed", "merged"]]
+        done = 0
+        for gh_pr_id, mr in self.carry_over.iterate("sync_gitlab_closures", closed, lambda item: item[0], deadline):
+            set_correlation_id(f"github_pr:{gh_pr_id}")
+            logger.info(f"GitLab MR !{mr.iid} is {mr.state}. Closing GitHub PR #{gh_pr_id}")
+            try:
+                if self.outbox:
+                    # Delivered (and retried) by the outbox workers.
+                    self.outbox.enqueue("github.close_pr", {"pr_number": gh_pr_id}, f"close_pr:{gh_pr_id}:{mr.iid}")
+                else:
                     self.gh_client.close_pr(gh_pr_id)
-                    # Remove from synced_prs so we don't keep checking it
-                    self.db.delete_synced_pr(gh_pr_id)
-                except Exception as e:
-                    logger.error(f"Failed to close GitHub PR #{gh_pr_id}: {e}")
+                # Remove from synced_prs so we don't keep checking it
+                self.db.delete_synced_pr(gh_pr_id)
+                done += 1
+            except Exception as e:
+                logger.error(f"Failed to close GitHub PR #{gh_pr_id}: {e}")
+        # Closures left for later (a failure or the deadline) keep the watermark, so they are listed again.
+        if done == len(closed):
+            self.db.set_state(CLOSURES_WATERMARK_KEY, started.strftime("%Y-%m-%dT%H:%M:%SZ"))
 
-    def check_prs_for_rebase_and_conflicts(self):
+    def check_prs_for_rebase_and_conflicts(self, deadline: Optional[Deadline] = None):
         """Check all open PRs (including drafts) for merge conflicts and request fixes."""
         logger.info("Checking for PRs with merge conflicts...")
-        prs = self.gh_client.get_pull_requests(state="open")
+        prs = self._open_prs()
 
         request_message = (
             "Hello @jules! It looks like this PR has some merge conflicts or needs a rebase. "
@@ -144,23 +295,35 @@ class PRSync:
             "Thank you!"
         )
 
-        for pr in prs:
+        for pr in self.carry_over.iterate("check_conflicts", prs, lambda pr: pr.number, deadline):
+            set_correlation_id(f"github_pr:{pr.number}")
+            mergeable = self.pr_mirror.mergeable(pr) if self.pr_mirror else pr.mergeable
             # Skip if mergeable state is unknown (being computed)
-            if pr.mergeable is None:
+            if mergeable is None:
                 continue
 
-            if pr.mergeable is False:
+            if mergeable is False:
                 logger.info(f"PR #{pr.number} has merge conflicts. Checking if we already commented...")
-                comments = list(pr.get_issue_comments())
-                last_comment = comments[-1] if comments else None
+                if self.pr_mirror:
+                    comment_count, last_comment = self.pr_mirror.comments(pr)
+                else:
+                    comments = list(pr.get_issue_comments())
+                    comment_count, last_comment = len(comments), comments[-1].body if comments else None
 
                 # Check if the last comment is already our request
-                if last_comment and request_message in last_comment.body:
+                if last_comment and request_message in last_comment:
                     logger.info(f"Already requested fixes for PR #{pr.number}. Skipping.")
                     continue
 
                 logger.info(f"Posting comment on PR #{pr.number} requesting fixes from @jules.")
                 try:
-                    pr.create_issue_comment(request_message)
+                    if self.outbox:
+                        # Keyed on the comment count so a request still waiting in the outbox is not repeated.
+                        self.outbox.enqueue("github.add_pr_comment", {"pr_number": pr.number, "message": request_message},
+                                            f"conflict_comment:{pr.number}:{comment_count}")
+                    elif self.pr_mirror:
+                        self.gh_client.add_pr_comment(pr.number, request_message)
+                    else:
+                        pr.create_issue_comment(request_message)
                 except Exception as e:
                     logger.error(f"Failed to post comment on PR #{pr.number}: {e}")
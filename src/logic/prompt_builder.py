@@ -0,0 +1,191 @@
+import math
+import re
+from collections import OrderedDict
+from typing import Callable, Iterable, List, Optional, Sequence, Set, Tuple
+from src.config import settings
+from src.utils.logger import logger
+from src.utils.metrics import metrics
+
+# Rough average for English prose and code; good enough to budget payload size.
+CHARS_PER_TOKEN = 4
+COMPACTED_NOTE_CHARS = 200
+HISTORY_CACHE_SIZE = 256
+
+Comment = Tuple[str, str, str]  # (author, created_at, body)
+
+_HTML_COMMENT = re.compile(r"<!--.*?-->", re.S)
+_SIGNATURE = re.compile(r"\n-- ?\n.*\Z", re.S)
+_MAIL_FOOTER = re.compile(r"^\s*(Sent from my .*|Get Outlook for .*)$", re.M | re.I)
+_REPLY_HEADER = re.compile(r"^On .+ wrote:\s*$")
+_BLANK_RUNS = re.compile(r"\n{3,}")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def extract_image_urls(text: str) -> List[str]:
+    if not text:
+        return []
+    md_pattern = r'!\[.*?\]\((.*?)\)'
+    html_pattern = r'<img\s+[^>]*src="([^"]+)"'
+    urls = re.findall(md_pattern, text)
+    urls.extend(re.findall(html_pattern, text))
+    return urls
+
+
+def strip_boilerplate(text: str) -> str:
+    """Remove template comments, mail signatures and footers, and redundant blank lines."""
+    text = _HTML_COMMENT.sub("", text or "")
+    text = _SIGNATURE.sub("", text)
+    text = _MAIL_FOOTER.sub("", text)
+    text = "\n".join(line.rstrip() for line in text.splitlines())
+    return _BLANK_RUNS.sub("\n\n", text).strip()
+
+
+def _normalize(line: str) -> str:
+    return _WHITESPACE.sub(" ", line).strip().lower()
+
+
+def drop_repeated_quotes(text: str, seen: Set[str]) -> str:
+    """Drop quoted reply lines whose content already appeared earlier in the thread."""
+    kept: List[str] = []
+    for line in text.splitlines():
+        stripped = line.lstrip()
+        if stripped.startswith(">"):
+            content = _normalize(stripped.lstrip("> "))
+            if not content or content in seen:
+                continue
+        kept.append(line)
+    # A reply header ("On <date>, <name> wrote:") is noise once its quote is gone.
+    result = [line for i, line in enumerate(kept)
+              if not (_REPLY_HEADER.match(line) and not (i + 1 < len(kept) and kept[i + 1].lstrip().startswith(">")))]
+    return "\n".join(result).strip()
+
+
+def _remember(text: str, seen: Set[str]):
+    seen.update(n for n in (_normalize(line) for line in text.splitlines() if not line.lstrip().startswith(">")) if n)
+
+
+def truncate_to_tokens(text: str, max_tokens: int, marker: str) -> str:
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    keep = max(max_tokens * CHARS_PER_TOKEN - len(marker) - 1, 0)
+    return f"{text[:keep].rstrip()}\n{marker}"
+
+
+def _render_comment(author: str, created_at: str, body: str, compacted: bool = False) -> str:
+    suffix = " (compacted)" if compacted else ""
+    return f"Comment by {author} at {created_at}{suffix}:\n{body}\n---"
+
+
+def compact_history(comments: Sequence[Comment], max_tokens: int, context: str = "") -> Tuple[str, int]:
+    """Render the note history within ``max_tokens``, compacting and then dropping the oldest comments first.
+
+    ``context`` is text the history is quoted against (the issue description).
+    Returns the history text and the number of comments that were compacted or dropped.
+    """
+    seen: Set[str] = set()
+    _remember(context, seen)
+    cleaned: List[Comment] = []
+    for author, created_at, body in comments:
+        text = drop_repeated_quotes(strip_boilerplate(body), seen)
+        _remember(text, seen)
+        cleaned.append((author, created_at, text))
+
+    rendered = [_render_comment(*comment) for comment in cleaned]
+    total = sum(estimate_tokens(r) + 1 for r in rendered)
+    compacted_indexes: Set[int] = set()
+    # Newer comments carry the current state of the discussion, so shrink from the oldest end.
+    for i, (author, created_at, body) in enumerate(cleaned[:-1]):
+        if total <= max_tokens:
+            break
+        if len(body) > COMPACTED_NOTE_CHARS:
+            summary = _WHITESPACE.sub(" ", body)[:COMPACTED_NOTE_CHARS].rstrip() + " [...]"
+            compacted = _render_comment(author, created_at, summary, compacted=True)
+            total += estimate_tokens(compacted) - estimate_tokens(rendered[i])
+            rendered[i] = compacted
+            compacted_indexes.add(i)
+
+    dropped = 0
+    while total > max_tokens and len(rendered) - dropped > 1:
+        total -= estimate_tokens(rendered[dropped]) + 1
+        compacted_indexes.add(dropped)
+        dropped += 1
+    kept = rendered[dropped:]
+    if dropped:
+        kept.insert(0, f"[{dropped} earlier comment(s) omitted]\n---")
+    if kept and total > max_tokens:
+        kept[-1] = truncate_to_tokens(kept[-1], max(max_tokens - (total - estimate_tokens(kept[-1])), 0),
+                                      "[... comment truncated]")
+    return "\n".join(kept), len(compacted_indexes)
+
+
+class PromptBuilder:
+    """Builds size-budgeted Jules prompts for GitLab issues.
+
+    The compacted note history is cached per issue and ``updated_at`` (GitLab
+    bumps it whenever a note is added), so a retried delegation of an unchanged
+    issue neither refetches nor recompacts its notes.
+    """
+
+    def __init__(self):
+        self._history_cache: "OrderedDict[tuple, Tuple[str, List[str]]]" = OrderedDict()
+
+    def build_issue_prompt(self, issue, guidelines: str,
+                           load_comments: Callable[[], Iterable[Comment]]) -> Tuple[str, List[str]]:
+        """Return the prompt and the image URLs referenced by the issue and its notes."""
+        budget = settings.PROMPT_MAX_TOKENS
+        guidelines = truncate_to_tokens(strip_boilerplate(str(guidelines or "")), settings.PROMPT_GUIDELINES_MAX_TOKENS,
+                                        "[... guidelines truncated]")
+        overhead = estimate_tokens(self._render(issue.title, "", "", guidelines))
+        description = truncate_to_tokens(strip_boilerplate(str(issue.description or "")),
+                                         max((budget - overhead) // 2, 0), "[... description truncated]")
+        history_budget = max(budget - overhead - estimate_tokens(description), 0)
+
+        history_text, image_urls = self._history(issue, description, history_budget, load_comments)
+        prompt = self._render(issue.title, description, history_text, guidelines)
+        metrics.observe("ato_prompt_tokens", estimate_tokens(prompt))
+        return prompt, image_urls
+
+    def _history(self, issue, description: str, budget: int,
+                 load_comments: Callable[[], Iterable[Comment]]) -> Tuple[str, List[str]]:
+        updated_at = getattr(issue, "updated_at", None)
+        key: Optional[tuple] = (issue.iid, updated_at, budget) if isinstance(updated_at, str) else None
+        cached = self._history_cache.get(key) if key else None
+        metrics.record_cache("prompt_history", cached is not None)
+        if cached is not None:
+            self._history_cache.move_to_end(key)
+            return cached
+
+        comments = list(load_comments())
+        history_text, reduced = compact_history(comments, budget, context=description)
+        if reduced:
+            logger.info(f"Compacted {reduced} of {len(comments)} comment(s) on issue #{issue.iid} to fit the prompt budget.")
+        urls: List[str] = []
+        for text in [str(issue.description or "")] + [body or "" for _, _, body in comments]:
+            for url in extract_image_urls(text):
+                if url not in urls:
+                    urls.append(url)
+        result = (history_text, urls)
+        if key:
+            self._history_cache[key] = result
+            if len(self._history_cache) > HISTORY_CACHE_SIZE:
+                self._history_cache.popitem(last=False)
+        return result
+
+    def dump_state(self) -> List:
+        return [[*key, text, urls] for key, (text, urls) in self._history_cache.items()]
+
+    def load_state(self, entries: List):
+        for iid, updated_at, budget, text, urls in entries[-HISTORY_CACHE_SIZE:]:
+            self._history_cache[(iid, updated_at, budget)] = (text, urls)
+
+    def _render(self, title: str, description: str, history_text: str, guidelines: str) -> str:
+        return (
+            f"Task: {title}\n\nDescription: {description}\n\n"
+            f"Conversation History:\n{history_text}\n\n"
+            f"Guidelines:\n{guidelines}\n\n"
+            "Instruction: Complete the task according to the attached guidelines. Run linters. Self-review."
+        )
@@ -0,0 +1,81 @@
+import gzip
+import json
+import os
+import time
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+from src.config import settings
+from src.core.database import Database
+from src.utils.logger import logger
+from src.utils.metrics import metrics
+from src.utils.tracing import traced
+
+LAST_RUN_KEY = "retention.last_run"
+# Sessions archived per transaction, which also bounds the SQL parameter count.
+ARCHIVE_BATCH_SIZE = 500
+
+
+@traced
+class Retention:
+    """Keeps the tables read every cycle small over years of operation.
+
+    Once every ``RETENTION_INTERVAL`` seconds, completed and failed sessions
+    older than ``RETENTION_DAYS`` move to ``sessions_archive``. The archive still
+    answers "was this task delegated" and feeds the duration statistics. Their
+    activities are appended to a gzipped JSON-lines file in
+    ``RETENTION_EXPORT_DIR``, or discarded when it is empty. Legacy synced_prs
+    rows without an MR, delivered outbox entries and closed mirrored PRs past
+    the retention period are deleted. Finally the freed pages are vacuumed
+    incrementally and the planner statistics are refreshed.
+    """
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    def run_if_due(self, now: Optional[float] = None) -> bool:
+        now = now if now is not None else time.time()
+        last_run = float(self.db.get_state(LAST_RUN_KEY) or 0)
+        if now - last_run < settings.RETENTION_INTERVAL:
+            return False
+        self.run(now)
+        self.db.set_state(LAST_RUN_KEY, str(now))
+        return True
+
+    def run(self, now: float):
+        cutoff = now - settings.RETENTION_DAYS * 86400
+        archived = exported = 0
+        while True:
+            session_ids = self.db.get_archivable_sessions(cutoff, ARCHIVE_BATCH_SIZE)
+            if not session_ids:
+                break
+            activities = self.db.get_activities_for_sessions(session_ids)
+            # Exported before the rows are deleted, so a failed write loses nothing.
+            if activities and settings.RETENTION_EXPORT_DIR:
+                self._export(activities, now)
+                exported += len(activities)
+            archived += self.db.archive_sessions(session_ids, now)
+
+        removed = {
+            "sessions": archived,
+            "synced_prs": self.db.prune_legacy_synced_prs(),
+            "outbox": self.db.purge_delivered_outbox(cutoff),
+            # The mirror stores GitHub timestamps as UTC ISO strings, which sort chronologically.
+            "pr_mirror": self.db.purge_closed_mirror_prs(
+                datetime.fromtimestamp(cutoff, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")),
+        }
+        for table, count in removed.items():
+            metrics.inc("ato_retention_rows_total", {"table": table}, value=count)
+        freed = self.db.compact(settings.RETENTION_VACUUM_PAGES)
+        logger.info(f"Retention: archived {archived} session(s) ({exported} activities exported), removed "
+                    f"{removed['synced_prs']} legacy synced PR(s), {removed['outbox']} delivered outbox entries and "
+                    f"{removed['pr_mirror']} closed mirrored PR(s); vacuum freed {freed} page(s).")
+
+    def _export(self, activities: List[Tuple], now: float):
+        os.makedirs(settings.RETENTION_EXPORT_DIR, exist_ok=True)
+        month = datetime.fromtimestamp(now, timezone.utc).strftime("%Y-%m")
+        path = os.path.join(settings.RETENTION_EXPORT_DIR, f"session_activities-{month}.jsonl.gz")
+        # Appending adds a gzip member; readers such as gzip.open and zcat read all members in order.
+        with gzip.open(path, "at", encoding="utf-8") as f:
+            for session_id, activity_id, create_time, kind, summary in activities:
+                f.write(json.dumps({"session_id": session_id, "activity_id": activity_id, "create_time": create_time,
+                                    "kind": kind, "summary": summary}) + "\n")
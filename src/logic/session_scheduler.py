@@ -0,0 +1,58 @@
+import time
+from typing import Dict, Optional, Tuple
+from src.config import settings
+from src.core.database import Database
+from src.utils.metrics import metrics
+
+
+def poll_delay(elapsed: float, expected: float) -> float:
+    """Seconds until the next poll: half the expected remaining runtime, capped.
+
+    Polls therefore land at 1/2, 3/4, 7/8, ... of the expected duration, sparse
+    early on and dense near completion; once a session overruns its estimate it
+    is polled every cycle.
+    """
+    remaining = expected - elapsed
+    if remaining <= 0:
+        return 0.0
+    return min(remaining / 2, settings.JULES_MAX_POLL_INTERVAL)
+
+
+class SessionScheduler:
+    """Decides which active Jules sessions are due for a poll, based on
+    historical durations of completed sessions of the same task type."""
+
+    def __init__(self, db: Database):
+        self.db = db
+        self._stats: Dict[str, Tuple[int, float, float, float]] = {}
+        self._schedule: Dict[str, Tuple[Optional[float], Optional[float]]] = {}
+
+    def refresh(self):
+        """Reload duration statistics and poll times; call once per monitoring pass."""
+        self._stats = self.db.get_session_duration_stats()
+        self._schedule = self.db.get_session_poll_schedule()
+
+    def expected_duration(self, task_type: str) -> Optional[float]:
+        stats = self._stats.get(task_type)
+        if not stats or stats[0] < settings.JULES_ETA_MIN_SAMPLES:
+            return None
+        return stats[1]
+
+    def is_due(self, session_id: str, now: Optional[float] = None) -> bool:
+        next_poll_at = self._schedule.get(session_id, (None, None))[1]
+        due = next_poll_at is None or next_poll_at <= (now or time.time())
+        if not due:
+            metrics.inc("ato_jules_polls_skipped_total")
+        return due
+
+    def schedule_next(self, session_id: str, task_type: str, now: Optional[float] = None):
+        """Record when a still-running session should next be polled."""
+        now = now or time.time()
+        created_at, previous = self._schedule.get(session_id, (None, None))
+        expected = self.expected_duration(task_type)
+        if created_at is None or expected is None:
+            next_poll_at = None
+        else:
+            next_poll_at = now + poll_delay(now - created_at, expected)
+        if next_poll_at is not None or previous is not None:
+            self.db.set_next_poll_at(session_id, next_poll_at)
@@ -1,141 +1,247 @@
-import base64
-import mimetypes
 import re
-from src.core.gitlab_client import GitLabClient
-from src.core.github_client import GitHubClient
-from src.core.jules_client import JulesClient
+from typing import TYPE_CHECKING, Dict, Optional
 from src.core.database import Database, SessionStatus
-from src.utils.logger import logger
+from src.logic.activity_stream import ActivityStream
+from src.logic.attachments import AttachmentProcessor
+from src.logic.cycle_budget import CarryOver, Deadline
+from src.logic.delegation_queue import DelegationQueue, issue_sort_key, red_pr_sort_key
+from src.logic.pr_mirror import MirroredPR
+from src.logic.prompt_builder import PromptBuilder
+from src.logic.session_scheduler import SessionScheduler
+from src.utils.logger import logger, set_correlation_id
+from src.utils.tracing import traced
+from src.utils.metrics import metrics
 from src.config import settings
 
+if TYPE_CHECKING:
+    from src.core.gitlab_client import GitLabClient
+    from src.core.github_client import GitHubClient
+    from src.core.jules_client import JulesClient
+    from src.core.outbox import Outbox
+    from src.logic.pr_mirror import PRMirror
+
+TERMINAL_CI_STATES = ("success", "failure", "error")
+CI_STATUS_CACHE_SIZE = 4096
+
+@traced
 class TaskMonitor:
-    def __init__(self, gl_client: GitLabClient, gh_client: GitHubClient, jules_client: JulesClient, db: Database):
+    def __init__(self, gl_client: "GitLabClient", gh_client: "GitHubClient", jules_client: "JulesClient", db: Database,
+                 outbox: Optional["Outbox"] = None, pr_mirror: Optional["PRMirror"] = None):
         self.gl_client = gl_client
         self.gh_client = gh_client
         self.jules_client = jules_client
         self.db = db
+        self.outbox = outbox
+        self.pr_mirror = pr_mirror
+        self.activity_stream = ActivityStream(jules_client, db)
+        self.queue = DelegationQueue(db)
+        self.scheduler = SessionScheduler(db)
+        self.prompt_builder = PromptBuilder()
+        self.attachments = AttachmentProcessor()
+        self.carry_over = CarryOver(db)
+        self._ci_status_cache: Dict[str, str] = {}
 
-
-    def _extract_image_urls(self, text: str) -> list:
-        if not text:
-            return []
-        md_pattern = r'!\[.*?\]\((.*?)\)'
-        html_pattern = r'<img\s+[^>]*src="([^"]+)"'
-        urls = re.findall(md_pattern, text)
-        urls.extend(re.findall(html_pattern, text))
-        return urls
-
-    def _prepare_attachments_and_history(self, issue):
-        notes = self.gl_client.get_issue_notes(issue.iid)
-
-        conversation = []
-        all_text_for_images = [issue.description or ""]
-
-        for note in notes:
+    def _issue_comments(self, issue):
+        """Non-system notes on an issue as (author, created_at, body), oldest first."""
+        comments = []
+        for note in self.gl_client.get_issue_notes(issue.iid):
             # Check if system note
             is_system = getattr(note, 'system', False)
             if is_system:
                 continue
 
             author_name = note.author['name'] if isinstance(note.author, dict) else note.author.name
-            body = note.body
-            created_at = note.created_at
-
-            conversation.append(f"Comment by {author_name} at {created_at}:\n{body}\n---")
-            all_text_for_images.append(body or "")
-
-        history_text = "\n".join(conversation)
+            comments.append((author_name, note.created_at, note.body or ""))
+        return comments
 
-        image_urls = set()
-        for text in all_text_for_images:
-            urls = self._extract_image_urls(text)
-            for url in urls:
-                image_urls.add(url)
-
-        attachments = []
+    def _download_attachments(self, image_urls):
+        downloads = []
         for url in image_urls:
             content = self.gl_client.download_file(url)
             if content:
-                mime_type, _ = mimetypes.guess_type(url)
-                if not mime_type:
-                    mime_type = "application/octet-stream"
-
-                b64_data = base64.b64encode(content).decode('utf-8')
-                attachments.append({
-                    "name": url.split("/")[-1],
-                    "mimeType": mime_type,
-                    "data": b64_data
-                })
+                downloads.append((url, content))
+        return self.attachments.prepare(downloads)
 
-        return history_text, attachments
+    def check_and_delegate_tasks(self, deadline: Optional[Deadline] = None):
+        """Unified delegation logic for Module A and Module B.
 
-    def check_and_delegate_tasks(self):
-        """Unified delegation logic for Module A and Module B."""
+        With a ``deadline``, CI checks of PRs not reached in time are carried
+        over to the next cycle and no further sessions are started.
+        """
         active_count = self.jules_client.get_active_sessions_count_from_api()
+        metrics.set_gauge("ato_jules_active_sessions", active_count)
 
         logger.info("Checking for new GitLab tasks with 'AI' label...")
-        issues = self.gl_client.get_open_ai_issues()
-        for issue in issues:
-            if active_count >= settings.JULES_MAX_CONCURRENT_SESSIONS:
-                logger.warning(f"Max concurrent Jules sessions reached ({active_count}).")
-                break
+        self._refresh_issue_candidates()
+        logger.info("Checking for RED GitHub Pull Requests...")
+        self._refresh_pr_candidates(deadline)
 
-            if not self.db.get_session_by_task(issue.iid, "gitlab_issue"):
-                if self.gl_client.has_open_mr(issue.iid):
-                    logger.info(f"GitLab issue #{issue.iid} already has an open MR. Skipping delegation.")
-                    continue
-                logger.info(f"Delegating GitLab issue #{issue.iid} to Jules")
-                guidelines = self.gl_client.get_file_content("AGENTS.md") or  ""
-
-                history_text, attachments = self._prepare_attachments_and_history(issue)
-
-                prompt = (
-                    f"Task: {issue.title}\n\nDescription: {issue.description}\n\n"
-                    f"Conversation History:\n{history_text}\n\n"
-                    f"Guidelines:\n{guidelines}\n\n"
-                    "Instruction: Complete the task according to the attached guidelines. Run linters. Self-review."
-                )
-                session = self.jules_client.create_session(
-                    prompt,
-                    f"GL Issue #{issue.iid}: {issue.title}",
-                    settings.STARTING_BRANCH_NAME,
-                    attachments=attachments
-                )
-                if session:
-                    session_id = session.get("id")
-                    self.db.add_session(session_id, str(issue.iid), "gitlab_issue")
-                    active_count += 1
+        self._delegate_from_queue(active_count, deadline)
 
-        logger.info("Checking for RED GitHub Pull Requests...")
-        prs = self.gh_client.get_pull_requests(state="open")
-        for pr in prs:
-            if active_count >= settings.JULES_MAX_CONCURRENT_SESSIONS:
-                logger.warning(f"Max concurrent Jules sessions reached ({active_count}).")
+    def _refresh_issue_candidates(self):
+        listed = []
+        for issue in self.gl_client.get_open_ai_issues():
+            item = ("gitlab_issue", str(issue.iid))
+            listed.append(item[1])
+            self.queue.objects[item] = issue
+            # Keys depend on labels and the configured weights, so queued issues are re-keyed when either changed;
+            # push() is a no-op for an unchanged key.
+            if item in self.queue or not self.db.get_session_by_task(issue.iid, "gitlab_issue"):
+                self.queue.push(*item, issue_sort_key(issue))
+        self.queue.retain("gitlab_issue", listed)
+
+    def _refresh_pr_candidates(self, deadline: Optional[Deadline] = None):
+        if self.pr_mirror:
+            prs = self.pr_mirror.open_prs()
+        else:
+            prs = list(self.gh_client.get_pull_requests(state="open"))
+        # Retained from the full listing, so PRs carried over are not dropped from the queue.
+        listed = [str(pr.number) for pr in prs]
+        for pr in self.carry_over.iterate("delegate_tasks", prs, lambda pr: pr.number, deadline):
+            item = ("github_pr", str(pr.number))
+            self.queue.objects[item] = pr
+            if item in self.queue and self.queue.head_sha(item) == pr.head.sha:
+                continue
+            if self.db.get_session_by_task(pr.number, "github_pr"):
+                continue
+            if self._pr_ci_status(pr) == "failure":
+                self.queue.push(*item, red_pr_sort_key(pr), head_sha=pr.head.sha)
+            else:
+                self.queue.remove(*item)
+        self.queue.retain("github_pr", listed)
+
+    def _pr_ci_status(self, pr) -> str:
+        if not isinstance(pr, MirroredPR):
+            return self._get_ci_status(pr.head.sha)
+        if pr.ci_status:
+            return pr.ci_status
+        status = self._get_ci_status(pr.head.sha)
+        if status in TERMINAL_CI_STATES:
+            self.pr_mirror.record_ci_status(pr, status)
+        return status
+
+    def _get_ci_status(self, sha: str) -> str:
+        """CI status of a commit; terminal states are cached by SHA since they only change on a new push."""
+        status = self._ci_status_cache.get(sha)
+        metrics.record_cache("github_ci_status", status is not None)
+        if status is None:
+            status = self.gh_client.get_pr_status(sha)
+            if status in TERMINAL_CI_STATES:
+                if len(self._ci_status_cache) >= CI_STATUS_CACHE_SIZE:
+                    self._ci_status_cache.pop(next(iter(self._ci_status_cache)))
+                self._ci_status_cache[sha] = status
+        return status
+
+    def dump_state(self) -> Dict:
+        return {"ci_status": self._ci_status_cache, "prompt_history": self.prompt_builder.dump_state()}
+
+    def load_state(self, state: Dict):
+        self._ci_status_cache.update(list(state["ci_status"].items())[-CI_STATUS_CACHE_SIZE:])
+        self.prompt_builder.load_state(state["prompt_history"])
+
+    def _delegate_from_queue(self, active_count: int, deadline: Optional[Deadline] = None):
+        """Start sessions for the highest-priority queued tasks until Jules capacity is reached."""
+        attempted = 0
+        unlisted = set()
+        # JULES_MAX_CONCURRENT_SESSIONS applies per key, so capacity grows with the key pool.
+        capacity = settings.JULES_MAX_CONCURRENT_SESSIONS * len(self.jules_client.keys)
+        while len(self.queue) > len(unlisted) and active_count < capacity:
+            if attempted and deadline and deadline.expired():
+                # Still queued (and persisted), so the next cycle resumes from here.
+                logger.warning(f"Delegation reached its deadline. {len(self.queue)} task(s) left for the next cycle.")
+                break
+            if not self.jules_client.has_free_key():
+                # Keys in cooldown count towards the capacity above; stop before preparing tasks no key can take.
+                logger.warning(f"No Jules API key is available. {len(self.queue)} task(s) left for the next cycle.")
+                break
+            item = self.queue.peek(skip=unlisted)
+            set_correlation_id(f"{item[0]}:{item[1]}")
+            task = self.queue.objects.get(item)
+            if task is None:
+                # Restored from the persisted queue but not listed since (e.g. a red PR carried over):
+                # it keeps its place until a listing supplies the issue or PR.
+                unlisted.add(item)
+                continue
+            attempted += 1
+            if item[0] == "gitlab_issue":
+                delegated = self._delegate_issue(task)
+            else:
+                delegated = self._delegate_red_pr(task)
+            if not delegated and not self.jules_client.has_free_key():
+                # The last free key was rate limited while creating the session; keep the task's place.
+                logger.warning(f"No Jules API key is available. {len(self.queue)} task(s) left for the next cycle.")
                 break
+            self.queue.remove(*item)
+            if delegated:
+                active_count += 1
+        if len(self.queue) and active_count >= capacity:
+            logger.warning(f"Max concurrent Jules sessions reached ({active_count}). {len(self.queue)} task(s) queued.")
+        metrics.set_gauge("ato_delegation_backlog", len(self.queue))
 
-            if not self.db.get_session_by_task(pr.number, "github_pr"):
-                status = self.gh_client.get_pr_status(pr.head.sha)
-                if status == "failure":
-                    logger.info(f"PR #{pr.number} is RED. Delegating fix to Jules.")
-                    prompt = (
-                        f"Fix PR #{pr.number}: {pr.title}\n\nInstruction: Fix logs to make GREEN. Run linters. Self-review."
-                    )
-                    session = self.jules_client.create_session(prompt, f"Fix GH PR #{pr.number}: {pr.title}", branch=pr.head.ref)
-                    if session:
-                        session_id = session.get("id")
-                        self.db.add_session(session_id, str(pr.number), "github_pr", github_pr_id=pr.number)
-                        self.gh_client.add_pr_comment(pr.number, f"Jules AI has started working on fixing this PR. Session ID: {session_id}", pr=pr)
-                        active_count += 1
-
-    def monitor_active_sessions(self):
+    def _delegate_issue(self, issue) -> bool:
+        if self.gl_client.has_open_mr(issue.iid):
+            logger.info(f"GitLab issue #{issue.iid} already has an open MR. Skipping delegation.")
+            return False
+        logger.info(f"Delegating GitLab issue #{issue.iid} to Jules")
+        guidelines = self.gl_client.get_file_content("AGENTS.md") or  ""
+
+        prompt, image_urls = self.prompt_builder.build_issue_prompt(issue, guidelines, lambda: self._issue_comments(issue))
+        attachments = self._download_attachments(image_urls)
+        session = self.jules_client.create_session(
+            prompt,
+            f"GL Issue #{issue.iid}: {issue.title}",
+            settings.STARTING_BRANCH_NAME,
+            attachments=attachments
+        )
+        if not session:
+            return False
+        session_id = session.get("id")
+        self.db.add_session(session_id, str(issue.iid), "gitlab_issue", api_key_id=session.get("apiKeyId"))
+        return True
+
+    def _delegate_red_pr(self, pr) -> bool:
+        logger.info(f"PR #{pr.number} is RED. Delegating fix to Jules.")
+        prompt = (
+            f"Fix PR #{pr.number}: {pr.title}\n\nInstruction: Fix logs to make GREEN. Run linters. Self-review."
+        )
+        session = self.jules_client.create_session(prompt, f"Fix GH PR #{pr.number}: {pr.title}", branch=pr.head.ref)
+        if not session:
+            return False
+        session_id = session.get("id")
+        self.db.add_session(session_id, str(pr.number), "github_pr", github_pr_id=pr.number,
+                            api_key_id=session.get("apiKeyId"))
+        self._comment_on_pr(pr.number, f"Jules AI has started working on fixing this PR. Session ID: {session_id}",
+                            f"session_started:{session_id}", pr=pr)
+        return True
+
+    def _comment_on_pr(self, pr_number: int, message: str, idempotency_key: str, pr=None):
+        if self.outbox:
+            self.outbox.enqueue("github.add_pr_comment", {"pr_number": pr_number, "message": message}, idempotency_key)
+        else:
+            # A mirrored PR is only a local row; the client fetches the PR itself.
+            self.gh_client.add_pr_comment(pr_number, message, pr=None if isinstance(pr, MirroredPR) else pr)
+
+    def monitor_active_sessions(self, deadline: Optional[Deadline] = None):
         """Monitor status of active Jules sessions and update database."""
         active_sessions = self.db.get_active_sessions()
-        for session_id, task_id, task_type, github_pr_id, gitlab_mr_id in active_sessions:
+        # Polls go out with the key that created each session.
+        self.jules_client.assign_session_keys(self.db.get_session_api_keys())
+        self.scheduler.refresh()
+        stalled = 0
+        finished = 0
+        sessions = self.carry_over.iterate("monitor_sessions", active_sessions, lambda row: row[0], deadline)
+        for session_id, task_id, task_type, github_pr_id, gitlab_mr_id in sessions:
+            set_correlation_id(f"session:{session_id}")
+            if not self.scheduler.is_due(session_id):
+                logger.debug("Session %s is not expected to finish yet. Skipping poll.", session_id,
+                             extra={"sample": True})
+                continue
             logger.info(f"Monitoring Jules session {session_id} for {task_type} {task_id}")
             session = self.jules_client.get_session(session_id)
             if not session:
                 logger.warning(f"Session {session_id} not found in API. Marking as FAILED.")
                 self.db.update_session_status(session_id, SessionStatus.FAILED)
+                finished += 1
                 continue
 
             outputs = session.get("outputs", [])
@@ -144,6 +250,7 @@ class TaskMonitor:
             if pr_output:
                 logger.info(f"Session {session_id} finished (PR created).")
                 self.db.update_session_status(session_id, SessionStatus.COMPLETED)
+                finished += 1
 
                 # Extract PR number from pr_output if possible
                 extracted_pr_id = None
@@ -159,15 +266,26 @@ class TaskMonitor:
                     self.db.update_session_ids(session_id, github_pr_id=extracted_pr_id)
 
                 if task_type == "github_pr":
-                    self.gh_client.add_pr_comment(int(task_id), "Jules AI has finished working on this PR. Please review the changes.")
+                    self._comment_on_pr(int(task_id), "Jules AI has finished working on this PR. Please review the changes.",
+                                        f"session_finished:{session_id}")
+                continue
+
+            # Only activities added since the previous poll are fetched.
+            new_activities = self.activity_stream.poll(session_id)
+            if self.activity_stream.is_failed(new_activities):
+                logger.warning(f"Session {session_id} reported a failure. Marking as FAILED.")
+                self.db.update_session_status(session_id, SessionStatus.FAILED)
+                finished += 1
                 continue
+            if new_activities:
+                logger.debug("Session %s last activity: %s", session_id, new_activities[-1].get("id"),
+                             extra={"sample": True})
+            elif self.activity_stream.is_stalled(session_id):
+                stalled += 1
+                logger.warning(f"Session {session_id} has had no activity for over {settings.JULES_STALL_MINUTES} minutes.")
+            self.scheduler.schedule_next(session_id, task_type)
+        metrics.set_gauge("ato_jules_stalled_sessions", stalled)
 
-            # Check activities for failures
-            activities = self.jules_client.list_activities(session_id)
-            # If we see any activity indicating failure or if no activity for a long time
-            # For simplicity, we'll just check if there's an activity of type 'ERROR' if it existed
-            # But the API docs didn't specify error types clearly.
-            # We'll just log progress.
-            if activities:
-                last_activity = activities[0] # Usually sorted by time descending?
-                logger.debug(f"Session {session_id} last activity: {last_activity.get('type')}")
+        if finished and len(self.queue):
+            # Refill the freed slots now rather than leaving them idle until the delegation phase.
+            self._delegate_from_queue(self.jules_client.get_active_sessions_count_from_api(), deadline)
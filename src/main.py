@@ -1,38 +1,209 @@
+import signal
+import sys
 import time
-from src.config import settings
-from src.utils.logger import logger
-from src.core.gitlab_client import GitLabClient
-from src.core.github_client import GitHubClient
-from src.core.jules_client import JulesClient
-from src.core.database import Database
-from src.logic.task_monitor import TaskMonitor
-from src.logic.pr_sync import PRSync
+import uuid
+
+# Taken before any other import so the startup report covers module loading too.
+PROCESS_START = time.perf_counter()
+
+from concurrent.futures import ThreadPoolExecutor  # noqa: E402
+from contextlib import contextmanager  # noqa: E402
+from typing import Dict, Optional  # noqa: E402
+from src.config import settings  # noqa: E402
+from src.utils.lazy import LazyClient  # noqa: E402
+from src.utils.logger import log_context, logger  # noqa: E402
+from src.utils.metrics import metrics, start_metrics_server  # noqa: E402
+from src.utils.blob_store import blob_store  # noqa: E402
+from src.utils.http_cache import http_cache  # noqa: E402
+from src.utils.memory import memory_profiler  # noqa: E402
+from src.utils.resilience import circuit_breakers  # noqa: E402
+from src.utils.snapshot import state_snapshot  # noqa: E402
+from src.utils.tracing import tracer  # noqa: E402
+from src.core.database import Database  # noqa: E402
+from src.core.outbox import Outbox, register_client_handlers  # noqa: E402
+from src.logic.cycle_budget import CycleBudget  # noqa: E402
+from src.logic.pr_mirror import PRMirror  # noqa: E402
+from src.logic.task_monitor import TaskMonitor  # noqa: E402
+from src.logic.pr_sync import PRSync  # noqa: E402
+from src.logic.retention import Retention  # noqa: E402
+
+@contextmanager
+def phase(name: str, budget: Optional[CycleBudget] = None):
+    """Time a cycle phase for both metrics and tracing, yielding its deadline.
+
+    An error aborts only the failing phase, so a degraded backend (e.g. an open
+    circuit breaker) does not stop the phases that do not depend on it.
+    """
+    deadline = budget.phase_deadline(name) if budget else None
+    try:
+        with metrics.time_phase(name), tracer.span(name), log_context(phase=name):
+            yield deadline
+    except Exception as e:
+        metrics.inc("ato_phase_failures_total", {"phase": name})
+        logger.error(f"Phase {name} aborted: {type(e).__name__}: {e}")
+
+
+def run_cycle(task_monitor: TaskMonitor, pr_sync: PRSync):
+    """Run every phase of a single orchestration cycle within the cycle time budget."""
+    budget = CycleBudget()
+    with metrics.time_cycle(), tracer.cycle(), log_context(cycle_id=uuid.uuid4().hex[:12]):
+        # Bring the local copy of GitHub PR state up to date for the phases below
+        if pr_sync.pr_mirror:
+            with phase("refresh_pr_mirror", budget):
+                pr_sync.pr_mirror.refresh()
+
+        # Monitor existing sessions
+        with phase("monitor_sessions", budget) as deadline:
+            task_monitor.monitor_active_sessions(deadline)
+
+        # Delegate new tasks (Module A & B)
+        with phase("delegate_tasks", budget) as deadline:
+            task_monitor.check_and_delegate_tasks(deadline)
+
+        # Module C
+        with phase("sync_github_to_gitlab", budget) as deadline:
+            pr_sync.sync_github_to_gitlab(deadline)
+        with phase("sync_gitlab_closures", budget) as deadline:
+            pr_sync.sync_gitlab_closures_to_github(deadline)
+        with phase("check_conflicts", budget) as deadline:
+            pr_sync.check_prs_for_rebase_and_conflicts(deadline)
+
+
+# The SDK-backed clients are imported inside their factories so PyGithub and
+# python-gitlab load on the init threads instead of delaying startup.
+def _gitlab_client():
+    from src.core.gitlab_client import GitLabClient
+    return GitLabClient()
+
+
+def _github_client():
+    from src.core.github_client import GitHubClient
+    return GitHubClient()
+
+
+def _jules_client():
+    from src.core.jules_client import JulesClient
+    return JulesClient()
+
+
+def create_clients(executor: ThreadPoolExecutor) -> Dict[str, LazyClient]:
+    """Create lazy client handles and start initialising them concurrently."""
+    clients = {
+        "gitlab": LazyClient("gitlab", _gitlab_client),
+        "github": LazyClient("github", _github_client),
+        "jules": LazyClient("jules", _jules_client),
+    }
+    for client in clients.values():
+        client.prefetch(executor)
+    return clients
+
+
+def register_snapshot_sections(clients: Dict[str, LazyClient], task_monitor: TaskMonitor):
+    """Register the in-memory state that survives a restart through the state snapshot."""
+    state_snapshot.register("jules", lambda: clients["jules"].dump_state(),
+                            lambda state: clients["jules"].load_state(state))
+    state_snapshot.register("task_monitor", task_monitor.dump_state, task_monitor.load_state)
+    state_snapshot.register("circuit_breakers", circuit_breakers.dump_state, circuit_breakers.load_state)
+
+
+def log_startup_report(marks: Dict[str, float], clients: Dict[str, LazyClient]):
+    """Log how long each startup stage took, measured from process start."""
+    stages = ", ".join(f"{name} {at:.3f}s" for name, at in marks.items())
+    inits = ", ".join(f"{name} {client.init_seconds:.3f}s" for name, client in clients.items()
+                      if client.init_seconds is not None)
+    logger.info(f"Startup timing: {stages}; client init: {inits or 'none'}")
+    for name, at in marks.items():
+        metrics.set_gauge("ato_startup_seconds", at, {"stage": name})
+
 
 def main():
     logger.info("Starting AI Task Orchestrator (ATO)...")
+    marks = {"imports": time.perf_counter() - PROCESS_START}
 
-    try:
-        db = Database()
-        gl_client = GitLabClient()
-        gh_client = GitHubClient()
-        jules_client = JulesClient()
+    if settings.METRICS_ENABLED:
+        start_metrics_server(settings.METRICS_HOST, settings.METRICS_PORT)
+    if settings.BREAKER_ENABLED:
+        circuit_breakers.enable()
+    if settings.MEMORY_PROFILING_ENABLED:
+        memory_profiler.enable()
+    # Cassettes hold full responses; replaying recorded 304s would need the cache state of the recording.
+    if settings.HTTP_CACHE_ENABLED and settings.CASSETTE_MODE == "off":
+        http_cache.enable()
+    # Blobs served from disk would be missing from a recording.
+    if settings.BLOB_STORE_ENABLED and settings.CASSETTE_MODE == "off":
+        blob_store.enable()
 
-        task_monitor = TaskMonitor(gl_client, gh_client, jules_client, db)
-        pr_sync = PRSync(gl_client, gh_client, db)
+    db_path = "data/ato.db"
+    cassette = None
+    if settings.CASSETTE_MODE != "off":
+        from src.utils.cassette import Cassette
+        cassette = Cassette(settings.CASSETTE_PATH, settings.CASSETTE_MODE, settings.CASSETTE_SIMULATE_LATENCY)
+        if cassette.mode == "record":
+            cassette.start_recording(db_path)
+        else:
+            # Replay against a scratch copy of the recorded database so the real one is untouched.
+            db_path = cassette.restore_database()
+            cassette.start_replay()
 
-        while True:
-            logger.info("Starting cycle...")
+    # Turn docker stop into a normal exit so the cleanup below (outbox, snapshot) runs.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    # A snapshot restored into a replay would skip recorded requests.
+    snapshots = settings.SNAPSHOT_ENABLED and settings.CASSETTE_MODE == "off"
+
+    executor = ThreadPoolExecutor(max_workers=3, thread_name_prefix="client-init")
+    outbox = None
+    snapshot_loaded = False
+    try:
+        clients = create_clients(executor)
+        db = Database(db_path)
+        marks["database"] = time.perf_counter() - PROCESS_START
+
+        outbox = Outbox(db)
+        register_client_handlers(outbox, clients["github"])
+        pr_mirror = PRMirror(clients["github"], db)
+        task_monitor = TaskMonitor(clients["gitlab"], clients["github"], clients["jules"], db, outbox=outbox,
+                                   pr_mirror=pr_mirror)
+        pr_sync = PRSync(clients["gitlab"], clients["github"], db, outbox=outbox, pr_mirror=pr_mirror)
+        if snapshots:
+            register_snapshot_sections(clients, task_monitor)
+            state_snapshot.load()
+            snapshot_loaded = True
+            marks["snapshot"] = time.perf_counter() - PROCESS_START
 
-            # Monitor existing sessions
-            task_monitor.monitor_active_sessions()
+        if cassette and cassette.mode == "replay":
+            # Deliver writes inline after each cycle so replayed traffic stays in recorded order.
+            for cycle in range(cassette.cycles):
+                logger.info(f"Replaying cycle {cycle + 1}/{cassette.cycles}...")
+                run_cycle(task_monitor, pr_sync)
+                outbox.drain()
+            logger.info("Replay complete.")
+            return
 
-            # Delegate new tasks (Module A & B)
-            task_monitor.check_and_delegate_tasks()
+        outbox.start()
+        retention = Retention(db) if settings.RETENTION_ENABLED else None
 
-            # Module C
-            pr_sync.sync_github_to_gitlab()
-            pr_sync.sync_gitlab_closures_to_github()
-            pr_sync.check_prs_for_rebase_and_conflicts()
+        first_cycle = True
+        while True:
+            logger.info("Starting cycle...")
+            if first_cycle:
+                marks["first_cycle_start"] = time.perf_counter() - PROCESS_START
+            run_cycle(task_monitor, pr_sync)
+            if first_cycle:
+                marks["first_cycle_end"] = time.perf_counter() - PROCESS_START
+                log_startup_report(marks, clients)
+                first_cycle = False
+            if retention:
+                # Outside the cycle budget: maintenance should not take time from the phases.
+                with phase("retention"):
+                    retention.run_if_due()
+            if memory_profiler.enabled:
+                with phase("memory_profile"):
+                    memory_profiler.after_cycle()
+            if snapshots:
+                with phase("snapshot"):
+                    state_snapshot.save_if_due()
+            if cassette:
+                cassette.mark_cycle()
 
             logger.info(f"Cycle complete. Sleeping for {settings.POLLING_INTERVAL} seconds.")
             time.sleep(settings.POLLING_INTERVAL)
@@ -40,6 +211,18 @@ def main():
     except Exception as e:
         logger.error(f"Critical error in main loop: {e}", exc_info=True)
         raise
+    finally:
+        executor.shutdown(wait=False)
+        if outbox:
+            outbox.stop()
+        # Not before the load: that would overwrite the previous snapshot with empty caches.
+        if snapshot_loaded:
+            try:
+                state_snapshot.save()
+            except Exception as e:
+                logger.error(f"Could not write the state snapshot: {e}")
+        if cassette:
+            cassette.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,105 @@
+"""Content-addressed store for git blobs fetched from GitHub.
+
+Blobs are immutable and named by their git blob SHA, so a stored blob never
+needs revalidation: repeat syncs, retries and renames read it from disk
+without touching the network. Each blob is a file under
+``<root>/<sha[:2]>/<sha[2:]>``. The store is bounded by
+``BLOB_STORE_MAX_BYTES`` and evicts the least recently read blobs.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+from src.config import settings
+from src.utils.logger import logger
+from src.utils.metrics import metrics
+
+
+def git_blob_sha(content: bytes) -> str:
+    """The SHA-1 git assigns to a blob with this content."""
+    return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+
+
+class BlobStore:
+    def __init__(self):
+        self.enabled = False
+        self.root: Optional[str] = None
+        self._lock = threading.Lock()
+        # SHA -> size, least recently used first.
+        self._sizes: "OrderedDict[str, int]" = OrderedDict()
+        self._size = 0
+
+    def enable(self, path: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.root = path or settings.BLOB_STORE_PATH
+        self.max_bytes = max_bytes or settings.BLOB_STORE_MAX_BYTES
+        os.makedirs(self.root, exist_ok=True)
+        entries = []
+        for shard in os.scandir(self.root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.is_file() and not entry.name.endswith(".tmp"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, shard.name + entry.name, stat.st_size))
+        with self._lock:
+            self._sizes = OrderedDict((sha, size) for _, sha, size in sorted(entries))
+            self._size = sum(self._sizes.values())
+        self.enabled = True
+        logger.info(f"Blob store enabled at {self.root} ({len(self._sizes)} blobs, {self._size / 1e6:.1f} MB).")
+
+    def disable(self):
+        self.enabled = False
+        with self._lock:
+            self._sizes.clear()
+            self._size = 0
+
+    def _path(self, sha: str) -> str:
+        return os.path.join(self.root, sha[:2], sha[2:])
+
+    def get(self, sha: str) -> Optional[bytes]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            known = sha in self._sizes
+            if known:
+                self._sizes.move_to_end(sha)
+        content = None
+        if known:
+            try:
+                with open(self._path(sha), "rb") as f:
+                    content = f.read()
+                os.utime(self._path(sha))  # The modification time orders eviction after a restart.
+            except FileNotFoundError:
+                with self._lock:
+                    self._size -= self._sizes.pop(sha, 0)
+        metrics.record_cache("blob_store", content is not None)
+        return content
+
+    def put(self, sha: str, content: bytes):
+        # A single blob may use at most a tenth of the store, so one huge file cannot flush it.
+        if not self.enabled or len(content) > self.max_bytes // 10:
+            return
+        if git_blob_sha(content) != sha:
+            logger.warning(f"Not storing blob {sha}: content does not match its SHA")
+            return
+        path = self._path(sha)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._size += len(content) - self._sizes.pop(sha, 0)
+            self._sizes[sha] = len(content)
+            while self._size > self.max_bytes and self._sizes:
+                evicted, size = self._sizes.popitem(last=False)
+                self._size -= size
+                try:
+                    os.remove(self._path(evicted))
+                except FileNotFoundError:
+                    pass
+            metrics.set_gauge("ato_blob_store_bytes", self._size)
+
+
+blob_store = BlobStore()
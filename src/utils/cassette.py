@@ -0,0 +1,240 @@
+"""Record/replay of all outbound API traffic for offline cycle profiling.
+
+In ``record`` mode every request/response pair sent through ``requests`` is
+appended to a gzip-compressed JSON-lines cassette with credentials scrubbed,
+together with a snapshot of the local database taken before the first cycle.
+In ``replay`` mode responses are served from the cassette in recorded order and
+no request ever reaches the network, so TaskMonitor/PRSync run deterministically
+on a laptop against production-shaped traffic.
+"""
+import base64
+import gzip
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import timedelta
+from typing import Deque, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+import requests
+from requests.structures import CaseInsensitiveDict
+from src.config import settings
+from src.utils import transport
+from src.utils.logger import logger
+
+CASSETTE_VERSION = 1
+REDACTED = "<redacted>"
+SECRET_HEADERS = {"authorization", "private-token", "job-token", "x-goog-api-key", "cookie", "set-cookie"}
+SECRET_PARAMS = {"private_token", "access_token", "token", "key", "api_key"}
+# GitHub tokens by prefix, including App installation tokens minted at runtime (ghs_) that no setting holds.
+GITHUB_TOKEN_PATTERN = re.compile(r"\b(?:gh[pousr]_[A-Za-z0-9]{20,}|github_pat_[A-Za-z0-9_]{20,})")
+# The body is stored decoded, so transfer framing headers no longer apply on replay.
+DROPPED_RESPONSE_HEADERS = {"content-encoding", "transfer-encoding", "content-length"}
+
+
+class CassetteMiss(requests.exceptions.ConnectionError):
+    """Raised in replay mode when a request has no recorded response."""
+
+
+def _secrets() -> List[str]:
+    values = [settings.GITLAB_TOKEN, settings.GITHUB_TOKEN, settings.JULES_API_KEY, *settings.JULES_API_KEYS]
+    return [v for v in values if isinstance(v, str) and len(v) >= 6]
+
+
+def scrub_text(text: str) -> str:
+    for secret in _secrets():
+        text = text.replace(secret, REDACTED)
+    return GITHUB_TOKEN_PATTERN.sub(REDACTED, text)
+
+
+def normalize_url(url: str) -> str:
+    """Scrub secret query parameters and sort the rest so URLs match across runs."""
+    parts = urlsplit(url)
+    query = sorted((k, REDACTED if k.lower() in SECRET_PARAMS else v) for k, v in parse_qsl(parts.query, keep_blank_values=True))
+    return scrub_text(urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), "")))
+
+
+def _scrub_headers(headers) -> Dict[str, str]:
+    return {k: (REDACTED if k.lower() in SECRET_HEADERS else scrub_text(str(v))) for k, v in headers.items()}
+
+
+def _body_bytes(body) -> bytes:
+    if body is None:
+        return b""
+    return body.encode("utf-8") if isinstance(body, str) else bytes(body)
+
+
+def _encode(data: bytes) -> Dict[str, str]:
+    try:
+        return {"text": scrub_text(data.decode("utf-8"))}
+    except UnicodeDecodeError:
+        return {"base64": base64.b64encode(data).decode("ascii")}
+
+
+def _decode(payload: Dict[str, str]) -> bytes:
+    if "base64" in payload:
+        return base64.b64decode(payload["base64"])
+    return payload.get("text", "").encode("utf-8")
+
+
+def _request_key(method: str, url: str, body: bytes) -> Tuple[str, str, str]:
+    digest = hashlib.sha256(scrub_text(body.decode("utf-8", "replace")).encode("utf-8")).hexdigest() if body else ""
+    return method.upper(), normalize_url(url), digest
+
+
+class Cassette:
+    def __init__(self, path: str, mode: str, simulate_latency: bool = False):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.simulate_latency = simulate_latency
+        self.cycles = 0
+        self.db_snapshot: Optional[bytes] = None
+        self._lock = threading.Lock()
+        self._file = None
+        self._exact: Dict[Tuple[str, str, str], Deque[dict]] = defaultdict(deque)
+        self._by_url: Dict[Tuple[str, str], Deque[dict]] = defaultdict(deque)
+        if mode == "replay":
+            self._load()
+
+    # Recording
+
+    def start_recording(self, db_path: Optional[str] = None):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = gzip.open(self.path, "wt", encoding="utf-8")
+        header = {"type": "header", "version": CASSETTE_VERSION, "recorded_at": time.time()}
+        if db_path and os.path.exists(db_path):
+            header["db_snapshot"] = base64.b64encode(_snapshot_database(db_path)).decode("ascii")
+        self._write(header)
+        transport.install(self.middleware, order=100)
+        logger.info(f"Recording API traffic to cassette {self.path}")
+
+    def _write(self, entry: dict):
+        with self._lock:
+            self._file.write(json.dumps(entry) + "\n")
+
+    def mark_cycle(self):
+        """Record a cycle boundary and flush so a crash keeps all completed cycles."""
+        self.cycles += 1
+        if self.mode == "record" and self._file:
+            self._write({"type": "cycle_end", "cycle": self.cycles})
+            with self._lock:
+                self._file.flush()
+
+    def close(self):
+        transport.uninstall(self.middleware)
+        if self._file:
+            with self._lock:
+                self._file.close()
+                self._file = None
+
+    def _record(self, request, send, **kwargs):
+        start = time.perf_counter()
+        response = send(request, **kwargs)
+        elapsed = time.perf_counter() - start
+        body = _body_bytes(request.body)
+        method, url, digest = _request_key(request.method, request.url, body)
+        self._write({
+            "type": "interaction",
+            "request": {"method": method, "url": url, "body_sha256": digest, "headers": _scrub_headers(request.headers)},
+            "response": {
+                "status": response.status_code,
+                "reason": response.reason,
+                "headers": {k: v for k, v in _scrub_headers(response.headers).items()
+                            if k.lower() not in DROPPED_RESPONSE_HEADERS},
+                "body": _encode(response.content),
+                "elapsed": elapsed,
+            },
+        })
+        return response
+
+    # Replay
+
+    def _load(self):
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if entry["type"] == "header":
+                    if entry.get("version") != CASSETTE_VERSION:
+                        raise ValueError(f"Unsupported cassette version {entry.get('version')} in {self.path}")
+                    if entry.get("db_snapshot"):
+                        self.db_snapshot = base64.b64decode(entry["db_snapshot"])
+                elif entry["type"] == "cycle_end":
+                    self.cycles = entry["cycle"]
+                elif entry["type"] == "interaction":
+                    # A recording cut short mid-cycle still replays as one cycle.
+                    self.cycles = self.cycles or 1
+                    req = entry["request"]
+                    self._exact[(req["method"], req["url"], req["body_sha256"])].append(entry)
+                    self._by_url[(req["method"], req["url"])].append(entry)
+
+    def start_replay(self):
+        transport.install(self.middleware, order=100)
+        logger.info(f"Replaying {self.cycles} recorded cycle(s) from cassette {self.path}")
+
+    def restore_database(self, directory: Optional[str] = None) -> str:
+        """Write the recorded database snapshot to a scratch file and return its path."""
+        fd, path = tempfile.mkstemp(prefix="ato-replay-", suffix=".db", dir=directory)
+        with os.fdopen(fd, "wb") as f:
+            f.write(self.db_snapshot or b"")
+        return path
+
+    def _take(self, key: Tuple[str, str, str]) -> Optional[dict]:
+        with self._lock:
+            # Bodies can differ in non-semantic ways (e.g. key order); fall back to method + URL.
+            for queue in (self._exact.get(key), self._by_url.get(key[:2])):
+                while queue:
+                    entry = queue.popleft()
+                    if not entry.get("_used"):
+                        entry["_used"] = True
+                        return entry
+            return None
+
+    def _replay(self, request, send, **kwargs):
+        key = _request_key(request.method, request.url, _body_bytes(request.body))
+        entry = self._take(key)
+        if entry is None:
+            raise CassetteMiss(f"No recorded response for {key[0]} {key[1]}", request=request)
+        recorded = entry["response"]
+        if self.simulate_latency:
+            time.sleep(recorded.get("elapsed", 0))
+        response = requests.Response()
+        response.status_code = recorded["status"]
+        response.reason = recorded.get("reason") or ""
+        response.headers = CaseInsensitiveDict(recorded["headers"])
+        response._content = _decode(recorded["body"])
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers) or "utf-8"
+        response.url = request.url
+        response.request = request
+        response.elapsed = timedelta(seconds=recorded.get("elapsed", 0))
+        return response
+
+    def middleware(self, request, send, **kwargs):
+        if self.mode == "record":
+            return self._record(request, send, **kwargs)
+        return self._replay(request, send, **kwargs)
+
+
+def _snapshot_database(db_path: str) -> bytes:
+    source = sqlite3.connect(db_path)
+    fd, tmp_path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    try:
+        target = sqlite3.connect(tmp_path)
+        source.backup(target)
+        target.close()
+        with open(tmp_path, "rb") as f:
+            return f.read()
+    finally:
+        source.close()
+        os.remove(tmp_path)
@@ -0,0 +1,193 @@
+"""Conditional-request cache for GitHub and GitLab reads.
+
+A transport middleware stores the body and validators (``ETag``,
+``Last-Modified``) of every cacheable GET response in a SQLite file shared by
+both clients. The next identical request is sent with ``If-None-Match`` /
+``If-Modified-Since``; a ``304 Not Modified`` (which GitHub does not count
+against the rate limit) is turned back into the stored response, so clients
+never see the difference. The store is bounded by ``HTTP_CACHE_MAX_BYTES``
+and evicts the least recently used entries.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+from src.config import settings
+from src.utils import transport
+from src.utils.logger import logger
+from src.utils.metrics import metrics
+
+# The body is stored decoded, so transfer framing headers no longer apply when it is served.
+DROPPED_HEADERS = {"content-encoding", "transfer-encoding", "content-length"}
+# Headers of a 304 that refresh the stored response (rate-limit counters, dates, new validators).
+REFRESHED_HEADERS = ("etag", "last-modified", "date", "cache-control", "x-ratelimit-limit", "x-ratelimit-remaining",
+                     "x-ratelimit-reset", "x-ratelimit-used", "ratelimit-remaining", "ratelimit-reset")
+MAX_CREDENTIAL_ALIASES = 8
+
+
+class HttpCache:
+    def __init__(self):
+        self.enabled = False
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._size = 0
+        self._aliases: Dict[str, str] = {}
+
+    def enable(self, path: Optional[str] = None, max_bytes: Optional[int] = None):
+        path = path or settings.HTTP_CACHE_PATH
+        self.max_bytes = max_bytes or settings.HTTP_CACHE_MAX_BYTES
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS http_cache (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                status INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_http_cache_lru ON http_cache (last_used)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM http_cache").fetchone()[0]
+        self.enabled = True
+        transport.install(self.middleware, order=50)
+        logger.info(f"HTTP cache enabled at {path} ({self._size / 1e6:.1f} MB cached).")
+
+    def disable(self):
+        self.enabled = False
+        transport.uninstall(self.middleware)
+        with self._lock:
+            if self._conn:
+                self._conn.close()
+            self._conn = None
+
+    def _backend_of(self, host: str) -> Optional[str]:
+        for backend, url in (("github", settings.GITHUB_API_URL), ("gitlab", settings.GITLAB_URL)):
+            if urlsplit(url).netloc == host:
+                return backend
+        return None
+
+    def alias_credential(self, credential: str, identity: str):
+        """Key responses sent with a rotating ``credential`` header (a GitHub App installation token) on ``identity``.
+
+        Without an alias every new token would start from a cold cache.
+        """
+        with self._lock:
+            self._aliases[credential] = identity
+            # Only the current token and the one it replaced are still in use.
+            while len(self._aliases) > MAX_CREDENTIAL_ALIASES:
+                self._aliases.pop(next(iter(self._aliases)))
+
+    def _key(self, request) -> str:
+        # Responses can differ per credential and media type, so both are part of the key.
+        headers = request.headers
+        identity = headers.get("Authorization") or headers.get("PRIVATE-TOKEN") or ""
+        identity = self._aliases.get(identity, identity)
+        parts = (request.url, headers.get("Accept", ""), hashlib.sha256(identity.encode()).hexdigest())
+        return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+    def middleware(self, request, send, **kwargs):
+        backend = self._backend_of(urlsplit(request.url).netloc) if request.method == "GET" else None
+        if backend is None or not self.enabled or "If-None-Match" in request.headers:
+            return send(request, **kwargs)
+
+        key = self._key(request)
+        entry = self._get(key)
+        if entry:
+            etag, last_modified = entry[0], entry[1]
+            if etag:
+                request.headers["If-None-Match"] = etag
+            if last_modified:
+                request.headers["If-Modified-Since"] = last_modified
+        response = send(request, **kwargs)
+
+        if response.status_code == 304 and entry:
+            metrics.inc("ato_http_cache_requests_total", {"backend": backend, "result": "not_modified"})
+            metrics.record_cache(f"http_{backend}", True)
+            return self._from_entry(key, entry, response, request)
+        metrics.record_cache(f"http_{backend}", False)
+        etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+        if response.status_code == 200 and (etag or last_modified):
+            metrics.inc("ato_http_cache_requests_total", {"backend": backend, "result": "miss"})
+            self._put(key, request.url, etag, last_modified, response)
+        else:
+            metrics.inc("ato_http_cache_requests_total", {"backend": backend, "result": "uncacheable"})
+        return response
+
+    def _get(self, key: str):
+        with self._lock:
+            if self._conn is None:
+                return None
+            return self._conn.execute(
+                "SELECT etag, last_modified, status, headers, body FROM http_cache WHERE key = ?", (key,)
+            ).fetchone()
+
+    def _from_entry(self, key: str, entry, not_modified, request):
+        import requests
+        from requests.structures import CaseInsensitiveDict
+
+        etag, last_modified, status, headers, body = entry
+        response = requests.Response()
+        response.status_code = status
+        response.reason = "OK"
+        response.headers = CaseInsensitiveDict(json.loads(headers))
+        for name in REFRESHED_HEADERS:
+            if name in not_modified.headers:
+                response.headers[name] = not_modified.headers[name]
+        response._content = body
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers) or "utf-8"
+        response.url = request.url
+        response.request = request
+        response.elapsed = not_modified.elapsed
+        with self._lock:
+            if self._conn is not None:
+                self._conn.execute("UPDATE http_cache SET last_used = ?, etag = ?, last_modified = ? WHERE key = ?",
+                                   (time.time(), response.headers.get("ETag", etag),
+                                    response.headers.get("Last-Modified", last_modified), key))
+                self._conn.commit()
+        return response
+
+    def _put(self, key: str, url: str, etag: Optional[str], last_modified: Optional[str], response):
+        body = response.content
+        # A single entry may use at most a tenth of the cache, so one huge download cannot flush it.
+        if len(body) > self.max_bytes // 10:
+            return
+        headers = {k: v for k, v in response.headers.items() if k.lower() not in DROPPED_HEADERS}
+        with self._lock:
+            if self._conn is None:
+                return
+            previous = self._conn.execute("SELECT size FROM http_cache WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO http_cache (key, url, etag, last_modified, status, headers, body, size, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, url, etag, last_modified, response.status_code, json.dumps(headers), body, len(body), time.time())
+            )
+            self._size += len(body) - (previous[0] if previous else 0)
+            self._evict()
+            self._conn.commit()
+            metrics.set_gauge("ato_http_cache_bytes", self._size)
+
+    def _evict(self):
+        while self._size > self.max_bytes:
+            rows = self._conn.execute("SELECT key, size FROM http_cache ORDER BY last_used LIMIT 64").fetchall()
+            if not rows:
+                self._size = 0
+                return
+            for key, size in rows:
+                if self._size <= self.max_bytes:
+                    break
+                self._conn.execute("DELETE FROM http_cache WHERE key = ?", (key,))
+                self._size -= size
+
+
+http_cache = HttpCache()
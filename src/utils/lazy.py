@@ -0,0 +1,54 @@
+"""Lazily constructed client handles.
+
+``GitHubClient`` and ``GitLabClient`` make blocking API calls in ``__init__``
+and pull in heavy SDK imports. A ``LazyClient`` stands in for such a client and
+builds it on first attribute access; ``prefetch`` starts that construction on a
+background thread so several clients initialise concurrently while startup
+continues.
+"""
+import threading
+import time
+from concurrent.futures import Executor, Future
+from typing import Any, Callable, Optional
+from src.utils.logger import logger
+
+
+class LazyClient:
+    def __init__(self, name: str, factory: Callable[[], Any]):
+        self._name = name
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._instance: Any = None
+        self.init_seconds: Optional[float] = None
+
+    @property
+    def resolved(self) -> bool:
+        return self._instance is not None
+
+    def resolve(self) -> Any:
+        """Return the client, constructing it if needed. A failed construction is retried on the next access."""
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    start = time.perf_counter()
+                    self._instance = self._factory()
+                    self.init_seconds = time.perf_counter() - start
+                    logger.debug("%s client ready in %.3fs", self._name, self.init_seconds)
+        return self._instance
+
+    def prefetch(self, executor: Executor) -> Future:
+        future = executor.submit(self.resolve)
+        future.add_done_callback(self._log_failure)
+        return future
+
+    def _log_failure(self, future: Future):
+        error = future.exception()
+        if error is not None:
+            logger.warning(f"Background init of {self._name} client failed: {error}. Retrying on first use.")
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.resolve(), name)
+
+    def __repr__(self) -> str:
+        state = "resolved" if self.resolved else "pending"
+        return f"<LazyClient {self._name} ({state})>"
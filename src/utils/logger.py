@@ -1,19 +1,186 @@
+"""Logging pipeline.
+
+Records are put on an in-memory queue by the calling thread and written to
+stdout and, when ``LOG_DIR`` is set, a size-rotated JSON-lines file by a
+background listener, so slow sinks never block a cycle. Each record carries
+the current cycle, phase and correlation (issue, PR, session) IDs from
+``contextvars``. Per-item DEBUG/INFO messages logged with
+``extra={"sample": True}`` are sampled per call site and cycle: the first
+``LOG_SAMPLE_BURST`` are kept, then one in ``LOG_SAMPLE_RATE``. Everything
+else is always written.
+"""
+import atexit
+import contextvars
+import copy
+import json
 import logging
+import logging.handlers
+import multiprocessing
+import os
+import queue
 import sys
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
 from src.config import settings
 
+cycle_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("cycle_id", default=None)
+phase: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("phase", default=None)
+correlation_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("correlation_id", default=None)
+_CONTEXT_VARS = {"cycle_id": cycle_id, "phase": phase, "correlation_id": correlation_id}
+
+
+@contextmanager
+def log_context(**ids: Optional[str]):
+    """Attach IDs (``cycle_id``, ``phase``, ``correlation_id``) to every record logged inside the block.
+
+    All IDs, including ones changed by ``set_correlation_id`` inside the block, are restored on exit.
+    """
+    saved = {var: var.get() for var in _CONTEXT_VARS.values()}
+    for name, value in ids.items():
+        _CONTEXT_VARS[name].set(value)
+    try:
+        yield
+    finally:
+        for var, value in saved.items():
+            var.set(value)
+
+
+def set_correlation_id(value: Optional[str]):
+    """Tag the records of the current loop item; the enclosing ``log_context`` restores the previous ID."""
+    correlation_id.set(value)
+
+
+class ContextFilter(logging.Filter):
+    """Copy the context IDs onto the record; runs in the calling thread, where they are set."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.cycle_id = cycle_id.get()
+        record.phase = phase.get()
+        record.correlation_id = correlation_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Sample DEBUG/INFO records marked ``sample`` per call site, with separate counts for each cycle ID.
+
+    Threads without a cycle (outbox workers, for example) count under ``None``, so they
+    neither reset nor share the counts of the cycle running alongside them. Only the
+    ``MAX_CYCLES`` most recently used cycle IDs are kept.
+    """
+
+    MAX_CYCLES = 4
+
+    def __init__(self, burst: int, rate: int):
+        super().__init__()
+        self.burst = burst
+        self.rate = max(rate, 1)
+        self._counts: "OrderedDict[Optional[str], Dict[Tuple[str, int], int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not getattr(record, "sample", False):
+            return True
+        site = (record.pathname, record.lineno)
+        with self._lock:
+            current = cycle_id.get()
+            counts = self._counts.get(current)
+            if counts is None:
+                counts = self._counts[current] = {}
+                while len(self._counts) > self.MAX_CYCLES:
+                    self._counts.popitem(last=False)
+            else:
+                self._counts.move_to_end(current)
+            count = counts.get(site, 0) + 1
+            counts[site] = count
+        if count <= self.burst:
+            return True
+        if (count - self.burst) % self.rate:
+            return False
+        record.sampled = self.rate
+        return True
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        ids = [f"{name}={getattr(record, name)}" for name in ("cycle_id", "correlation_id") if getattr(record, name, None)]
+        record.context = f"[{' '.join(ids)}] " if ids else ""
+        return super().format(record)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "module": record.module,
+            "line": record.lineno,
+            "thread": record.threadName,
+        }
+        for name in ("cycle_id", "phase", "correlation_id", "sampled"):
+            value = getattr(record, name, None)
+            if value is not None:
+                entry[name] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Keep the record structured for the JSON sink instead of flattening it to
+        # a formatted string; only the message and traceback must be rendered here.
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _formatter(kind: str) -> logging.Formatter:
+    if kind == "json":
+        return JsonFormatter()
+    return TextFormatter("%(asctime)s - %(name)s - %(levelname)s - %(context)s%(message)s")
+
+
+def _sinks() -> list:
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setFormatter(_formatter(settings.LOG_FORMAT))
+    handlers = [console_handler]
+    # Worker processes (the attachment pool) log to stdout only: RotatingFileHandler cannot share its file
+    # with another process, and rotating it from several would lose records.
+    if settings.LOG_DIR and multiprocessing.parent_process() is None:
+        os.makedirs(settings.LOG_DIR, exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(
+            os.path.join(settings.LOG_DIR, "ato.jsonl"), maxBytes=settings.LOG_FILE_MAX_BYTES,
+            backupCount=settings.LOG_FILE_BACKUP_COUNT, encoding="utf-8")
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+    return handlers
+
+
 def setup_logger():
     logger = logging.getLogger("ato")
     logger.setLevel(settings.LOG_LEVEL)
 
-    formatter = logging.Formatter(
-        "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-    )
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = _QueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(settings.LOG_SAMPLE_BURST, settings.LOG_SAMPLE_RATE))
+    queue_handler.addFilter(ContextFilter())
+    logger.addHandler(queue_handler)
 
-    # Console handler
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
+    listener = logging.handlers.QueueListener(log_queue, *_sinks(), respect_handler_level=True)
+    listener.start()
+    # Flush whatever is still queued when the process exits.
+    atexit.register(listener.stop)
 
     return logger
 
@@ -0,0 +1,138 @@
+"""Memory profiling for the long-running worker.
+
+When enabled, ``tracemalloc`` traces Python allocations and every
+``MEMORY_PROFILE_INTERVAL`` cycles a report is appended to
+``MEMORY_REPORT_DIR/memory.jsonl``. Each report holds the RSS, the traced size,
+the source lines whose allocations grew most since the previous report, and
+the client and library types (PyGithub, python-gitlab, requests and our own
+classes) whose live object count grew most. When traced memory has grown by
+more than ``MEMORY_GROWTH_ALERT_BYTES`` since the first report, a warning is
+logged and the full allocation snapshot is dumped next to the reports. A dump can be
+loaded with ``tracemalloc.Snapshot.load`` for offline analysis.
+"""
+import gc
+import json
+import os
+import resource
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict, List, Optional
+from src.config import settings
+from src.utils.logger import logger
+from src.utils.metrics import metrics
+
+# Modules whose live object counts are reported; their objects are the ones a forgotten reference keeps alive.
+TRACKED_MODULE_PREFIXES = ("github.", "gitlab.", "requests.", "urllib3.", "src.")
+# Allocations made by the profiler and the import machinery are not the worker's.
+IGNORED_FILES = (tracemalloc.__file__, "<frozen importlib._bootstrap>", "<frozen importlib._bootstrap_external>",
+                 "<unknown>")
+
+
+def rss_bytes() -> int:
+    """Current resident set size; the peak where ``/proc`` is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def object_counts() -> Counter:
+    """Live objects per type for the tracked modules, e.g. ``github.PullRequest.PullRequest``."""
+    counts: Counter = Counter()
+    for obj in gc.get_objects():
+        cls = type(obj)
+        module = cls.__module__
+        # Some extension types expose __module__ as a descriptor rather than a string.
+        if isinstance(module, str) and module.startswith(TRACKED_MODULE_PREFIXES):
+            counts[f"{module}.{cls.__qualname__}"] += 1
+    return counts
+
+
+class MemoryProfiler:
+    def __init__(self):
+        self.enabled = False
+        self._cycles = 0
+        self._previous: Optional[tracemalloc.Snapshot] = None
+        self._previous_counts: Counter = Counter()
+        self._baseline: Optional[int] = None
+
+    def enable(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(settings.MEMORY_PROFILE_FRAMES)
+        self.enabled = True
+        logger.info(f"Memory profiling enabled: a report every {settings.MEMORY_PROFILE_INTERVAL} cycle(s) "
+                    f"in {settings.MEMORY_REPORT_DIR}.")
+
+    def disable(self):
+        self.enabled = False
+        self._cycles = 0
+        self._previous = None
+        self._previous_counts = Counter()
+        self._baseline = None
+        tracemalloc.stop()
+
+    def after_cycle(self):
+        if not self.enabled:
+            return
+        self._cycles += 1
+        if self._cycles % settings.MEMORY_PROFILE_INTERVAL == 0:
+            self.report()
+
+    def report(self) -> Dict:
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, filename) for filename in IGNORED_FILES])
+        traced = sum(stat.size for stat in snapshot.statistics("filename"))
+        rss = rss_bytes()
+        counts = object_counts()
+        # The first report is the baseline: by then imports are done and the caches have warmed up.
+        if self._baseline is None:
+            self._baseline = traced
+        growth = traced - self._baseline
+
+        top: List[Dict] = []
+        if self._previous is not None:
+            for stat in snapshot.compare_to(self._previous, "lineno")[:settings.MEMORY_PROFILE_TOP]:
+                frame = stat.traceback[0]
+                top.append({"location": f"{frame.filename}:{frame.lineno}", "size": stat.size,
+                            "size_diff": stat.size_diff, "count_diff": stat.count_diff})
+        report = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "cycle": self._cycles,
+            "rss_bytes": rss,
+            "traced_bytes": traced,
+            "growth_bytes": growth,
+            "top_growth": top,
+            "objects": dict(sorted(
+                ((name, {"count": count, "diff": count - self._previous_counts.get(name, 0)})
+                 for name, count in counts.items()),
+                key=lambda item: item[1]["diff"], reverse=True)[:settings.MEMORY_PROFILE_TOP]),
+        }
+        self._previous, self._previous_counts = snapshot, counts
+        metrics.set_gauge("ato_memory_rss_bytes", rss)
+        metrics.set_gauge("ato_memory_traced_bytes", traced)
+
+        try:
+            os.makedirs(settings.MEMORY_REPORT_DIR, exist_ok=True)
+            with open(os.path.join(settings.MEMORY_REPORT_DIR, "memory.jsonl"), "a", encoding="utf-8") as f:
+                f.write(json.dumps(report) + "\n")
+            if growth > settings.MEMORY_GROWTH_ALERT_BYTES:
+                self._alert(snapshot, report)
+        except OSError as e:
+            logger.error(f"Failed to write memory report: {e}")
+        return report
+
+    def _alert(self, snapshot: tracemalloc.Snapshot, report: Dict):
+        path = os.path.join(settings.MEMORY_REPORT_DIR, f"memory-{time.strftime('%Y%m%dT%H%M%S')}.tracemalloc")
+        snapshot.dump(path)
+        metrics.inc("ato_memory_growth_alerts_total")
+        top = report["top_growth"][0]["location"] if report["top_growth"] else "unknown"
+        logger.warning(f"Traced memory grew by {report['growth_bytes'] / 1e6:.1f} MB since the first report "
+                       f"(RSS {report['rss_bytes'] / 1e6:.1f} MB, largest recent growth at {top}). "
+                       f"Allocation snapshot saved to {path}")
+        # Re-armed from here, so a steady leak alerts once per threshold of growth rather than every report.
+        self._baseline = report["traced_bytes"]
+
+
+memory_profiler = MemoryProfiler()
@@ -0,0 +1,284 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from src.config import settings
+from src.utils.logger import logger
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Optional[Dict[str, object]]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in (labels or {}).items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    body = ",".join('{}="{}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs)
+    return "{" + body + "}"
+
+
+class MetricsRegistry:
+    """In-process metrics store rendered in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._meta: Dict[str, Tuple[str, str]] = {}
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, list]] = {}
+        self._buckets: Dict[str, Tuple[float, ...]] = {}
+        self.started_at = time.time()
+        self.last_cycle_completed_at: Optional[float] = None
+
+    def describe(self, name: str, metric_type: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        with self._lock:
+            self._meta[name] = (metric_type, help_text)
+            if metric_type == "histogram":
+                self._buckets[name] = buckets
+
+    def inc(self, name: str, labels: Optional[Dict[str, object]] = None, value: float = 1.0):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def set_gauge(self, name: str, value: float, labels: Optional[Dict[str, object]] = None):
+        with self._lock:
+            self._gauges.setdefault(name, {})[_label_key(labels)] = float(value)
+
+    def observe(self, name: str, value: float, labels: Optional[Dict[str, object]] = None):
+        key = _label_key(labels)
+        with self._lock:
+            buckets = self._buckets.get(name, DEFAULT_BUCKETS)
+            series = self._histograms.setdefault(name, {})
+            # [bucket counts..., sum, count]
+            state = series.setdefault(key, [0] * len(buckets) + [0.0, 0])
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def get_counter(self, name: str, labels: Optional[Dict[str, object]] = None) -> float:
+        with self._lock:
+            return self._counters.get(name, {}).get(_label_key(labels), 0.0)
+
+    def get_gauge(self, name: str, labels: Optional[Dict[str, object]] = None) -> Optional[float]:
+        with self._lock:
+            return self._gauges.get(name, {}).get(_label_key(labels))
+
+    def get_histogram_count(self, name: str, labels: Optional[Dict[str, object]] = None) -> int:
+        with self._lock:
+            state = self._histograms.get(name, {}).get(_label_key(labels))
+            return state[-1] if state else 0
+
+    def record_cache(self, cache: str, hit: bool):
+        self.inc("ato_cache_requests_total", {"cache": cache, "result": "hit" if hit else "miss"})
+
+    def cache_hit_ratios(self) -> Dict[str, float]:
+        totals: Dict[str, list] = {}
+        with self._lock:
+            for key, value in self._counters.get("ato_cache_requests_total", {}).items():
+                labels = dict(key)
+                entry = totals.setdefault(labels["cache"], [0.0, 0.0])
+                entry[1] += value
+                if labels["result"] == "hit":
+                    entry[0] += value
+        return {cache: (hits / total if total else 0.0) for cache, (hits, total) in totals.items()}
+
+    def cycle_lag(self) -> float:
+        """Seconds since the last completed cycle (or since startup if none completed yet)."""
+        reference = self.last_cycle_completed_at or self.started_at
+        return max(0.0, time.time() - reference)
+
+    @contextmanager
+    def time_phase(self, phase: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("ato_phase_duration_seconds", time.perf_counter() - start, {"phase": phase})
+
+    @contextmanager
+    def time_cycle(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("ato_cycle_duration_seconds", time.perf_counter() - start)
+            self.last_cycle_completed_at = time.time()
+            self.set_gauge("ato_last_cycle_completed_timestamp_seconds", self.last_cycle_completed_at)
+
+    def render(self) -> str:
+        for cache, ratio in self.cache_hit_ratios().items():
+            self.set_gauge("ato_cache_hit_ratio", ratio, {"cache": cache})
+        self.set_gauge("ato_cycle_lag_seconds", self.cycle_lag())
+
+        lines = []
+        with self._lock:
+            names = sorted(set(self._counters) | set(self._gauges) | set(self._histograms))
+            for name in names:
+                metric_type, help_text = self._meta.get(name, ("untyped", ""))
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for key, value in sorted(self._counters.get(name, {}).items()):
+                    lines.append(f"{name}{_format_labels(key)} {value}")
+                for key, value in sorted(self._gauges.get(name, {}).items()):
+                    lines.append(f"{name}{_format_labels(key)} {value}")
+                buckets = self._buckets.get(name, DEFAULT_BUCKETS)
+                for key, state in sorted(self._histograms.get(name, {}).items()):
+                    for bound, count in zip(buckets, state):
+                        lines.append(f"{name}_bucket{_format_labels(key, ('le', str(bound)))} {count}")
+                    lines.append(f"{name}_bucket{_format_labels(key, ('le', '+Inf'))} {state[-1]}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {state[-2]}")
+                    lines.append(f"{name}_count{_format_labels(key)} {state[-1]}")
+        return "\n".join(lines) + "\n"
+
+    def health(self) -> Tuple[bool, bool, Dict]:
+        """Returns (alive, ready, details) based on how far the main loop lags behind."""
+        lag = self.cycle_lag()
+        alive = lag <= settings.HEALTH_MAX_CYCLE_LAG
+        ready = alive and self.last_cycle_completed_at is not None
+        return alive, ready, {
+            "cycle_lag_seconds": round(lag, 3),
+            "last_cycle_completed_at": self.last_cycle_completed_at,
+            "max_cycle_lag_seconds": settings.HEALTH_MAX_CYCLE_LAG,
+        }
+
+
+metrics = MetricsRegistry()
+metrics.describe("ato_cycle_duration_seconds", "histogram", "Duration of a full orchestration cycle.")
+metrics.describe("ato_phase_duration_seconds", "histogram", "Duration of a single cycle phase.")
+metrics.describe("ato_api_calls_total", "counter", "Client method calls by client, method and outcome.")
+metrics.describe("ato_api_call_duration_seconds", "histogram", "Client method latency by client and method.")
+metrics.describe("ato_cache_requests_total", "counter", "Cache lookups by cache and result.")
+metrics.describe("ato_cache_hit_ratio", "gauge", "Fraction of cache lookups that were hits.")
+metrics.describe("ato_db_query_duration_seconds", "histogram", "Database method latency by query.",
+                 buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0))
+metrics.describe("ato_jules_active_sessions", "gauge", "Active Jules sessions reported by the API.")
+metrics.describe("ato_jules_key_active_sessions", "gauge", "In-progress Jules sessions per API key (by key ID).")
+metrics.describe("ato_jules_key_cooldowns_total", "counter", "Times a Jules API key was rate limited or rejected and set aside.")
+metrics.describe("ato_jules_stalled_sessions", "gauge", "Active Jules sessions without recent activity.")
+metrics.describe("ato_jules_polls_skipped_total", "counter", "Session polls skipped because completion was not expected yet.")
+metrics.describe("ato_jules_activities_fetched_total", "counter", "New Jules session activities fetched.")
+metrics.describe("ato_pr_mirror_open_prs", "gauge", "Open PRs in the local GitHub PR mirror.")
+metrics.describe("ato_pr_mirror_updates_total", "counter", "PRs written to the mirror by full and incremental syncs.")
+metrics.describe("ato_pr_resyncs_total", "counter", "Synced PRs whose new head was pushed to GitLab, by mode (delta, full).")
+metrics.describe("ato_pr_resync_files_total", "counter", "Files committed to GitLab by PR re-syncs, by mode.")
+metrics.describe("ato_sync_unchanged_files_total", "counter", "PR files left out of GitLab sync commits as byte-identical.")
+metrics.describe("ato_delegation_backlog", "gauge", "Delegation candidates waiting for a free Jules slot.")
+metrics.describe("ato_circuit_state", "gauge", "Circuit breaker state (0 closed, 1 half-open, 2 open).")
+metrics.describe("ato_circuit_rejections_total", "counter", "Requests failed fast by an open circuit breaker.")
+metrics.describe("ato_http_cache_requests_total", "counter", "Cacheable GETs by backend and result (not_modified, miss, uncacheable).")
+metrics.describe("ato_http_cache_bytes", "gauge", "Bytes of response bodies in the HTTP cache.")
+metrics.describe("ato_blob_store_bytes", "gauge", "Bytes of git blobs in the local blob store.")
+metrics.describe("ato_phase_failures_total", "counter", "Cycle phases aborted by an error.")
+metrics.describe("ato_phase_deadline_exceeded_total", "counter", "Cycle phases that stopped at their deadline.")
+metrics.describe("ato_carry_over_items", "gauge", "Items a phase carried over to the next cycle.")
+metrics.describe("ato_retention_rows_total", "counter", "Rows archived or deleted by retention, by table.")
+metrics.describe("ato_outbox_depth", "gauge", "Outbox writes waiting for delivery.")
+metrics.describe("ato_outbox_oldest_age_seconds", "gauge", "Age of the oldest undelivered outbox write.")
+metrics.describe("ato_outbox_dead", "gauge", "Outbox writes that exhausted their retries.")
+metrics.describe("ato_outbox_deliveries_total", "counter", "Outbox delivery attempts by action and outcome.")
+metrics.describe("ato_attachment_bytes_total", "counter", "Attachment bytes as downloaded and as sent to Jules, by stage.")
+metrics.describe("ato_attachments_dropped_total", "counter", "Attachments dropped as duplicates or over the payload budget.")
+metrics.describe("ato_prompt_tokens", "histogram", "Estimated tokens in prompts sent to Jules.",
+                 buckets=(500, 1000, 2000, 4000, 8000, 12000, 16000, 32000, 64000))
+metrics.describe("ato_github_app_tokens_total", "counter", "GitHub App installation tokens minted.")
+metrics.describe("ato_memory_rss_bytes", "gauge", "Resident set size at the last memory report.")
+metrics.describe("ato_memory_traced_bytes", "gauge", "Python allocations traced by tracemalloc at the last memory report.")
+metrics.describe("ato_memory_growth_alerts_total", "counter", "Memory reports whose growth passed MEMORY_GROWTH_ALERT_BYTES.")
+metrics.describe("ato_snapshot_age_seconds", "gauge", "Age of the state snapshot restored at startup.")
+metrics.describe("ato_startup_seconds", "gauge", "Seconds from process start to each startup stage.")
+metrics.describe("ato_last_cycle_completed_timestamp_seconds", "gauge", "Unix time of the last completed cycle.")
+metrics.describe("ato_cycle_lag_seconds", "gauge", "Seconds since the last completed cycle.")
+
+
+def _wrap_public_methods(cls, wrapper):
+    for name, attr in list(vars(cls).items()):
+        if name.startswith("_") or not callable(attr) or isinstance(attr, (staticmethod, classmethod, type)):
+            continue
+        setattr(cls, name, wrapper(name, attr))
+    return cls
+
+
+def instrument_api(client: str):
+    """Class decorator counting calls and recording latency for every public client method."""
+    def wrapper(method_name, func):
+        @wraps(func)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            outcome = "success"
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                outcome = "error"
+                raise
+            finally:
+                labels = {"client": client, "method": method_name}
+                metrics.observe("ato_api_call_duration_seconds", time.perf_counter() - start, labels)
+                metrics.inc("ato_api_calls_total", {**labels, "outcome": outcome})
+        return timed
+
+    return lambda cls: _wrap_public_methods(cls, wrapper)
+
+
+def instrument_queries(cls):
+    """Class decorator recording the latency of every public database method."""
+    def wrapper(method_name, func):
+        @wraps(func)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                metrics.observe("ato_db_query_duration_seconds", time.perf_counter() - start, {"query": method_name})
+        return timed
+
+    return _wrap_public_methods(cls, wrapper)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: MetricsRegistry = metrics
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/metrics":
+            self._respond(200, self.registry.render(), "text/plain; version=0.0.4; charset=utf-8")
+        elif path in ("/healthz", "/readyz"):
+            alive, ready, details = self.registry.health()
+            ok = alive if path == "/healthz" else ready
+            details["status"] = "ok" if ok else "unavailable"
+            self._respond(200 if ok else 503, json.dumps(details), "application/json")
+        else:
+            self._respond(404, "Not found\n", "text/plain")
+
+    def _respond(self, status: int, body: str, content_type: str):
+        payload = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        # Scrapes and probes are too frequent for the application log.
+        pass
+
+
+def start_metrics_server(host: str, port: int) -> ThreadingHTTPServer:
+    """Serve /metrics, /healthz and /readyz from a daemon thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True)
+    thread.start()
+    logger.info(f"Metrics server listening on {host}:{server.server_address[1]}")
+    return server
@@ -0,0 +1,213 @@
+"""Circuit breakers for outbound API calls.
+
+A transport middleware keeps one breaker per backend (GitHub, GitLab, Jules)
+and one per endpoint class within it (``pulls``, ``merge_requests``,
+``sessions``...). Consecutive connection errors, timeouts, 5xx and 429
+responses open a breaker; while it is open requests fail immediately with
+``CircuitOpenError`` instead of waiting on a degraded backend. After
+``BREAKER_RESET_SECONDS`` a single trial request is let through (half-open)
+and its outcome closes or re-opens the breaker. The middleware also enforces
+``HTTP_CONNECT_TIMEOUT`` on clients that only configure a read timeout.
+
+Like ``transport``, this module leaves ``requests`` unimported until it is
+needed; ``CircuitOpenError`` is created on first access.
+"""
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+from src.config import settings
+from src.utils import transport
+from src.utils.logger import logger
+from src.utils.metrics import metrics
+from src.utils.tracing import http_status_of
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+_circuit_open_error = None
+
+
+def _circuit_open_error_class():
+    global _circuit_open_error
+    if _circuit_open_error is None:
+        import requests
+
+        class CircuitOpenError(requests.exceptions.ConnectionError):
+            """Raised without touching the network while a breaker is open."""
+
+        CircuitOpenError.__module__ = __name__
+        _circuit_open_error = CircuitOpenError
+    return _circuit_open_error
+
+
+def __getattr__(name: str):
+    if name == "CircuitOpenError":
+        return _circuit_open_error_class()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def is_transient(error: Exception) -> bool:
+    """True for failures worth surfacing instead of swallowing: outages, timeouts, 5xx and rate limits."""
+    import requests
+
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    status = http_status_of(error)
+    return status is not None and (status >= 500 or status == 429)
+
+
+def raise_if_transient(error: Exception):
+    if is_transient(error):
+        raise error
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self._set_state(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._trial_in_flight:
+                    return False
+                self._trial_in_flight = True
+                return True
+            return self.state == CLOSED
+
+    def release(self):
+        """Give back a half-open trial slot that was not used."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._trial_in_flight = False
+            if self.state != CLOSED:
+                logger.info(f"Circuit {self.name} closed.")
+                self._set_state(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                logger.warning(f"Circuit {self.name} opened after {self.failures} consecutive failure(s). "
+                               f"Failing fast for {self.reset_seconds:.0f}s.")
+                self.opened_at = time.monotonic()
+                self._set_state(OPEN)
+
+    def _set_state(self, state: str):
+        self.state = state
+        metrics.set_gauge("ato_circuit_state", _STATE_VALUES[state], {"breaker": self.name})
+
+
+def endpoint_class(path: str) -> str:
+    """Coarse endpoint family of an API path, e.g. ``/repos/o/r/pulls/1/files`` -> ``pulls``."""
+    parts = [p for p in path.split("/") if p]
+    if parts[:1] == ["repos"]:
+        parts = parts[3:]
+    elif parts[:2] == ["api", "v4"]:
+        parts = parts[2:]
+        if parts[:1] == ["projects"]:
+            parts = parts[2:]
+    elif parts and parts[0].startswith("v1"):
+        parts = parts[1:]
+    return parts[0].split(":")[0] if parts else "root"
+
+
+class CircuitBreakers:
+    def __init__(self):
+        self._breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+        self._lock = threading.Lock()
+        self.enabled = False
+
+    def enable(self):
+        self.enabled = True
+        transport.install(self.middleware, order=10)
+
+    def disable(self):
+        self.enabled = False
+        transport.uninstall(self.middleware)
+
+    def _backend_of(self, host: str) -> Optional[str]:
+        for backend, url in (("github", settings.GITHUB_API_URL), ("gitlab", settings.GITLAB_URL),
+                             ("jules", settings.JULES_API_URL)):
+            if urlsplit(url).netloc == host:
+                return backend
+        return None
+
+    def get(self, backend: str, endpoint: Optional[str] = None) -> CircuitBreaker:
+        key = (backend, endpoint or "*")
+        with self._lock:
+            if key not in self._breakers:
+                threshold = settings.BREAKER_FAILURE_THRESHOLD if endpoint else settings.BREAKER_BACKEND_FAILURE_THRESHOLD
+                name = f"{backend}.{endpoint}" if endpoint else backend
+                self._breakers[key] = CircuitBreaker(name, threshold, settings.BREAKER_RESET_SECONDS)
+            return self._breakers[key]
+
+    def dump_state(self) -> List:
+        """Open breakers as ``[backend, endpoint, failures, open_until]``, with ``open_until`` in wall-clock time."""
+        now, wall = time.monotonic(), time.time()
+        with self._lock:
+            breakers = list(self._breakers.items())
+        return [[backend, endpoint, breaker.failures, wall + breaker.opened_at + breaker.reset_seconds - now]
+                for (backend, endpoint), breaker in breakers if breaker.state == OPEN]
+
+    def load_state(self, entries: List):
+        # A backend that was failing right before a restart is most likely still failing.
+        for backend, endpoint, failures, open_until in entries:
+            remaining = open_until - time.time()
+            if remaining <= 0:
+                continue
+            breaker = self.get(backend, None if endpoint == "*" else endpoint)
+            with breaker._lock:
+                breaker.failures = failures
+                breaker.opened_at = time.monotonic() - max(breaker.reset_seconds - remaining, 0)
+                breaker._set_state(OPEN)
+            logger.info(f"Circuit {breaker.name} restored open for {remaining:.0f}s.")
+
+    def middleware(self, request, send, **kwargs):
+        import requests
+
+        url = urlsplit(request.url)
+        backend = self._backend_of(url.netloc)
+        if backend is None:
+            return send(request, **kwargs)
+        timeout = kwargs.get("timeout")
+        if timeout is None or isinstance(timeout, (int, float)):
+            kwargs["timeout"] = (settings.HTTP_CONNECT_TIMEOUT, timeout or settings.HTTP_READ_TIMEOUT)
+        breakers = (self.get(backend), self.get(backend, endpoint_class(url.path)))
+        for index, breaker in enumerate(breakers):
+            if not breaker.allow():
+                for allowed in breakers[:index]:
+                    allowed.release()
+                metrics.inc("ato_circuit_rejections_total", {"breaker": breaker.name})
+                raise _circuit_open_error_class()(f"Circuit {breaker.name} is open", request=request)
+        try:
+            response = send(request, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            for breaker in breakers:
+                breaker.record_failure()
+            raise
+        failed = response.status_code >= 500 or response.status_code == 429
+        for breaker in breakers:
+            if failed:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+        return response
+
+
+circuit_breakers = CircuitBreakers()
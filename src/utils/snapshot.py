@@ -0,0 +1,89 @@
+"""Warm-restart snapshot of in-memory caches and scheduler state.
+
+Components register a section with a ``dump`` callable returning JSON-able
+data and a ``load`` callable that takes that data back. The snapshot is a
+single versioned JSON file in the ``data/`` volume, written atomically every
+``SNAPSHOT_INTERVAL`` seconds and at shutdown. It is read once at startup;
+a file from another format version or older than ``SNAPSHOT_MAX_AGE`` is
+ignored. Entries that expire store absolute wall-clock times, so their
+remaining lifetime carries across the restart instead of starting over.
+"""
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+from src.config import settings
+from src.utils.logger import logger
+from src.utils.metrics import metrics
+
+SNAPSHOT_VERSION = 1
+
+
+class StateSnapshot:
+    def __init__(self):
+        self._sections: Dict[str, Tuple[Callable[[], Any], Callable[[Any], None]]] = {}
+        self._lock = threading.Lock()
+        self._last_saved = time.monotonic()
+
+    def register(self, name: str, dump: Callable[[], Any], load: Callable[[Any], None]):
+        self._sections[name] = (dump, load)
+
+    def load(self, path: Optional[str] = None) -> int:
+        """Restore the registered sections from disk; returns how many were restored."""
+        path = path or settings.SNAPSHOT_PATH
+        try:
+            with open(path) as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable state snapshot {path}: {e}")
+            return 0
+        age = time.time() - snapshot.get("written_at", 0)
+        if snapshot.get("version") != SNAPSHOT_VERSION:
+            logger.info(f"Ignoring state snapshot with format version {snapshot.get('version')}.")
+            return 0
+        if age > settings.SNAPSHOT_MAX_AGE:
+            logger.info(f"Ignoring state snapshot written {age:.0f}s ago.")
+            return 0
+
+        restored = 0
+        for name, data in snapshot.get("sections", {}).items():
+            if name not in self._sections:
+                continue
+            try:
+                self._sections[name][1](data)
+                restored += 1
+            except Exception as e:
+                logger.warning(f"Could not restore {name} from the state snapshot: {e}")
+        metrics.set_gauge("ato_snapshot_age_seconds", age)
+        logger.info(f"Restored {restored} section(s) from the state snapshot written {age:.0f}s ago.")
+        return restored
+
+    def save(self, path: Optional[str] = None):
+        path = path or settings.SNAPSHOT_PATH
+        sections = {}
+        for name, (dump, _) in self._sections.items():
+            try:
+                sections[name] = dump()
+            except Exception as e:
+                logger.warning(f"Could not snapshot {name}: {e}")
+        snapshot = {"version": SNAPSHOT_VERSION, "written_at": time.time(), "sections": sections}
+        with self._lock:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Written next to the target and renamed, so a crash mid-write keeps the previous snapshot.
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, path)
+            self._last_saved = time.monotonic()
+        logger.debug("State snapshot written to %s", path)
+
+    def save_if_due(self):
+        if time.monotonic() - self._last_saved >= settings.SNAPSHOT_INTERVAL:
+            self.save()
+
+
+state_snapshot = StateSnapshot()
@@ -0,0 +1,252 @@
+import inspect
+import json
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+from src.config import settings
+from src.utils import transport
+from src.utils.logger import logger
+
+# Call arguments that are worth recording as span attributes, keyed by parameter name.
+ARGUMENT_ATTRIBUTES = {
+    "pr_number": "github.pr_number",
+    "github_pr_id": "github.pr_number",
+    "gh_pr_id": "github.pr_number",
+    "issue_iid": "gitlab.issue_iid",
+    "iid": "gitlab.mr_iid",
+    "gitlab_mr_iid": "gitlab.mr_iid",
+    "session_id": "jules.session_id",
+    "task_id": "ato.task_id",
+    "task_type": "ato.task_type",
+    "sha": "git.sha",
+}
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, trace_id: str, parent_id: Optional[str], name: str, attributes: Dict[str, Any]):
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+    @property
+    def duration(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "duration_ms": round(self.duration * 1000, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(spans: List[Span]) -> Dict[str, Any]:
+    """Encode spans as an OTLP/JSON ExportTraceServiceRequest."""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "ai-task-orchestrator"}}]},
+            "scopeSpans": [{
+                "scope": {"name": "ato"},
+                "spans": [{
+                    "traceId": span.trace_id,
+                    "spanId": span.span_id,
+                    "parentSpanId": span.parent_id or "",
+                    "name": span.name,
+                    "kind": 1,
+                    "startTimeUnixNano": str(span.start_ns),
+                    "endTimeUnixNano": str(span.end_ns or span.start_ns),
+                    "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in span.attributes.items()],
+                    "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+                } for span in spans],
+            }],
+        }]
+    }
+
+
+def write_spans(spans: List[Span], path: str, export_format: str):
+    """Append spans to ``path`` as JSON lines (one span per line) or one OTLP/JSON request per line."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        if export_format == "otlp":
+            f.write(json.dumps(to_otlp(spans)) + "\n")
+        else:
+            for span in spans:
+                f.write(json.dumps(span.to_dict(), default=str) + "\n")
+
+
+class Tracer:
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._current: ContextVar[Optional[Span]] = ContextVar("ato_current_span", default=None)
+        self._lock = threading.Lock()
+        self._spans: List[Span] = []
+        self._dropped = 0
+        self.last_trace: List[Span] = []
+
+    def enable(self):
+        self.enabled = True
+        transport.install(_http_span_middleware, order=0)
+
+    def _record(self, span: Span):
+        with self._lock:
+            if len(self._spans) < settings.TRACE_MAX_SPANS_PER_CYCLE:
+                self._spans.append(span)
+            else:
+                self._dropped += 1
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        if not self.enabled:
+            yield None
+            return
+        parent = self._current.get()
+        trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        span = Span(trace_id, parent.span_id if parent else None, name, attributes)
+        token = self._current.set(span)
+        try:
+            yield span
+        except Exception as e:
+            span.error = type(e).__name__
+            status = http_status_of(e)
+            if status is not None:
+                span.attributes["http.status_code"] = status
+            raise
+        finally:
+            span.end_ns = time.time_ns()
+            self._current.reset(token)
+            self._record(span)
+
+    def set_attribute(self, key: str, value: Any):
+        span = self._current.get()
+        if span is not None:
+            span.attributes[key] = value
+
+    @contextmanager
+    def cycle(self):
+        """Root span for one orchestration cycle; exports the finished span tree."""
+        if not self.enabled:
+            yield None
+            return
+        with self._lock:
+            self._spans = []
+            self._dropped = 0
+        root = None
+        try:
+            with self.span("cycle") as root:
+                yield root
+        finally:
+            with self._lock:
+                spans, self._spans = self._spans, []
+                if self._dropped and root is not None:
+                    root.attributes["ato.dropped_spans"] = self._dropped
+            self.last_trace = spans
+            if root is not None:
+                self._export(root, spans)
+
+    def _export(self, root: Span, spans: List[Span]):
+        export_format = settings.TRACE_EXPORT_FORMAT
+        try:
+            if settings.TRACE_EXPORT_PATH:
+                write_spans(spans, settings.TRACE_EXPORT_PATH, export_format)
+            threshold = settings.TRACE_SLOW_CYCLE_THRESHOLD
+            if threshold and root.duration >= threshold:
+                extension = "otlp.json" if export_format == "otlp" else "jsonl"
+                stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime(root.start_ns / 1e9))
+                path = os.path.join(settings.TRACE_SLOW_CYCLE_DIR, f"cycle-{stamp}-{root.trace_id[:8]}.{extension}")
+                write_spans(spans, path, export_format)
+                logger.warning(f"Slow cycle took {root.duration:.1f}s (threshold {threshold}s). Trace saved to {path}")
+        except OSError as e:
+            logger.error(f"Failed to export cycle trace: {e}")
+
+
+def http_status_of(error: Exception) -> Optional[int]:
+    """Extract an HTTP status code from PyGithub, python-gitlab or requests errors."""
+    for attr in ("status", "response_code"):
+        value = getattr(error, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+tracer = Tracer()
+
+
+def traced(cls):
+    """Class decorator opening a span around every public method of ``cls``."""
+    for name, attr in list(vars(cls).items()):
+        if name.startswith("_") or not callable(attr) or isinstance(attr, (staticmethod, classmethod, type)):
+            continue
+        setattr(cls, name, _traced_method(f"{cls.__name__}.{name}", attr))
+    return cls
+
+
+def _traced_method(span_name: str, func):
+    signature = inspect.signature(func)
+    recorded = [p for p in signature.parameters if p in ARGUMENT_ATTRIBUTES]
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not tracer.enabled:
+            return func(*args, **kwargs)
+        attributes = {}
+        if recorded:
+            try:
+                bound = signature.bind_partial(*args, **kwargs).arguments
+            except TypeError:
+                bound = {}
+            for param in recorded:
+                value = bound.get(param)
+                if isinstance(value, (int, str)):
+                    attributes[ARGUMENT_ATTRIBUTES[param]] = value
+        with tracer.span(span_name, **attributes):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def _http_span_middleware(request, send, **kwargs):
+    if not tracer.enabled or tracer._current.get() is None:
+        return send(request, **kwargs)
+    url = urlsplit(request.url)
+    with tracer.span(f"HTTP {request.method}", **{"http.method": request.method, "http.host": url.hostname or "",
+                                                    "http.path": url.path}) as span:
+        response = send(request, **kwargs)
+        span.attributes["http.status_code"] = response.status_code
+        return response
+
+
+if settings.TRACING_ENABLED:
+    tracer.enable()
@@ -0,0 +1,52 @@
+"""Process-wide hook into outbound HTTP traffic.
+
+PyGithub, python-gitlab and ``JulesClient`` all send through
+``requests.adapters.HTTPAdapter``, so middleware installed here sees every API
+call regardless of which client issued it. ``requests`` itself is only imported
+once the first middleware is installed, keeping it off the startup path.
+"""
+import threading
+from typing import Any, Callable, List, Tuple
+
+# A middleware receives the prepared request and a ``send`` callable that
+# continues down the chain; it returns the (possibly synthesized) response.
+Middleware = Callable[..., Any]
+
+_lock = threading.Lock()
+_middlewares: List[Tuple[int, Middleware]] = []
+_original_send = None
+
+
+def _patched_send(adapter, request, **kwargs):
+    chain = [m for _, m in _middlewares]
+
+    def call(index, req, **kw):
+        if index == len(chain):
+            return _original_send(adapter, req, **kw)
+        return chain[index](req, lambda r, **k: call(index + 1, r, **k), **kw)
+
+    return call(0, request, **kwargs)
+
+
+def install(middleware: Middleware, order: int = 0):
+    """Add a middleware; lower ``order`` runs first (further from the network)."""
+    global _original_send
+    from requests.adapters import HTTPAdapter
+
+    with _lock:
+        if any(m == middleware for _, m in _middlewares):
+            return
+        if _original_send is None:
+            _original_send = HTTPAdapter.send
+        _middlewares.append((order, middleware))
+        _middlewares.sort(key=lambda item: item[0])
+        HTTPAdapter.send = _patched_send  # type: ignore[method-assign]
+
+
+def uninstall(middleware: Middleware):
+    from requests.adapters import HTTPAdapter
+
+    with _lock:
+        _middlewares[:] = [(o, m) for o, m in _middlewares if m != middleware]
+        if not _middlewares and _original_send is not None:
+            HTTPAdapter.send = _original_send  # type: ignore[method-assign]
@@ -0,0 +1,29 @@
+import pytest
+from src.config import settings
+from tests.performance.fake_backends import FakeWorld, Scale
+
+
+@pytest.fixture
+def fake_world():
+    """Start fake backends for a ``Scale`` and point the settings at them.
+
+    Returns a factory, so a test can start one world per scale. GitHub request
+    throttling is off; the worlds are stopped and every setting is restored
+    after the test.
+    """
+    saved = settings.model_dump()
+    worlds = []
+
+    def start(scale: Scale = Scale(open_prs=0, ai_issues=0, active_sessions=0)) -> FakeWorld:
+        world = FakeWorld(scale)
+        worlds.append(world)
+        world.configure(settings)
+        settings.GITHUB_SECONDS_BETWEEN_REQUESTS = 0
+        settings.GITHUB_SECONDS_BETWEEN_WRITES = 0
+        return world
+
+    yield start
+    for world in worlds:
+        world.stop()
+    for key, value in saved.items():
+        setattr(settings, key, value)
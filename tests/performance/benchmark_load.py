@@ -0,0 +1,191 @@
+"""Load benchmark driving full ATO cycles against simulated backends.
+
+Usage (from the repository root):
+
+    PYTHONPATH=. python -m tests.performance.benchmark_load --prs 2000 --issues 1000 --sessions 200 --latency-ms 20
+
+Each run writes a JSON report (wall time, API calls per backend and endpoint,
+peak RSS and DB time per phase) to ``tests/performance/results/`` so runs can
+be compared over time with ``--compare <previous.json>``.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from dataclasses import asdict
+from typing import Any, Dict, List, Optional
+
+os.environ.setdefault("GITLAB_TOKEN", "benchmark")
+os.environ.setdefault("GITLAB_PROJECT_ID", "1")
+os.environ.setdefault("GITHUB_TOKEN", "benchmark")
+os.environ.setdefault("GITHUB_REPO", "org/repo")
+os.environ.setdefault("JULES_API_KEY", "benchmark")
+
+from src.config import settings  # noqa: E402
+from tests.performance.fake_backends import FakeWorld, Scale  # noqa: E402
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+PHASES = ("refresh_pr_mirror", "monitor_sessions", "delegate_tasks", "sync_github_to_gitlab", "sync_gitlab_closures",
+          "check_conflicts")
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is reported in kilobytes on Linux and bytes on macOS.
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _phase_timings(spans) -> Dict[str, Dict[str, float]]:
+    """Attribute wall time and Database.* span time to the top-level phase each span ran under."""
+    by_id = {s.span_id: s for s in spans}
+    wall: Dict[str, float] = {}
+    db: Dict[str, float] = defaultdict(float)
+    for span in spans:
+        if span.name in PHASES:
+            wall[span.name] = span.duration
+        if not span.name.startswith("Database."):
+            continue
+        parent = by_id.get(span.parent_id)
+        if parent is not None and parent.name.startswith("Database."):
+            continue  # Nested query already counted by its caller.
+        ancestor = parent
+        while ancestor is not None and ancestor.name not in PHASES:
+            ancestor = by_id.get(ancestor.parent_id)
+        db[ancestor.name if ancestor is not None else "setup"] += span.duration
+    return {"wall_time_s": {k: round(v, 4) for k, v in wall.items()},
+            "db_time_s": {k: round(v, 4) for k, v in db.items()}}
+
+
+def build_components(world: FakeWorld, db_path: str):
+    """Create the production components wired to the fake backends."""
+    from src.core.database import Database
+    from src.core.github_client import GitHubClient
+    from src.core.gitlab_client import GitLabClient
+    from src.core.jules_client import JulesClient
+    from src.logic.pr_mirror import PRMirror
+    from src.logic.pr_sync import PRSync
+    from src.logic.task_monitor import TaskMonitor
+
+    world.configure(settings)
+    db = Database(db_path)
+    world.populate(db)
+    gl_client, gh_client, jules_client = GitLabClient(), GitHubClient(), JulesClient()
+    pr_mirror = PRMirror(gh_client, db)
+    task_monitor = TaskMonitor(gl_client, gh_client, jules_client, db, pr_mirror=pr_mirror)
+    pr_sync = PRSync(gl_client, gh_client, db, state_file=os.path.join(os.path.dirname(db_path), "synced_prs.json"),
+                     pr_mirror=pr_mirror)
+    return db, task_monitor, pr_sync
+
+
+def run_benchmark(scale: Scale, cycles: int = 2, max_sessions: Optional[int] = None,
+                  github_throttle: bool = False) -> Dict[str, Any]:
+    from src.main import run_cycle
+    from src.utils.logger import logger
+    from src.utils.tracing import tracer
+
+    if max_sessions is not None:
+        settings.JULES_MAX_CONCURRENT_SESSIONS = max_sessions
+    if not github_throttle:
+        settings.GITHUB_SECONDS_BETWEEN_REQUESTS = 0
+        settings.GITHUB_SECONDS_BETWEEN_WRITES = 0
+    settings.TRACE_EXPORT_PATH = ""
+    settings.TRACE_SLOW_CYCLE_THRESHOLD = 0
+    settings.TRACE_MAX_SPANS_PER_CYCLE = 10_000_000
+    previous_level = logger.level
+    logger.setLevel("WARNING")
+    was_enabled = tracer.enabled
+    tracer.enable()
+
+    world = FakeWorld(scale)
+    report: Dict[str, Any] = {"scale": asdict(scale), "github_throttle": github_throttle, "cycles": []}
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            setup_start = time.perf_counter()
+            db, task_monitor, pr_sync = build_components(world, os.path.join(tmp, "ato.db"))
+            report["setup"] = {"wall_time_s": round(time.perf_counter() - setup_start, 4), "api_calls": world.call_totals()}
+
+            for index in range(cycles):
+                world.reset_calls()
+                start = time.perf_counter()
+                run_cycle(task_monitor, pr_sync)
+                elapsed = time.perf_counter() - start
+                report["cycles"].append({
+                    "cycle": index + 1,
+                    "wall_time_s": round(elapsed, 4),
+                    "api_calls": world.call_totals(),
+                    "api_calls_by_endpoint": world.calls(),
+                    "phases": _phase_timings(tracer.last_trace),
+                })
+            db.conn.close()
+    finally:
+        world.stop()
+        tracer.enabled = was_enabled
+        logger.setLevel(previous_level)
+
+    report["peak_rss_mb"] = round(_peak_rss_mb(), 1)
+    return report
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: Dict[str, Any], previous: Dict[str, Any]) -> List[str]:
+    lines = [f"Comparing against {previous.get('revision')} ({previous.get('timestamp')}):"]
+    for now, before in zip(current["cycles"], previous.get("cycles", [])):
+        lines.append(f"  cycle {now['cycle']}: wall {before['wall_time_s']:.3f}s -> {now['wall_time_s']:.3f}s")
+        for backend, calls in now["api_calls"].items():
+            lines.append(f"    {backend} calls: {before['api_calls'].get(backend, 0)} -> {calls}")
+    lines.append(f"  peak RSS: {previous.get('peak_rss_mb')} MB -> {current['peak_rss_mb']} MB")
+    return lines
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prs", type=int, default=2000, help="Open GitHub PRs")
+    parser.add_argument("--issues", type=int, default=1000, help="Open GitLab issues labelled AI")
+    parser.add_argument("--sessions", type=int, default=200, help="Active Jules sessions")
+    parser.add_argument("--files-per-pr", type=int, default=3)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Injected per-request latency")
+    parser.add_argument("--page-size", type=int, default=100, help="Maximum page size served by the fakes")
+    parser.add_argument("--cycles", type=int, default=2, help="Cycles to run (the first one is cold)")
+    parser.add_argument("--github-throttle", action="store_true",
+                        help="Keep PyGithub's request throttling (dominates wall time at scale)")
+    parser.add_argument("--max-sessions", type=int, default=None, help="Override JULES_MAX_CONCURRENT_SESSIONS")
+    parser.add_argument("--output", default=None, help="Report path (default: results/benchmark-<timestamp>.json)")
+    parser.add_argument("--compare", default=None, help="Previous report to compare against")
+    args = parser.parse_args(argv)
+
+    scale = Scale(open_prs=args.prs, ai_issues=args.issues, active_sessions=args.sessions,
+                  files_per_pr=args.files_per_pr, latency_ms=args.latency_ms, max_page_size=args.page_size)
+    report = run_benchmark(scale, cycles=args.cycles, max_sessions=args.max_sessions,
+                           github_throttle=args.github_throttle)
+    report["timestamp"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    report["revision"] = _git_revision()
+
+    output = args.output or os.path.join(RESULTS_DIR, f"benchmark-{time.strftime('%Y%m%dT%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    for cycle in report["cycles"]:
+        print(f"cycle {cycle['cycle']}: {cycle['wall_time_s']:.3f}s, api calls {cycle['api_calls']}, "
+              f"db time {cycle['phases']['db_time_s']}")
+    print(f"peak RSS: {report['peak_rss_mb']} MB")
+    if args.compare:
+        with open(args.compare) as f:
+            print("\n".join(compare(report, json.load(f))))
+    print(f"Report written to {output}")
+
+
+if __name__ == "__main__":
+    main()
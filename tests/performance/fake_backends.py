@@ -0,0 +1,628 @@
+"""In-process fake GitHub, GitLab and Jules HTTP servers for load and budget tests.
+
+Each backend is a real HTTP server on localhost so the production clients
+(PyGithub, python-gitlab and ``JulesClient``) run unmodified against it. Every
+request is counted per backend and per route template, latency can be injected,
+and list endpoints paginate the way the real APIs do.
+"""
+import base64
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlencode, urlsplit
+
+REPO = "org/repo"
+PROJECT_ID = "1"
+
+
+@dataclass
+class Scale:
+    open_prs: int = 50
+    ai_issues: int = 20
+    active_sessions: int = 5
+    files_per_pr: int = 3
+    notes_per_issue: int = 2
+    synced_fraction: float = 0.9
+    draft_fraction: float = 0.1
+    red_fraction: float = 0.05
+    conflicted_fraction: float = 0.02
+    latency_ms: float = 0.0
+    max_page_size: int = 100
+
+
+def git_blob_sha(content: bytes) -> str:
+    return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+
+
+Route = Tuple[str, "re.Pattern[str]", str, Callable]
+
+
+class FakeBackend:
+    """Threaded HTTP server dispatching to regex routes and counting calls."""
+
+    name = "backend"
+
+    def __init__(self, scale: Scale):
+        self.scale = scale
+        self.routes: List[Route] = []
+        self.calls: Counter = Counter()
+        self.last_authorization: Optional[str] = None
+        self.not_modified = 0
+        self._lock = threading.RLock()
+        backend = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def _dispatch(self):
+                backend._handle(self)
+
+            do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _dispatch
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def route(self, method: str, template: str, handler: Callable):
+        pattern = re.sub(r"\{(\w+)\}", r"(?P<\1>[^/]+)", template)
+        pattern = pattern.replace("(?P<path>[^/]+)", "(?P<path>.+)")
+        self.routes.append((method, re.compile(f"^{pattern}$"), template, handler))
+
+    def reset_calls(self):
+        with self._lock:
+            self.calls.clear()
+            self.not_modified = 0
+
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    def _handle(self, request: BaseHTTPRequestHandler):
+        parts = urlsplit(request.path)
+        query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        length = int(request.headers.get("Content-Length") or 0)
+        raw = request.rfile.read(length) if length else b""
+        body = json.loads(raw) if raw and "json" in (request.headers.get("Content-Type") or "") else None
+
+        for method, pattern, template, handler in self.routes:
+            match = pattern.match(parts.path)
+            if method == request.command and match:
+                with self._lock:
+                    self.calls[f"{method} {template}"] += 1
+                    self.last_authorization = request.headers.get("Authorization")
+                if self.scale.latency_ms:
+                    time.sleep(self.scale.latency_ms / 1000)
+                with self._lock:
+                    result = handler(request, {k: unquote(v) for k, v in match.groupdict().items()}, query, body)
+                status, payload, headers = result if len(result) == 3 else (*result, {})
+                self._respond(request, status, payload, headers)
+                return
+        with self._lock:
+            self.calls[f"{request.command} <unmatched>"] += 1
+        self._respond(request, 404, {"message": f"No fake route for {request.command} {parts.path}"}, {})
+
+    def _respond(self, request, status: int, payload: Any, headers: Dict[str, str]):
+        if isinstance(payload, bytes):
+            data, content_type = payload, "application/octet-stream"
+        else:
+            data, content_type = json.dumps(payload).encode("utf-8"), "application/json"
+        if request.command == "GET" and status == 200:
+            # Like GitHub and GitLab, answer a matching conditional GET with an empty 304.
+            etag = f'"{hashlib.sha1(data).hexdigest()}"'
+            headers = dict(headers, ETag=etag)
+            if request.headers.get("If-None-Match") == etag:
+                with self._lock:
+                    self.not_modified += 1
+                status, data = 304, b""
+        request.send_response(status)
+        request.send_header("Content-Type", content_type)
+        request.send_header("Content-Length", str(len(data)))
+        for key, value in headers.items():
+            request.send_header(key, value)
+        request.end_headers()
+        request.wfile.write(data)
+
+    def paginate(self, request, query, items: list, per_page_param: str, page_param: str, default_page_size: int):
+        """Slice ``items`` by page number and emit Link / X-Next-Page headers."""
+        per_page = min(int(query.get(per_page_param, default_page_size)), self.scale.max_page_size)
+        page = int(query.get(page_param, 1))
+        chunk = items[(page - 1) * per_page:page * per_page]
+        headers = {"X-Page": str(page), "X-Per-Page": str(per_page), "X-Total": str(len(items))}
+        if page * per_page < len(items):
+            next_query = dict(query, **{page_param: str(page + 1), per_page_param: str(per_page)})
+            next_url = f"{self.url}{urlsplit(request.path).path}?{urlencode(next_query)}"
+            headers["Link"] = f'<{next_url}>; rel="next"'
+            headers["X-Next-Page"] = str(page + 1)
+        return chunk, headers
+
+
+class FakeGitHub(FakeBackend):
+    name = "github"
+
+    def __init__(self, scale: Scale):
+        super().__init__(scale)
+        self.repo_url = f"{self.url}/repos/{REPO}"
+        self.pulls: Dict[int, Dict[str, Any]] = {}
+        self.files: Dict[int, List[Dict[str, Any]]] = {}
+        self.blobs: Dict[str, bytes] = {}
+        self.contents: Dict[Tuple[str, str], bytes] = {}
+        self.comments: Dict[int, List[Dict[str, Any]]] = {}
+        self.statuses: Dict[str, str] = {}
+        # Per PR, the head of every push in order and the file entries that push changed.
+        self.history: Dict[int, List[Tuple[str, Dict[str, Dict[str, Any]]]]] = {}
+        # GitHub App: JWTs must verify against this PEM key; minted tokens map to their expiry time.
+        self.app_public_key: Optional[str] = None
+        self.installation_tokens: Dict[str, float] = {}
+        self.token_lifetime = 3600
+        self._clock = 0
+        r = f"/repos/{REPO}"
+        self.route("GET", r, lambda *a: (200, self._repo()))
+        self.route("GET", f"{r}/pulls", self._list_pulls)
+        self.route("GET", f"{r}/pulls/{{number}}", lambda req, p, q, b: self._get_pull(int(p["number"])))
+        self.route("PATCH", f"{r}/pulls/{{number}}", self._edit_pull)
+        self.route("GET", f"{r}/pulls/{{number}}/files", self._list_files)
+        self.route("GET", f"{r}/commits/{{sha}}", lambda req, p, q, b: (200, self._commit(p["sha"])))
+        self.route("GET", f"{r}/commits/{{sha}}/status", self._combined_status)
+        self.route("GET", f"{r}/commits/{{sha}}/check-runs", self._check_runs)
+        self.route("GET", f"{r}/contents/{{path}}", self._get_contents)
+        self.route("GET", f"{r}/compare/{{basehead}}", self._compare)
+        self.route("GET", f"{r}/git/blobs/{{sha}}", self._get_blob)
+        self.route("GET", f"{r}/issues/{{number}}/comments", self._list_comments)
+        self.route("POST", f"{r}/issues/{{number}}/comments", self._create_comment)
+        self.route("GET", f"{r}/installation", lambda req, p, q, b: self._as_app(req, lambda: (200, {"id": 42})))
+        self.route("POST", "/app/installations/{id}/access_tokens",
+                   lambda req, p, q, b: self._as_app(req, self._mint_token))
+
+    def _as_app(self, request, respond: Callable):
+        import jwt
+        try:
+            jwt.decode(request.headers.get("Authorization", "").removeprefix("Bearer "), self.app_public_key,
+                       algorithms=["RS256"])
+        except (jwt.PyJWTError, ValueError):
+            return 401, {"message": "A JSON web token could not be decoded"}
+        return respond()
+
+    def _mint_token(self):
+        token = f"ghs_{hashlib.sha1(str(len(self.installation_tokens)).encode()).hexdigest()}"
+        self.installation_tokens[token] = time.time() + self.token_lifetime
+        expires_at = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.installation_tokens[token]))
+        return 201, {"token": token, "expires_at": expires_at}
+
+    def _tick(self) -> str:
+        self._clock += 1
+        return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(1_700_000_000 + self._clock))
+
+    def _repo(self):
+        owner, name = REPO.split("/")
+        return {"id": 1, "name": name, "full_name": REPO, "url": self.repo_url, "owner": {"login": owner}}
+
+    def _commit(self, sha: str):
+        return {"sha": sha, "url": f"{self.repo_url}/commits/{sha}"}
+
+    def add_pull(self, number: int, draft: bool = False, status: str = "success", mergeable: bool = True,
+                 files: int = 3, title: Optional[str] = None):
+        head_sha = hashlib.sha1(f"head-{number}-0".encode()).hexdigest()
+        self.pulls[number] = {
+            "number": number, "state": "open", "draft": draft, "title": title or f"Change {number}",
+            "url": f"{self.repo_url}/pulls/{number}", "issue_url": f"{self.repo_url}/issues/{number}",
+            "html_url": f"https://github.com/{REPO}/pull/{number}",
+            "head": {"sha": head_sha, "ref": f"feature-{number}"},
+            "base": {"sha": "b" * 40, "ref": "master"},
+            "mergeable": mergeable, "updated_at": self._tick(), "created_at": self._tick(),
+        }
+        self.statuses[head_sha] = status
+        self.comments[number] = []
+        self.files[number] = []
+        for i in range(files):
+            self.set_file(number, f"src/pr{number}/file{i}.py", f"print({number}, {i})\n".encode(), head_sha)
+        self.history[number] = [(head_sha, {})]
+
+    def push(self, number: int, changes: Dict[str, Optional[bytes]], force: bool = False) -> str:
+        """Push a commit to a PR changing ``changes`` (None deletes); ``force`` rewrites its history."""
+        pr = self.pulls[number]
+        old_sha = pr["head"]["sha"]
+        head_sha = hashlib.sha1(f"head-{number}-{sum(len(h) for h in self.history.values())}".encode()).hexdigest()
+        for entry in self.files[number]:
+            if (entry["filename"], old_sha) in self.contents:
+                self.contents[(entry["filename"], head_sha)] = self.contents[(entry["filename"], old_sha)]
+        known = {f["filename"] for f in self.files[number]}
+        changed = {}
+        for path, content in changes.items():
+            if content is None:
+                self.files[number] = [f for f in self.files[number] if f["filename"] != path]
+                changed[path] = {"filename": path, "status": "removed", "additions": 0, "deletions": 1, "changes": 1}
+                continue
+            self.set_file(number, path, content, head_sha, status="modified" if path in known else "added")
+            changed[path] = {"filename": path, "status": "modified" if path in known else "added",
+                             "sha": git_blob_sha(content), "additions": 1, "deletions": 0, "changes": 1}
+        if force:
+            self.history[number] = [(head_sha, changed)]
+        else:
+            self.history[number].append((head_sha, changed))
+        pr["head"]["sha"] = head_sha
+        pr["updated_at"] = self._tick()
+        self.statuses[head_sha] = "success"
+        return head_sha
+
+    def set_file(self, number: int, path: str, content: bytes, head_sha: str, status: str = "modified"):
+        sha = git_blob_sha(content)
+        self.blobs[sha] = content
+        self.contents[(path, head_sha)] = content
+        entries = [f for f in self.files[number] if f["filename"] != path]
+        entries.append({"filename": path, "status": status, "sha": sha, "additions": 1, "deletions": 0, "changes": 1})
+        self.files[number] = entries
+
+    def _public(self, pr):
+        return {k: v for k, v in pr.items() if not k.startswith("_")}
+
+    def _list_pulls(self, request, params, query, body):
+        state = query.get("state", "open")
+        pulls = [p for p in self.pulls.values() if state == "all" or p["state"] == state]
+        if query.get("sort") == "updated":
+            pulls.sort(key=lambda p: p["updated_at"], reverse=query.get("direction", "desc") == "desc")
+        else:
+            pulls.sort(key=lambda p: p["number"], reverse=True)
+        # The list endpoint never includes mergeability; PyGithub fetches it lazily.
+        listed = [{k: v for k, v in self._public(p).items() if k != "mergeable"} for p in pulls]
+        chunk, headers = self.paginate(request, query, listed, "per_page", "page", 30)
+        return 200, chunk, headers
+
+    def _get_pull(self, number: int):
+        if number not in self.pulls:
+            return 404, {"message": "Not Found"}
+        return 200, self._public(self.pulls[number])
+
+    def _edit_pull(self, request, params, query, body):
+        pr = self.pulls[int(params["number"])]
+        pr.update({k: v for k, v in (body or {}).items() if k in ("state", "title")})
+        pr["updated_at"] = self._tick()
+        return 200, self._public(pr)
+
+    def _list_files(self, request, params, query, body):
+        chunk, headers = self.paginate(request, query, self.files.get(int(params["number"]), []), "per_page", "page", 30)
+        return 200, chunk, headers
+
+    def _get_blob(self, request, params, query, body):
+        content = self.blobs.get(params["sha"])
+        if content is None:
+            return 404, {"message": "Not Found"}
+        return 200, {"sha": params["sha"], "size": len(content), "encoding": "base64",
+                     "content": base64.b64encode(content).decode(), "url": f"{self.repo_url}/git/blobs/{params['sha']}"}
+
+    def _compare(self, request, params, query, body):
+        base, head = params["basehead"].split("...")
+        for pushes in self.history.values():
+            shas = [sha for sha, _ in pushes]
+            if head not in shas:
+                continue
+            if base not in shas:
+                return 200, {"status": "diverged", "ahead_by": 1, "behind_by": 1, "files": [], "commits": []}
+            files: Dict[str, Dict[str, Any]] = {}
+            for _, changed in pushes[shas.index(base) + 1:shas.index(head) + 1]:
+                for path, entry in changed.items():
+                    if files.get(path, {}).get("status") == "added" and entry["status"] == "modified":
+                        continue
+                    files[path] = entry
+            return 200, {"status": "ahead", "ahead_by": shas.index(head) - shas.index(base), "behind_by": 0,
+                         "total_commits": shas.index(head) - shas.index(base), "files": list(files.values()),
+                         "commits": []}
+        return 404, {"message": "Not Found"}
+
+    def _combined_status(self, request, params, query, body):
+        state = self.statuses.get(params["sha"], "success")
+        statuses = [{"state": state, "context": "ci"}] if state != "success" else []
+        return 200, {"state": state, "total_count": len(statuses), "statuses": statuses, "sha": params["sha"]}
+
+    def _check_runs(self, request, params, query, body):
+        return 200, {"total_count": 0, "check_runs": []}
+
+    def _get_contents(self, request, params, query, body):
+        content = self.contents.get((params["path"], query.get("ref", "")))
+        if content is None:
+            return 404, {"message": "Not Found"}
+        return 200, {"type": "file", "encoding": "base64", "path": params["path"], "name": params["path"].split("/")[-1],
+                     "sha": git_blob_sha(content), "size": len(content), "content": base64.b64encode(content).decode()}
+
+    def _list_comments(self, request, params, query, body):
+        chunk, headers = self.paginate(request, query, self.comments.get(int(params["number"]), []), "per_page", "page", 30)
+        return 200, chunk, headers
+
+    def _create_comment(self, request, params, query, body):
+        number = int(params["number"])
+        comment = {"id": len(self.comments.get(number, [])) + 1, "body": (body or {}).get("body", ""),
+                   "user": {"login": "ato-bot"}}
+        self.comments.setdefault(number, []).append(comment)
+        if number in self.pulls:
+            self.pulls[number]["updated_at"] = self._tick()
+        return 201, comment
+
+
+class FakeGitLab(FakeBackend):
+    name = "gitlab"
+
+    def __init__(self, scale: Scale):
+        super().__init__(scale)
+        self.web_url = f"{self.url}/group/project"
+        self.issues: Dict[int, Dict[str, Any]] = {}
+        self.notes: Dict[int, List[Dict[str, Any]]] = {}
+        self.related_mrs: Dict[int, List[Dict[str, Any]]] = {}
+        self.merge_requests: Dict[int, Dict[str, Any]] = {}
+        self.branches: Dict[str, Dict[str, str]] = {"master": {}}
+        self.commits: List[Dict[str, Any]] = []
+        p = f"/api/v4/projects/{PROJECT_ID}"
+        self.route("GET", p, lambda *a: (200, {"id": int(PROJECT_ID), "web_url": self.web_url,
+                                               "path_with_namespace": "group/project", "default_branch": "master"}))
+        self.route("GET", f"{p}/issues", self._list_issues)
+        self.route("GET", f"{p}/issues/{{iid}}", self._get_issue)
+        self.route("GET", f"{p}/issues/{{iid}}/notes", self._list_notes)
+        self.route("GET", f"{p}/issues/{{iid}}/related_merge_requests", self._related_mrs)
+        self.route("GET", f"{p}/repository/files/{{path}}", self._get_file)
+        self.route("GET", f"{p}/repository/tree", self._tree)
+        self.route("POST", f"{p}/repository/branches", self._create_branch)
+        self.route("POST", f"{p}/repository/commits", self._create_commit)
+        self.route("GET", f"{p}/merge_requests", self._list_mrs)
+        self.route("GET", f"{p}/merge_requests/{{iid}}", self._get_mr)
+        self.route("POST", f"{p}/merge_requests", self._create_mr)
+        self.route("GET", "/group/project/uploads/{path}", lambda *a: (200, b"\x89PNG fake image bytes"))
+
+    def add_issue(self, iid: int, labels=("AI",), notes: int = 2):
+        self.issues[iid] = {
+            "id": 1000 + iid, "iid": iid, "project_id": int(PROJECT_ID), "title": f"Issue {iid}",
+            "description": f"Please implement feature {iid}.", "state": "opened", "labels": list(labels),
+            "created_at": "2024-01-01T00:00:00Z", "updated_at": "2024-01-02T00:00:00Z",
+        }
+        self.notes[iid] = [{"id": iid * 100 + n, "body": f"Note {n} on issue {iid}", "system": False,
+                            "author": {"name": "Reporter"}, "created_at": "2024-01-01T00:00:00Z"}
+                           for n in range(notes)]
+
+    def add_file(self, path: str, content: bytes, branch: str = "master"):
+        self.branches.setdefault(branch, {})[path] = git_blob_sha(content)
+
+    def _list_issues(self, request, params, query, body):
+        labels = set(filter(None, query.get("labels", "").split(",")))
+        items = [i for i in self.issues.values()
+                 if i["state"] == query.get("state", i["state"]) and labels <= set(i["labels"])]
+        chunk, headers = self.paginate(request, query, items, "per_page", "page", 20)
+        return 200, chunk, headers
+
+    def _get_issue(self, request, params, query, body):
+        issue = self.issues.get(int(params["iid"]))
+        return (200, issue) if issue else (404, {"message": "404 Not found"})
+
+    def _list_notes(self, request, params, query, body):
+        chunk, headers = self.paginate(request, query, self.notes.get(int(params["iid"]), []), "per_page", "page", 20)
+        return 200, chunk, headers
+
+    def _related_mrs(self, request, params, query, body):
+        return 200, self.related_mrs.get(int(params["iid"]), [])
+
+    def _get_file(self, request, params, query, body):
+        branch = self.branches.get(query.get("ref", "master"), {})
+        if params["path"] not in branch:
+            return 404, {"message": "404 File Not Found"}
+        content = b"# Guidelines\nBe nice.\n" if params["path"] == "AGENTS.md" else b"existing\n"
+        return 200, {"file_path": params["path"], "ref": query.get("ref"), "encoding": "base64",
+                     "content": base64.b64encode(content).decode(), "blob_id": branch[params["path"]]}
+
+    def _tree(self, request, params, query, body):
+        branch = self.branches.get(query.get("ref", "master"), {})
+        root = query.get("path", "").strip("/")
+        prefix = f"{root}/" if root else ""
+        entries: Dict[str, Dict[str, Any]] = {}
+        for path, blob_id in sorted(branch.items()):
+            if not path.startswith(prefix):
+                continue
+            name, _, rest = path[len(prefix):].partition("/")
+            if rest:
+                entries.setdefault(name, {"id": "t" * 40, "name": name, "type": "tree", "path": prefix + name,
+                                          "mode": "040000"})
+            else:
+                entries[name] = {"id": blob_id, "name": name, "type": "blob", "path": path, "mode": "100644"}
+        if root and not entries:
+            return 404, {"message": "404 Tree Not Found"}
+        chunk, headers = self.paginate(request, query, list(entries.values()), "per_page", "page", 20)
+        return 200, chunk, headers
+
+    def _create_branch(self, request, params, query, body):
+        name = body["branch"]
+        if name in self.branches:
+            return 400, {"message": "Branch already exists"}
+        self.branches[name] = dict(self.branches.get(body.get("ref", "master"), {}))
+        return 201, {"name": name, "commit": {"id": "c" * 40}}
+
+    def _create_commit(self, request, params, query, body):
+        if body.get("force"):
+            self.branches[body["branch"]] = dict(self.branches.get(body.get("start_branch", "master"), {}))
+        branch = self.branches.setdefault(body["branch"], {})
+        for action in body.get("actions", []):
+            if action["action"] == "delete":
+                branch.pop(action["file_path"], None)
+                continue
+            if action["action"] == "move":
+                branch.pop(action.get("previous_path"), None)
+            content = action.get("content") or ""
+            raw = base64.b64decode(content) if action.get("encoding") == "base64" else content.encode("utf-8")
+            branch[action["file_path"]] = git_blob_sha(raw)
+        self.commits.append(body)
+        return 201, {"id": hashlib.sha1(json.dumps(body, sort_keys=True).encode()).hexdigest(),
+                     "message": body.get("commit_message")}
+
+    def _list_mrs(self, request, params, query, body):
+        iids = {int(iid) for iid in parse_qs(urlsplit(request.path).query).get("iids[]", [])}
+        items = [mr for mr in self.merge_requests.values()
+                 if (not iids or mr["iid"] in iids) and query.get("state", "all") in ("all", mr["state"])
+                 and mr.get("updated_at", "") > query.get("updated_after", "")]
+        chunk, headers = self.paginate(request, query, items, "per_page", "page", 20)
+        return 200, chunk, headers
+
+    def _get_mr(self, request, params, query, body):
+        mr = self.merge_requests.get(int(params["iid"]))
+        return (200, mr) if mr else (404, {"message": "404 Not found"})
+
+    def _create_mr(self, request, params, query, body):
+        iid = len(self.merge_requests) + 1
+        mr = {"id": 5000 + iid, "iid": iid, "project_id": int(PROJECT_ID), "state": "opened",
+              "updated_at": "2024-01-02T00:00:00Z", **body}
+        self.merge_requests[iid] = mr
+        return 201, mr
+
+
+class FakeJules(FakeBackend):
+    name = "jules"
+
+    def __init__(self, scale: Scale):
+        super().__init__(scale)
+        self.sessions: Dict[str, Dict[str, Any]] = {}
+        self.activities: Dict[str, List[Dict[str, Any]]] = {}
+        self.messages: List[Tuple[str, str]] = []
+        # Session ID -> API key that created it; sessions without an owner are visible to every key.
+        self.owners: Dict[str, str] = {}
+        self.rate_limited_keys: set = set()
+        self.route("GET", "/v1alpha/sources", lambda *a: (200, {"sources": [
+            {"name": f"sources/github/{REPO}", "id": f"github/{REPO}"}]}))
+        self.route("GET", "/v1alpha/sessions", self._list_sessions)
+        self.route("POST", "/v1alpha/sessions", self._create_session)
+        self.route("GET", "/v1alpha/sessions/{sid}", self._get_session)
+        self.route("POST", "/v1alpha/sessions/{sid}:sendMessage", self._send_message)
+        self.route("GET", "/v1alpha/sessions/{sid}/activities", self._list_activities)
+
+    @property
+    def api_url(self) -> str:
+        return f"{self.url}/v1alpha"
+
+    def add_session(self, session_id: str, state: str = "IN_PROGRESS", activities: int = 3):
+        self.sessions[session_id] = {"name": f"sessions/{session_id}", "id": session_id, "state": state,
+                                     "title": f"Session {session_id}", "outputs": []}
+        self.activities[session_id] = []
+        for _ in range(activities):
+            self.add_activity(session_id)
+
+    def add_activity(self, session_id: str, kind: str = "progressUpdated"):
+        items = self.activities.setdefault(session_id, [])
+        n = len(items) + 1
+        items.append({"name": f"sessions/{session_id}/activities/a{n}", "id": f"a{n}",
+                      "createTime": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(1_700_000_000 + n)),
+                      kind: {"title": f"step {n}"}})
+
+    def complete(self, session_id: str, pr_number: int):
+        session = self.sessions[session_id]
+        session["state"] = "COMPLETED"
+        session["outputs"] = [{"pullRequest": {"url": f"https://github.com/{REPO}/pull/{pr_number}"}}]
+
+    def _token_page(self, query, items: list, key: str):
+        size = min(int(query.get("pageSize", 30)), self.scale.max_page_size)
+        start = int(query.get("pageToken") or 0)
+        payload = {key: items[start:start + size]}
+        if start + size < len(items):
+            payload["nextPageToken"] = str(start + size)
+        return payload
+
+    def _visible(self, request, session_id: str) -> bool:
+        owner = self.owners.get(session_id)
+        return owner is None or owner == request.headers.get("x-goog-api-key")
+
+    def _list_sessions(self, request, params, query, body):
+        sessions = [s for sid, s in self.sessions.items() if self._visible(request, sid)]
+        return 200, self._token_page(query, sessions, "sessions")
+
+    def _create_session(self, request, params, query, body):
+        api_key = request.headers.get("x-goog-api-key")
+        if api_key in self.rate_limited_keys:
+            return 429, {"error": {"code": 429, "status": "RESOURCE_EXHAUSTED"}}, {"Retry-After": "120"}
+        session_id = f"s{len(self.sessions) + 1}"
+        self.add_session(session_id, activities=0)
+        self.owners[session_id] = api_key
+        self.sessions[session_id]["prompt_size"] = len(json.dumps(body or {}))
+        return 200, self.sessions[session_id]
+
+    def _get_session(self, request, params, query, body):
+        session = self.sessions.get(params["sid"])
+        if session and not self._visible(request, params["sid"]):
+            return 403, {"error": {"code": 403, "status": "PERMISSION_DENIED"}}
+        return (200, session) if session else (404, {"error": {"code": 404}})
+
+    def _send_message(self, request, params, query, body):
+        if not self._visible(request, params["sid"]):
+            return 404, {"error": {"code": 404}}
+        self.messages.append((params["sid"], (body or {}).get("prompt", "")))
+        return 200, {}
+
+    def _list_activities(self, request, params, query, body):
+        if not self._visible(request, params["sid"]):
+            return 404, {"error": {"code": 404}}
+        return 200, self._token_page(query, self.activities.get(params["sid"], []), "activities")
+
+
+class FakeWorld:
+    """All three fake backends plus the data set they serve."""
+
+    def __init__(self, scale: Scale):
+        self.scale = scale
+        self.github = FakeGitHub(scale).start()
+        self.gitlab = FakeGitLab(scale).start()
+        self.jules = FakeJules(scale).start()
+        self.backends = [self.github, self.gitlab, self.jules]
+
+    def populate(self, db):
+        """Create the configured data set and the matching local database state."""
+        s = self.scale
+        self.gitlab.add_file("AGENTS.md", b"# Guidelines\nBe nice.\n")
+        for n in range(1, s.open_prs + 1):
+            self.github.add_pull(
+                n,
+                draft=n % 100 < s.draft_fraction * 100,
+                status="failure" if n % 100 >= 100 - s.red_fraction * 100 else "success",
+                mergeable=not (50 <= n % 100 < 50 + s.conflicted_fraction * 100),
+                files=s.files_per_pr,
+            )
+            if n % 100 < s.synced_fraction * 100 and n % 100 >= s.draft_fraction * 100:
+                db.add_synced_pr(n, n, head_sha=self.github.pulls[n]["head"]["sha"])
+                self.gitlab.merge_requests[n] = {"id": 5000 + n, "iid": n, "state": "opened",
+                                                 "updated_at": "2024-01-02T00:00:00Z"}
+        for iid in range(1, s.ai_issues + 1):
+            self.gitlab.add_issue(iid, notes=s.notes_per_issue)
+        for i in range(1, s.active_sessions + 1):
+            session_id = f"active{i}"
+            self.jules.add_session(session_id)
+            db.add_session(session_id, str(i), "gitlab_issue")
+
+    def configure(self, settings):
+        """Point the production clients at the fake servers."""
+        settings.GITHUB_API_URL = self.github.url
+        settings.GITHUB_REPO = REPO
+        settings.GITLAB_URL = self.gitlab.url
+        settings.GITLAB_PROJECT_ID = PROJECT_ID
+        settings.JULES_API_URL = self.jules.api_url
+
+    def reset_calls(self):
+        for backend in self.backends:
+            backend.reset_calls()
+
+    def calls(self) -> Dict[str, Dict[str, int]]:
+        return {b.name: dict(sorted(b.calls.items())) for b in self.backends}
+
+    def call_totals(self) -> Dict[str, int]:
+        return {b.name: b.total_calls() for b in self.backends}
+
+    def stop(self):
+        for backend in self.backends:
+            backend.stop()
+
@@ -0,0 +1,59 @@
+"""API-call budget gate: counts outbound calls per backend and endpoint during
+cycles against the fake backends and checks them against api_call_budget.json."""
+import json
+import os
+import tempfile
+import warnings
+import pytest
+from src.main import run_cycle
+from tests.performance.benchmark_load import build_components
+from tests.performance.fake_backends import FakeWorld, Scale
+
+BUDGET_FILE = os.path.join(os.path.dirname(__file__), "api_call_budget.json")
+
+with open(BUDGET_FILE) as f:
+    BUDGET = json.load(f)
+
+
+def _scale(scenario: str, point: dict) -> Scale:
+    if scenario == "sync_one_pr":
+        return Scale(open_prs=1, ai_issues=0, active_sessions=0, files_per_pr=point["files"], synced_fraction=0,
+                     draft_fraction=0, red_fraction=0, conflicted_fraction=0)
+    return Scale(open_prs=point["prs"], ai_issues=point["issues"], active_sessions=point["sessions"])
+
+
+def _limit(budget: dict, point: dict) -> float:
+    return budget.get("base", 0) + sum(coef * point[var] for var, coef in budget.items() if var != "base")
+
+
+def measure(world: FakeWorld, scenario: str) -> dict:
+    """Run the warm-up cycles, then return the calls made by one measured cycle."""
+    with tempfile.TemporaryDirectory() as tmp, warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        db, task_monitor, pr_sync = build_components(world, os.path.join(tmp, "ato.db"))
+        for _ in range(BUDGET["scenarios"][scenario]["warmup_cycles"]):
+            run_cycle(task_monitor, pr_sync)
+        world.reset_calls()
+        run_cycle(task_monitor, pr_sync)
+        db.conn.close()
+    return world.calls()
+
+
+@pytest.mark.parametrize("scenario", sorted(BUDGET["scenarios"]))
+def test_api_calls_within_budget(scenario, fake_world):
+    spec = BUDGET["scenarios"][scenario]
+    violations = []
+    for point in spec["points"]:
+        calls = measure(fake_world(_scale(scenario, point)), scenario)
+        for backend, budget in spec["backends"].items():
+            total = sum(calls.get(backend, {}).values())
+            if total > _limit(budget, point):
+                violations.append(f"{backend} at {point}: {total} calls > {_limit(budget, point):g} "
+                                  f"allowed; breakdown {calls.get(backend)}")
+        for backend, endpoints in spec.get("endpoints", {}).items():
+            for endpoint, budget in endpoints.items():
+                count = calls.get(backend, {}).get(endpoint, 0)
+                if count > _limit(budget, point):
+                    violations.append(f"{backend} {endpoint} at {point}: {count} calls > "
+                                      f"{_limit(budget, point):g} allowed")
+    assert not violations, "API-call budget exceeded:\n" + "\n".join(violations)
@@ -25,6 +25,8 @@ class TestSecurityFix(unittest.TestCase):
     def test_create_session_safe_logging(self, mock_get_source, mock_post, mock_settings):
         # Setup mocks
         mock_settings.JULES_API_KEY = "dummy_key"
+        mock_settings.JULES_API_KEYS = []
+        mock_settings.JULES_MAX_CONCURRENT_SESSIONS = 3
         mock_settings.GITHUB_REPO = "dummy_repo"
         mock_get_source.return_value = "sources/github/dummy_repo"
 
@@ -0,0 +1,70 @@
+from unittest.mock import MagicMock
+import pytest
+from src.core.database import Database
+from src.logic.activity_stream import ActivityStream
+
+def _activity(n, kind="progressUpdated"):
+    return {"id": f"a{n}", "createTime": f"2026-01-01T00:00:{n:02d}Z", kind: {"title": f"step {n}"}}
+
+@pytest.fixture
+def stream(tmp_path):
+    activities = []
+    pages_requested = []
+
+    def list_page(session_id, page_size=50, page_token=None):
+        pages_requested.append(page_token)
+        start = int(page_token) if page_token else 0
+        page = {"activities": activities[start:start + 2]}
+        if start + 2 < len(activities):
+            page["nextPageToken"] = str(start + 2)
+        return page
+
+    jules = MagicMock()
+    jules.list_activities_page.side_effect = list_page
+    db = Database(str(tmp_path / "ato.db"))
+    yield ActivityStream(jules, db), activities, pages_requested
+    db.conn.close()
+
+def test_poll_returns_only_new_activities_and_resumes_from_cursor(stream):
+    activity_stream, activities, pages_requested = stream
+    activities.extend(_activity(n) for n in range(5))
+    assert [a["id"] for a in activity_stream.poll("s1")] == ["a0", "a1", "a2", "a3", "a4"]
+
+    pages_requested.clear()
+    assert activity_stream.poll("s1") == []
+    # Only the last non-empty page is re-read.
+    assert pages_requested == ["4"]
+
+    activities.extend(_activity(n) for n in range(5, 8))
+    assert [a["id"] for a in activity_stream.poll("s1")] == ["a5", "a6", "a7"]
+    assert len(activity_stream.db.get_session_activities("s1")) == 8
+
+def test_rejected_cursor_rescans_without_duplicates(stream):
+    activity_stream, activities, _ = stream
+    activities.extend(_activity(n) for n in range(3))
+    activity_stream.poll("s1")
+    activities.append(_activity(3))
+
+    # The stored token has expired; the rescan from the first page succeeds.
+    original = activity_stream.jules_client.list_activities_page.side_effect
+    rejected = []
+
+    def expiring(session_id, page_size=50, page_token=None):
+        if page_token == "2" and not rejected:
+            rejected.append(page_token)
+            return None
+        return original(session_id, page_size, page_token)
+
+    activity_stream.jules_client.list_activities_page.side_effect = expiring
+    assert [a["id"] for a in activity_stream.poll("s1")] == ["a3"]
+
+def test_failure_and_stall_detection(stream):
+    activity_stream, activities, _ = stream
+    activities.append(_activity(0))
+    first = activity_stream.poll("s1")
+    assert not activity_stream.is_failed(first)
+    assert not activity_stream.is_stalled("s1")
+    assert activity_stream.is_stalled("s1", now=activity_stream.db.get_activity_cursor("s1")[3] + 24 * 3600)
+
+    activities.append(_activity(1, kind="sessionFailed"))
+    assert activity_stream.is_failed(activity_stream.poll("s1"))
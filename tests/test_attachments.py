@@ -0,0 +1,79 @@
+import base64
+import io
+import subprocess
+import sys
+from unittest.mock import patch
+import pytest
+from src.logic import attachments
+from src.logic.attachments import AttachmentProcessor, normalize_image
+
+def _png(size, pattern):
+    from PIL import Image
+    image = Image.new("RGB", size)
+    image.putdata([pattern(x, y) for y in range(size[1]) for x in range(size[0])])
+    out = io.BytesIO()
+    image.save(out, "PNG")
+    return out.getvalue()
+
+def _photo(x, y):
+    return ((x * 7 + y * 3) % 256, (x * y) % 256, (x ^ y) % 256)
+
+def test_large_images_are_downscaled_and_recompressed():
+    pytest.importorskip("PIL")
+    from PIL import Image
+    source = _png((1200, 600), _photo)
+    result = normalize_image(source, 400, "webp", 80)
+    assert result.mime_type == "image/webp"
+    assert Image.open(io.BytesIO(result.data)).size == (400, 200)
+    assert len(result.data) < len(source) / 3
+
+    # Flat graphics such as UI screenshots are re-encoded without loss.
+    flat = _png((64, 64), lambda x, y: (255, 255, 255) if x < 32 else (0, 0, 0))
+    result = normalize_image(flat, 400, "webp", 80)
+    assert Image.open(io.BytesIO(result.data)).convert("RGB").tobytes() == Image.open(io.BytesIO(flat)).tobytes()
+    graphics = normalize_image(_png((800, 800), lambda x, y: (0, 0, 0) if (x // 100 + y // 100) % 2 else (255, 0, 0)),
+                               400, "jpeg", 80)
+    assert graphics.mime_type == "image/png"
+
+def test_exif_orientation_is_applied_before_reencoding():
+    pytest.importorskip("PIL")
+    from PIL import Image
+    image = Image.new("RGB", (600, 300))
+    image.putdata([_photo(x, y) for y in range(300) for x in range(600)])
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Orientation: the camera was turned; rotate 90 degrees clockwise to view.
+    out = io.BytesIO()
+    image.save(out, "JPEG", exif=exif)
+    result = normalize_image(out.getvalue(), 400, "webp", 80)
+    assert Image.open(io.BytesIO(result.data)).size == (200, 400)
+
+def test_near_duplicates_and_budget():
+    pytest.importorskip("PIL")
+    big = _png((1200, 600), _photo)
+    # The same screenshot at another size has the same dHash.
+    smaller = _png((600, 300), lambda x, y: _photo(x * 2, y * 2))
+    other = _png((1200, 600), lambda x, y: (0, 0, 0) if x < 600 else _photo(x, y))
+    with patch.object(attachments.settings, "ATTACHMENT_MAX_DIMENSION", 400), \
+            patch.object(attachments.settings, "ATTACHMENT_WORKERS", 1):
+        processor = AttachmentProcessor()
+        prepared = processor.prepare([("/uploads/a.png", big), ("/uploads/b.png", smaller), ("/uploads/c.png", other)])
+        assert [(a["name"], a["mimeType"]) for a in prepared] == [("a.webp", "image/webp"), ("c.webp", "image/webp")]
+        # Cached by source hash: the pool is not needed again.
+        processor._pool.shutdown()
+        processor._pool = None
+        with patch.object(processor, "_executor", side_effect=AssertionError("not cached")):
+            assert processor.prepare([("/uploads/a.png", big)]) == prepared[:1]
+
+def test_without_pillow_images_pass_through_within_budget():
+    with patch.object(attachments, "PILLOW_AVAILABLE", False), \
+            patch.object(attachments.settings, "ATTACHMENT_PAYLOAD_BUDGET", 40):
+        prepared = AttachmentProcessor().prepare([
+            ("/uploads/a.png", b"a" * 12), ("/uploads/copy.png", b"a" * 12),
+            ("/uploads/huge.jpg", b"b" * 30), ("/uploads/c.gif", b"c" * 9)])
+    assert [(a["name"], a["mimeType"]) for a in prepared] == [("a.png", "image/png"), ("c.gif", "image/gif")]
+    assert base64.b64decode(prepared[0]["data"]) == b"a" * 12
+
+def test_pillow_is_only_imported_by_workers():
+    out = subprocess.run([sys.executable, "-c", "import sys, src.logic.attachments; print('PIL' in sys.modules)"],
+                         capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "False"
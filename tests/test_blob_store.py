@@ -0,0 +1,50 @@
+import pytest
+from src.config import settings
+from src.utils.blob_store import BlobStore, git_blob_sha
+from tests.performance.fake_backends import Scale
+
+@pytest.fixture
+def store(tmp_path):
+    blob_store = BlobStore()
+    blob_store.enable(str(tmp_path / "blobs"), 100)
+    yield blob_store
+    blob_store.disable()
+
+def test_blobs_are_fetched_by_sha_once(fake_world, tmp_path):
+    from src.core.github_client import GitHubClient
+    world = fake_world(Scale(open_prs=1, ai_issues=0, active_sessions=0))
+    settings.BLOB_STORE_PATH = str(tmp_path / "blobs")
+    from src.utils.blob_store import blob_store
+    blob_store.enable()
+    try:
+        world.github.add_pull(1, files=1)
+        f = world.github.files[1][0]
+        client = GitHubClient()
+        assert client.get_file_content(f["filename"], "ignored", sha=f["sha"]) == "print(1, 0)\n"
+        world.reset_calls()
+        # Served from disk, whichever path or ref the blob shows up under next.
+        assert client.get_file_content("renamed.py", "other", sha=f["sha"]) == "print(1, 0)\n"
+        assert world.github.total_calls() == 0
+    finally:
+        blob_store.disable()
+
+def test_least_recently_read_blobs_are_evicted(store, tmp_path):
+    blobs = {n: bytes([n]) * 10 for n in range(12)}
+    for n in range(10):
+        store.put(git_blob_sha(blobs[n]), blobs[n])
+    assert store.get(git_blob_sha(blobs[0])) == blobs[0]
+    store.put(git_blob_sha(blobs[10]), blobs[10])
+    store.put(git_blob_sha(blobs[11]), blobs[11])
+
+    assert store.get(git_blob_sha(blobs[1])) is None
+    assert store.get(git_blob_sha(blobs[2])) is None
+    assert store._size == 100
+    # Content that does not hash to its name is never stored.
+    store.put(git_blob_sha(b"real"), b"forged")
+    assert store.get(git_blob_sha(b"real")) is None
+
+    # A restart picks the blobs up from disk.
+    reopened = BlobStore()
+    reopened.enable(str(tmp_path / "blobs"), 100)
+    assert reopened.get(git_blob_sha(blobs[11])) == blobs[11]
+    assert reopened._size == 100
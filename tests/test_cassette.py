@@ -0,0 +1,77 @@
+import gzip
+import sqlite3
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import pytest
+import requests
+from unittest.mock import patch
+from src.utils.cassette import Cassette, CassetteMiss
+
+class _Handler(BaseHTTPRequestHandler):
+    hits = 0
+
+    def do_GET(self):
+        _Handler.hits += 1
+        body = f'{{"path": "{self.path}", "hit": {_Handler.hits}}}'.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def server():
+    httpd = HTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+@patch("src.utils.cassette.settings")
+def test_record_then_replay_offline(mock_settings, server, tmp_path):
+    mock_settings.GITLAB_TOKEN = "glpat-supersecret"
+    mock_settings.GITHUB_TOKEN = "ghp-supersecret"
+    mock_settings.JULES_API_KEY = "jules-supersecret"
+    path = str(tmp_path / "cassette.jsonl.gz")
+    db_path = tmp_path / "ato.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE marker (value TEXT)")
+    conn.execute("INSERT INTO marker VALUES ('recorded')")
+    conn.commit()
+    conn.close()
+
+    recorder = Cassette(path, "record")
+    recorder.start_recording(str(db_path))
+    try:
+        first = requests.get(f"{server}/issues?private_token=glpat-supersecret&page=1",
+                             headers={"PRIVATE-TOKEN": "glpat-supersecret"}).json()
+        second = requests.get(f"{server}/issues?page=1&private_token=glpat-supersecret").json()
+        recorder.mark_cycle()
+    finally:
+        recorder.close()
+
+    with gzip.open(path, "rt") as f:
+        assert "supersecret" not in f.read()
+
+    player = Cassette(path, "replay")
+    assert player.cycles == 1
+    player.start_replay()
+    try:
+        # Same requests in the same order get the same responses, without the server.
+        replayed = requests.get(f"{server}/issues?page=1&private_token=other-token").json()
+        assert replayed == {"path": "/issues?private_token=<redacted>&page=1", "hit": first["hit"]}
+        assert requests.get(f"{server}/issues?page=1&private_token=other-token").json()["hit"] == second["hit"]
+        with pytest.raises(CassetteMiss):
+            requests.get(f"{server}/issues?page=1")
+        with pytest.raises(CassetteMiss):
+            requests.get(f"{server}/never-recorded")
+    finally:
+        player.close()
+    assert _Handler.hits == 2
+
+    restored = sqlite3.connect(player.restore_database(str(tmp_path)))
+    assert restored.execute("SELECT value FROM marker").fetchone() == ("recorded",)
+    restored.close()
@@ -0,0 +1,49 @@
+from unittest.mock import patch
+import pytest
+from src.core.database import Database
+from src.logic.cycle_budget import CarryOver, CycleBudget, Deadline
+
+@pytest.fixture
+def db(tmp_path):
+    database = Database(str(tmp_path / "ato.db"))
+    yield database
+    database.conn.close()
+
+class StepDeadline(Deadline):
+    """Expires after a fixed number of checks."""
+    def __init__(self, checks):
+        super().__init__(0)
+        self.checks = checks
+
+    def expired(self):
+        self.checks -= 1
+        return self.checks < 0
+
+def test_phase_shares_reuse_unspent_time():
+    with patch("src.logic.cycle_budget.settings") as mock_settings:
+        mock_settings.CYCLE_PHASE_MIN_SECONDS = 5
+        budget = CycleBudget(100, {"a": 1, "b": 2, "c": 1})
+        assert budget.phase_deadline("a").seconds == pytest.approx(25, abs=0.1)
+        # "a" finished instantly, so its time is split between the remaining phases.
+        assert budget.phase_deadline("b").seconds == pytest.approx(100 * 2 / 3, abs=0.1)
+        budget.at -= 100
+        # An exhausted budget still leaves each phase its minimum.
+        assert budget.phase_deadline("c").seconds == 5
+
+def test_unfinished_items_are_carried_over_and_run_first(db):
+    carry_over = CarryOver(db)
+    processed = list(carry_over.iterate("check_conflicts", [1, 2, 3, 4], lambda n: n, StepDeadline(1)))
+    assert processed == [1, 2]
+    assert db.get_carry_over("check_conflicts") == ["3", "4"]
+
+    # Carried items lead the next cycle; items that disappeared are dropped.
+    processed = list(carry_over.iterate("check_conflicts", [1, 2, 4, 5], lambda n: n, StepDeadline(10)))
+    assert processed == [4, 1, 2, 5]
+    assert db.get_carry_over("check_conflicts") == []
+
+def test_first_item_runs_even_past_the_deadline(db):
+    carry_over = CarryOver(db)
+    assert list(carry_over.iterate("monitor_sessions", ["s1", "s2"], lambda s: s, StepDeadline(0))) == ["s1"]
+    assert db.get_carry_over("monitor_sessions") == ["s2"]
+    # Without a deadline every item runs in listing order.
+    assert list(carry_over.iterate("monitor_sessions", ["s1", "s2"], lambda s: s, None)) == ["s1", "s2"]
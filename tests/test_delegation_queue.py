@@ -0,0 +1,105 @@
+from datetime import datetime, timezone
+from unittest.mock import MagicMock, patch
+import pytest
+from src.core.database import Database
+from src.logic.delegation_queue import DelegationQueue
+from src.logic.task_monitor import TaskMonitor
+
+@pytest.fixture
+def db(tmp_path):
+    database = Database(str(tmp_path / "ato.db"))
+    yield database
+    database.conn.close()
+
+def test_queue_pops_by_key_and_survives_restart(db):
+    queue = DelegationQueue(db)
+    queue.push("gitlab_issue", "1", 5.0)
+    queue.push("gitlab_issue", "2", 1.0)
+    queue.push("github_pr", "7", 3.0, head_sha="abc")
+    queue.push("gitlab_issue", "2", 9.0)  # Re-keyed; the old heap entry goes stale.
+    queue.remove("gitlab_issue", "1")
+
+    restored = DelegationQueue(db)
+    assert len(restored) == 2
+    assert restored.head_sha(("github_pr", "7")) == "abc"
+    assert [queue.pop(), queue.pop(), queue.pop()] == [("github_pr", "7"), ("gitlab_issue", "2"), None]
+    assert db.get_work_queue() == []
+
+def _issue(iid, created_at, labels=()):
+    issue = MagicMock()
+    issue.iid = iid
+    issue.title = f"Issue {iid}"
+    issue.description = ""
+    issue.labels = list(labels)
+    issue.created_at = created_at
+    return issue
+
+def _monitor(db, issues, prs=(), active=0):
+    gl_client, gh_client, jules_client = MagicMock(), MagicMock(), MagicMock()
+    gl_client.get_open_ai_issues.return_value = issues
+    gl_client.has_open_mr.return_value = False
+    gl_client.get_issue_notes.return_value = []
+    gh_client.get_pull_requests.return_value = list(prs)
+    gh_client.get_pr_status.return_value = "failure"
+    jules_client.keys = [MagicMock()]
+    jules_client.get_active_sessions_count_from_api.return_value = active
+    jules_client.create_session.side_effect = lambda prompt, title, *a, **k: {"id": title}
+    return TaskMonitor(gl_client, gh_client, jules_client, db)
+
+@patch("src.logic.delegation_queue.settings")
+@patch("src.logic.task_monitor.settings")
+def test_delegates_by_priority_and_refills_finished_slots(monitor_settings, queue_settings, db):
+    monitor_settings.JULES_MAX_CONCURRENT_SESSIONS = 1
+    queue_settings.DELEGATION_AGE_WEIGHT = 1.0
+    queue_settings.DELEGATION_RED_PR_WEIGHT = 24.0
+    queue_settings.DELEGATION_LABEL_WEIGHTS = {"urgent": 200.0}
+    pr = MagicMock(number=9, title="Broken build", created_at=datetime(2024, 1, 1, 12, tzinfo=timezone.utc))
+    pr.head.sha = "deadbeef"
+    issues = [_issue(1, "2024-01-01T00:00:00Z"), _issue(2, "2024-01-05T00:00:00Z", ["urgent"])]
+    monitor = _monitor(db, issues, prs=[pr])
+
+    monitor.check_and_delegate_tasks()
+    # The urgent label outweighs age; the red PR counts as a day older than it is.
+    assert db.get_session_by_task(2, "gitlab_issue")
+    assert len(monitor.queue) == 2
+
+    # A cycle later nothing is re-evaluated: the PR status is cached by SHA.
+    monitor.jules_client.get_active_sessions_count_from_api.return_value = 1
+    monitor.check_and_delegate_tasks()
+    monitor.gh_client.get_pr_status.assert_called_once_with("deadbeef")
+
+    # The running session finishes; the freed slot goes to the red PR immediately.
+    monitor.jules_client.get_session.return_value = {"outputs": [{"pullRequest": {"number": 40}}]}
+    monitor.jules_client.get_active_sessions_count_from_api.return_value = 0
+    monitor.monitor_active_sessions()
+    assert db.get_session_by_task(9, "github_pr")
+    assert len(monitor.queue) == 1
+
+def test_restored_tasks_keep_their_place_until_listed(db):
+    queue = DelegationQueue(db)
+    queue.push("github_pr", "9", 0.0, head_sha="deadbeef")
+    queue.push("gitlab_issue", "1", 5.0)
+    monitor = _monitor(db, [])
+    issue = _issue(1, "2024-01-01T00:00:00Z")
+    monitor.queue.objects[("gitlab_issue", "1")] = issue
+
+    # The red PR was restored after a restart but not listed yet; the issue behind it still gets a slot.
+    monitor._delegate_from_queue(active_count=0)
+    assert db.get_session_by_task(1, "gitlab_issue")
+    assert ("github_pr", "9") in monitor.queue
+    assert db.get_work_queue() == [("github_pr", "9", 0.0, "deadbeef")]
+
+@patch("src.logic.delegation_queue.settings")
+def test_queued_issues_are_rekeyed_when_labels_change(queue_settings, db):
+    queue_settings.DELEGATION_AGE_WEIGHT = 1.0
+    queue_settings.DELEGATION_LABEL_WEIGHTS = {"urgent": 200.0}
+    issues = [_issue(1, "2024-01-01T00:00:00Z"), _issue(2, "2024-01-05T00:00:00Z")]
+    monitor = _monitor(db, issues)
+    monitor._refresh_issue_candidates()
+    assert monitor.queue.peek() == ("gitlab_issue", "1")
+
+    # A priority label added later moves the issue ahead, in memory and in the persisted queue.
+    issues[1].labels = ["urgent"]
+    monitor._refresh_issue_candidates()
+    assert monitor.queue.peek() == ("gitlab_issue", "2")
+    assert DelegationQueue(db).pop() == ("gitlab_issue", "2")
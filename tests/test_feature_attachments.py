@@ -9,6 +9,7 @@ class TestFeatureAttachments(unittest.TestCase):
         gl_client = MagicMock()
         gh_client = MagicMock()
         jules_client = MagicMock()
+        jules_client.keys = [MagicMock()]
         db = MagicMock()
 
         # Setup TaskMonitor
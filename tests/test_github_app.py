@@ -0,0 +1,73 @@
+import json
+import os
+import time
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from src.config import settings
+
+@pytest.fixture
+def app_world(fake_world, tmp_path):
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    (tmp_path / "app.pem").write_bytes(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                                         serialization.NoEncryption()))
+    world = fake_world()
+    world.github.app_public_key = key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo).decode()
+    settings.GITHUB_APP_ID = 7
+    settings.GITHUB_APP_PRIVATE_KEY_PATH = str(tmp_path / "app.pem")
+    settings.GITHUB_APP_INSTALLATION_ID = 0
+    settings.GITHUB_APP_TOKEN_CACHE_PATH = str(tmp_path / "token.json")
+    settings.GITHUB_APP_TOKEN_REFRESH_MARGIN = 300
+    return world
+
+def test_installation_token_is_minted_once_and_reused_after_restart(app_world, tmp_path):
+    from src.core.github_client import GitHubClient
+    github = app_world.github
+    GitHubClient().get_pr_comments(1).totalCount
+    assert github.calls["GET /repos/org/repo/installation"] == 1
+    assert github.calls["POST /app/installations/{id}/access_tokens"] == 1
+    (token,) = github.installation_tokens
+    assert github.last_authorization == f"token {token}"
+    assert os.stat(tmp_path / "token.json").st_mode & 0o777 == 0o600
+
+    github.reset_calls()
+    restarted = GitHubClient()
+    restarted.get_pr_comments(1).totalCount
+    assert github.calls["POST /app/installations/{id}/access_tokens"] == 0
+    assert github.last_authorization == f"token {token}"
+
+def test_token_is_refreshed_before_it_expires(app_world, tmp_path):
+    from src.core.github_client import GitHubClient
+    github = app_world.github
+    # Minted tokens already fall inside the refresh margin, so each request replaces the token.
+    github.token_lifetime = 120
+    client = GitHubClient()
+    first = github.last_authorization
+    client.get_pr_comments(1).totalCount
+    assert github.calls["POST /app/installations/{id}/access_tokens"] >= 2
+    assert github.last_authorization != first
+    assert json.loads((tmp_path / "token.json").read_text())["expires_at"] < time.time() + 300
+
+    # A failed refresh keeps using the current token while it is still valid.
+    github.app_public_key = None
+    client.get_pr_comments(1).totalCount
+    assert github.last_authorization.startswith("token ghs_")
+
+def test_conditional_cache_survives_token_refresh(app_world, tmp_path):
+    from src.core.github_client import GitHubClient
+    from src.utils.http_cache import http_cache
+    github = app_world.github
+    github.add_pull(1)
+    github.token_lifetime = 120
+    http_cache.enable(str(tmp_path / "http_cache.db"), 1024 * 1024)
+    try:
+        client = GitHubClient()
+        client.get_pr_comments(1).totalCount
+        first = github.last_authorization
+        client.get_pr_comments(1).totalCount
+        # A new installation token was used, and the stored response was still revalidated with a 304.
+        assert github.last_authorization != first
+        assert github.not_modified == 1
+    finally:
+        http_cache.disable()
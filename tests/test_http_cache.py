@@ -0,0 +1,67 @@
+from unittest.mock import patch
+import pytest
+import requests
+from src.utils.http_cache import HttpCache
+from src.utils.metrics import metrics
+from tests.performance.fake_backends import Scale
+
+@pytest.fixture
+def cache(tmp_path):
+    http_cache = HttpCache()
+
+    def enable(max_bytes=1024 * 1024):
+        http_cache.enable(str(tmp_path / "http_cache.db"), max_bytes)
+        return http_cache
+
+    yield enable
+    http_cache.disable()
+
+@pytest.fixture
+def world(fake_world):
+    return fake_world(Scale(open_prs=3, ai_issues=0, active_sessions=0))
+
+def test_github_reads_are_revalidated_with_304s(world, cache):
+    from src.core.github_client import GitHubClient
+    for n in (1, 2, 3):
+        world.github.add_pull(n)
+    cache()
+    client = GitHubClient()
+
+    first = [pr.number for pr in client.get_pull_requests()]
+    assert world.github.not_modified == 0
+    hits = metrics.get_counter("ato_http_cache_requests_total", {"backend": "github", "result": "not_modified"})
+
+    # Same data from a fresh client, served from the cache after a 304.
+    client = GitHubClient()
+    assert [pr.number for pr in client.get_pull_requests()] == first == [3, 2, 1]
+    assert world.github.not_modified == 2  # the repository and the PR listing
+    assert metrics.get_counter("ato_http_cache_requests_total",
+                               {"backend": "github", "result": "not_modified"}) == hits + 2
+
+    # A change produces a new ETag, so the full response is downloaded again.
+    world.github.add_pull(4)
+    assert [pr.number for pr in client.get_pull_requests()] == [4, 3, 2, 1]
+
+def test_least_recently_used_entries_are_evicted(cache):
+    http_cache = cache(max_bytes=200)
+
+    def send(request, **kwargs):
+        response = requests.Response()
+        response.status_code = 200
+        response.headers["ETag"] = '"v1"'
+        response._content = b"x" * 20
+        return response
+
+    def get(n):
+        http_cache.middleware(requests.Request("GET", f"https://api.github.com/r/{n}").prepare(), send)
+
+    with patch.object(http_cache, "_backend_of", return_value="github"):
+        for n in range(10):
+            get(n)
+        get(0)  # refreshed, so now the most recently used
+        get(10)
+        get(11)
+
+    cached = {row[0] for row in http_cache._conn.execute("SELECT url FROM http_cache")}
+    assert cached == {f"https://api.github.com/r/{n}" for n in (0, *range(3, 12))}
+    assert http_cache._size == 200
@@ -0,0 +1,86 @@
+from collections import Counter
+import pytest
+from src.config import settings
+from src.core.database import Database
+
+@pytest.fixture
+def pool_world(fake_world, tmp_path):
+    world = fake_world()
+    settings.JULES_API_KEY = "key-a"
+    settings.JULES_API_KEYS = ["key-b", "key-a"]
+    settings.JULES_MAX_CONCURRENT_SESSIONS = 2
+    database = Database(str(tmp_path / "ato.db"))
+    yield world, database
+    database.conn.close()
+
+def test_sessions_spread_over_keys_and_keep_their_owner(pool_world):
+    from src.core.jules_client import JulesClient
+    world, db = pool_world
+    client = JulesClient()
+    assert len(client.keys) == 2
+    assert client.get_active_sessions_count_from_api() == 0
+
+    sessions = [client.create_session("prompt", f"task {n}") for n in range(5)]
+    # Capacity is per key: two keys of two sessions each.
+    assert sessions[4] is None
+    assert Counter(world.jules.owners.values()) == {"key-a": 2, "key-b": 2}
+    for n, session in enumerate(sessions[:4]):
+        assert "key-" not in session["apiKeyId"]
+        db.add_session(session["id"], str(n), "gitlab_issue", api_key_id=session["apiKeyId"])
+
+    # After a restart the owners come from the database; a session polled with another key is not found.
+    restarted = JulesClient()
+    owned_by_b = next(sid for sid, owner in world.jules.owners.items() if owner == "key-b")
+    assert restarted.get_session(owned_by_b) is None
+    # The rejection came from a session request that fell back to the first key, which stays usable.
+    assert restarted.keys[0].healthy
+    restarted.assign_session_keys(db.get_session_api_keys())
+    assert all(restarted.get_session(session["id"]) for session in sessions[:4])
+    assert restarted.send_message(owned_by_b, "Please rebase.") is not None
+    assert restarted.get_active_sessions_count_from_api() == 4
+
+def test_rate_limited_key_is_set_aside(pool_world):
+    from src.core.jules_client import JulesClient
+    world, _ = pool_world
+    world.jules.rate_limited_keys.add("key-a")
+    client = JulesClient()
+    assert client.create_session("prompt", "first") is None
+    assert not client.keys[0].healthy
+
+    assert client.create_session("prompt", "second")
+    assert client.create_session("prompt", "third")
+    assert list(world.jules.owners.values()) == ["key-b", "key-b"]
+    # key-b is full and key-a cools down for the Retry-After period.
+    assert client.create_session("prompt", "fourth") is None
+    assert client.get_active_sessions_count_from_api() == 2
+
+def test_delegation_stops_while_every_key_cools_down(pool_world):
+    from unittest.mock import MagicMock
+    from src.core.jules_client import JulesClient
+    from src.logic.task_monitor import TaskMonitor
+    world, db = pool_world
+    client = JulesClient()
+    for key in client.keys:
+        key.cool_down("600")
+    gl_client, gh_client = MagicMock(), MagicMock()
+    issues = [MagicMock(iid=n, labels=[], created_at="2024-01-01T00:00:00Z") for n in range(1, 6)]
+    gl_client.get_open_ai_issues.return_value = issues
+    gh_client.get_pull_requests.return_value = []
+    monitor = TaskMonitor(gl_client, gh_client, client, db)
+
+    monitor.check_and_delegate_tasks()
+    # Nothing was prepared for a session no key could start, and every task keeps its place.
+    gl_client.has_open_mr.assert_not_called()
+    gl_client.get_file_content.assert_not_called()
+    assert len(monitor.queue) == 5
+    assert len(db.get_work_queue()) == 5
+    assert world.jules.calls["POST /v1alpha/sessions"] == 0
+
+    # The last free key is rate limited by the create request itself: the task stays queued.
+    world.jules.rate_limited_keys.update({"key-a", "key-b"})
+    client.keys[0].cooldown_until = 0.0
+    gl_client.has_open_mr.return_value = False
+    gl_client.get_issue_notes.return_value = []
+    monitor.check_and_delegate_tasks()
+    assert world.jules.calls["POST /v1alpha/sessions"] == 1
+    assert len(db.get_work_queue()) == 5
@@ -0,0 +1,44 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from src.utils.lazy import LazyClient
+
+class _Client:
+    def __init__(self):
+        time.sleep(0.05)
+
+    def ping(self):
+        return "pong"
+
+def test_lazy_client_builds_once_and_delegates():
+    built = []
+    lock = threading.Lock()
+
+    def factory():
+        with lock:
+            built.append(1)
+        return _Client()
+
+    client = LazyClient("test", factory)
+    assert not client.resolved
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        client.prefetch(executor)
+        results = list(executor.map(lambda _: client.ping(), range(4)))
+    assert results == ["pong"] * 4
+    assert built == [1]
+    assert client.init_seconds >= 0.05
+
+def test_lazy_client_retries_failed_init():
+    attempts = []
+
+    def factory():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ConnectionError("API unreachable")
+        return _Client()
+
+    client = LazyClient("test", factory)
+    with pytest.raises(ConnectionError):
+        client.ping()
+    assert client.ping() == "pong"
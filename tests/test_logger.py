@@ -0,0 +1,101 @@
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+from src.utils.logger import (ContextFilter, JsonFormatter, SamplingFilter, _QueueHandler, log_context,
+                              set_correlation_id)
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
+
+def _pipeline(name, burst=20, rate=50):
+    log_queue = queue.SimpleQueue()
+    handler = _QueueHandler(log_queue)
+    handler.addFilter(SamplingFilter(burst, rate))
+    handler.addFilter(ContextFilter())
+    log = logging.getLogger(name)
+    log.setLevel(logging.DEBUG)
+    log.propagate = False
+    log.addHandler(handler)
+    sink = ListHandler()
+    sink.setFormatter(JsonFormatter())
+    listener = logging.handlers.QueueListener(log_queue, sink)
+    return log, sink, listener
+
+def test_records_carry_cycle_and_correlation_ids():
+    log, sink, listener = _pipeline("ato.test.context")
+    with log_context(cycle_id=None, correlation_id=None):
+        with log_context(cycle_id="c1", phase="sync"):
+            set_correlation_id("github_pr:7")
+            log.info("Syncing PR %s", 7)
+            try:
+                raise ValueError("boom")
+            except ValueError:
+                log.exception("Failed")
+        log.info("outside")
+    listener.start()
+    listener.stop()
+
+    first, failure, outside = (json.loads(line) for line in sink.lines)
+    assert first["message"] == "Syncing PR 7"
+    assert (first["cycle_id"], first["phase"], first["correlation_id"]) == ("c1", "sync", "github_pr:7")
+    assert "ValueError: boom" in failure["exception"]
+    assert "cycle_id" not in outside and "correlation_id" not in outside
+
+def test_repetitive_messages_are_sampled_per_cycle():
+    log, sink, listener = _pipeline("ato.test.sampling", burst=3, rate=5)
+    with log_context(cycle_id="c1"):
+        for i in range(13):
+            log.debug("item %s", i, extra={"sample": True})
+            log.info("Syncing PR %s", i)
+        log.warning("kept")
+    with log_context(cycle_id="c2"):
+        log.debug("item again", extra={"sample": True})
+    listener.start()
+    listener.stop()
+
+    messages = [json.loads(line) for line in sink.lines]
+    sampled = [m for m in messages if not m["message"].startswith("Syncing")]
+    # Three in full, then every fifth, and warnings are never sampled.
+    assert [m["message"] for m in sampled] == ["item 0", "item 1", "item 2", "item 7", "item 12", "kept", "item again"]
+    assert sampled[3]["sampled"] == 5
+    # Messages not marked for sampling are all written.
+    assert len(messages) - len(sampled) == 13
+
+def test_threads_without_a_cycle_do_not_reset_the_cycle_counts():
+    log, sink, listener = _pipeline("ato.test.sampling_threads", burst=3, rate=5)
+
+    def worker():
+        log.debug("worker item", extra={"sample": True})
+
+    with log_context(cycle_id="c1"):
+        for i in range(13):
+            log.debug("item %s", i, extra={"sample": True})
+            # A new thread starts with an empty context, like the outbox workers.
+            thread = threading.Thread(target=worker)
+            thread.start()
+            thread.join()
+    listener.start()
+    listener.stop()
+
+    messages = [json.loads(line)["message"] for line in sink.lines]
+    assert [m for m in messages if m.startswith("item")] == ["item 0", "item 1", "item 2", "item 7", "item 12"]
+    assert messages.count("worker item") == 5
+
+def test_worker_processes_do_not_open_the_log_file(tmp_path):
+    from unittest.mock import patch
+    from src.utils import logger as logger_module
+    with patch.object(logger_module.settings, "LOG_DIR", str(tmp_path)):
+        parent_sinks = logger_module._sinks()
+        with patch("multiprocessing.parent_process", return_value=object()):
+            worker_sinks = logger_module._sinks()
+    assert any(isinstance(h, logging.handlers.RotatingFileHandler) for h in parent_sinks)
+    assert not any(isinstance(h, logging.handlers.RotatingFileHandler) for h in worker_sinks)
+    for handler in parent_sinks + worker_sinks:
+        handler.close()
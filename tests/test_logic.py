@@ -6,6 +6,7 @@ def test_task_monitor_delegation():
     gl_client = MagicMock()
     gh_client = MagicMock()
     jules_client = MagicMock()
+    jules_client.keys = [MagicMock()]
     db = MagicMock()
 
     issue = MagicMock()
@@ -25,7 +26,7 @@ def test_task_monitor_delegation():
     monitor.check_and_delegate_tasks()
 
     jules_client.create_session.assert_called()
-    db.add_session.assert_called_with("sess_1", "1", "gitlab_issue")
+    db.add_session.assert_called_with("sess_1", "1", "gitlab_issue", api_key_id=None)
 
 def test_pr_sync_create_vs_update(tmp_path):
     gl_client = MagicMock()
@@ -49,7 +50,7 @@ def test_pr_sync_create_vs_update(tmp_path):
     gh_client.get_file_content.return_value = "new content"
 
     gl_client.has_open_mr.return_value = False
-    gl_client.file_exists.return_value = True
+    gl_client.get_blob_ids.return_value = {"update.me": "old-blob"}
     gl_client.create_branch.return_value = True
     gl_client.commit_changes.return_value = True
 
@@ -63,4 +64,4 @@ def test_pr_sync_create_vs_update(tmp_path):
 
     args, kwargs = gl_client.commit_changes.call_args
     assert args[2][0]["action"] == "update"
-    db.add_synced_pr.assert_called_with(303, 101, None)
+    db.add_synced_pr.assert_called_with(303, 101, None, head_sha=pr.head.sha)
@@ -0,0 +1,50 @@
+import json
+import tracemalloc
+from unittest.mock import patch
+import pytest
+from src.utils.memory import MemoryProfiler
+
+@pytest.fixture
+def profiler(tmp_path):
+    with patch("src.utils.memory.settings") as mock_settings:
+        mock_settings.MEMORY_PROFILE_INTERVAL = 2
+        mock_settings.MEMORY_PROFILE_FRAMES = 1
+        mock_settings.MEMORY_PROFILE_TOP = 5
+        mock_settings.MEMORY_GROWTH_ALERT_BYTES = 5 * 1024 * 1024
+        mock_settings.MEMORY_REPORT_DIR = str(tmp_path)
+        memory_profiler = MemoryProfiler()
+        memory_profiler.enable()
+        yield memory_profiler
+        memory_profiler.disable()
+
+def test_growth_is_attributed_and_alerted(profiler, tmp_path):
+    leaked = []
+    profiler.after_cycle()
+    profiler.after_cycle()
+    assert len((tmp_path / "memory.jsonl").read_text().splitlines()) == 1
+
+    leaked.extend(bytearray(1024) for _ in range(10000))
+    profiler.after_cycle()
+    profiler.after_cycle()
+
+    reports = [json.loads(line) for line in (tmp_path / "memory.jsonl").read_text().splitlines()]
+    assert [report["cycle"] for report in reports] == [2, 4]
+    assert reports[1]["growth_bytes"] > 10 * 1000 * 1024
+    assert reports[1]["top_growth"][0]["location"].startswith(__file__)
+    dumps = list(tmp_path.glob("memory-*.tracemalloc"))
+    assert len(dumps) == 1
+    assert tracemalloc.Snapshot.load(str(dumps[0])).traces
+
+    # The alert re-arms from the new level, so holding on to the same memory does not alert again.
+    profiler.report()
+    assert len(list(tmp_path.glob("memory-*.tracemalloc"))) == 1
+    del leaked
+
+def test_tracked_objects_are_counted(profiler):
+    from src.utils.lazy import LazyClient
+    clients = [LazyClient(str(n), object) for n in range(50)]
+    profiler.report()
+    more = [LazyClient(str(n), object) for n in range(30)]
+    report = profiler.report()
+    assert report["objects"]["src.utils.lazy.LazyClient"]["diff"] >= 30
+    del clients, more
@@ -0,0 +1,67 @@
+import json
+import urllib.error
+import urllib.request
+from src.utils.metrics import MetricsRegistry, instrument_api, metrics, start_metrics_server
+
+def test_registry_renders_prometheus_text():
+    registry = MetricsRegistry()
+    registry.describe("ato_test_seconds", "histogram", "Test histogram.", buckets=(0.1, 1.0))
+    registry.observe("ato_test_seconds", 0.5, {"phase": "sync"})
+    registry.inc("ato_test_total", {"client": "github"})
+    registry.record_cache("source", True)
+    registry.record_cache("source", False)
+
+    text = registry.render()
+
+    assert 'ato_test_seconds_bucket{phase="sync",le="0.1"} 0' in text
+    assert 'ato_test_seconds_bucket{phase="sync",le="1.0"} 1' in text
+    assert 'ato_test_seconds_count{phase="sync"} 1' in text
+    assert 'ato_test_total{client="github"} 1.0' in text
+    assert 'ato_cache_hit_ratio{cache="source"} 0.5' in text
+
+def test_instrument_api_counts_calls_and_errors():
+    @instrument_api("fake")
+    class FakeClient:
+        def fetch(self):
+            return "ok"
+
+        def fail(self):
+            raise ValueError("boom")
+
+        def _private(self):
+            return "untouched"
+
+    client = FakeClient()
+    client.fetch()
+    try:
+        client.fail()
+    except ValueError:
+        pass
+
+    assert metrics.get_counter("ato_api_calls_total", {"client": "fake", "method": "fetch", "outcome": "success"}) == 1
+    assert metrics.get_counter("ato_api_calls_total", {"client": "fake", "method": "fail", "outcome": "error"}) == 1
+    assert metrics.get_histogram_count("ato_api_call_duration_seconds", {"client": "fake", "method": "_private"}) == 0
+
+def test_health_endpoints_report_cycle_lag():
+    server = start_metrics_server("127.0.0.1", 0)
+    port = server.server_address[1]
+    try:
+        metrics.last_cycle_completed_at = None
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/readyz")
+            assert False, "readiness should fail before the first cycle"
+        except urllib.error.HTTPError as e:
+            assert e.code == 503
+
+        with metrics.time_cycle():
+            pass
+
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/readyz") as response:
+            body = json.loads(response.read())
+        assert body["status"] == "ok"
+        assert body["cycle_lag_seconds"] < 5
+
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+            assert b"ato_cycle_duration_seconds_count" in response.read()
+    finally:
+        server.shutdown()
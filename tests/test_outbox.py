@@ -0,0 +1,73 @@
+from unittest.mock import MagicMock, patch
+import pytest
+from src.core.database import Database
+from src.core.outbox import Outbox
+from src.logic.pr_sync import PRSync
+
+@pytest.fixture
+def db(tmp_path):
+    database = Database(str(tmp_path / "ato.db"))
+    yield database
+    database.conn.close()
+
+@pytest.fixture(autouse=True)
+def fast_retries():
+    with patch("src.core.outbox.settings") as mock_settings:
+        mock_settings.OUTBOX_WORKERS = 2
+        mock_settings.OUTBOX_MAX_ATTEMPTS = 3
+        mock_settings.OUTBOX_RETRY_BASE_SECONDS = 0
+        mock_settings.OUTBOX_RETRY_MAX_SECONDS = 0
+        mock_settings.OUTBOX_POLL_INTERVAL = 0.01
+        yield
+
+def test_retries_until_delivered_and_deduplicates(db):
+    handler = MagicMock(side_effect=[ConnectionError("timeout"), None])
+    outbox = Outbox(db)
+    outbox.register("github.add_pr_comment", handler)
+
+    assert outbox.enqueue("github.add_pr_comment", {"pr_number": 1, "message": "hi"}, "comment:1")
+    assert not outbox.enqueue("github.add_pr_comment", {"pr_number": 1, "message": "hi"}, "comment:1")
+    assert outbox.drain(timeout=5)
+    assert handler.call_count == 2
+    handler.assert_called_with({"pr_number": 1, "message": "hi"})
+    # Delivered keys stay recorded, so the same write is never repeated.
+    assert not outbox.enqueue("github.add_pr_comment", {"pr_number": 1, "message": "hi"}, "comment:1")
+
+def test_gives_up_after_max_attempts_and_survives_restart(db):
+    outbox = Outbox(db)
+    outbox.register("github.close_pr", MagicMock(side_effect=RuntimeError("boom")))
+    outbox.enqueue("github.close_pr", {"pr_number": 5}, "close:5")
+    outbox.drain(timeout=5)
+    assert db.get_outbox_stats() == (0, None, 1)
+
+    # An entry claimed by a process that crashed mid-delivery is picked up again.
+    outbox.register("github.add_pr_comment", MagicMock())
+    outbox.enqueue("github.add_pr_comment", {"pr_number": 6, "message": "x"}, "comment:6")
+    db.claim_outbox_entries(float("inf"), 10)
+    restarted = Outbox(db)
+    handler = MagicMock()
+    restarted.register("github.add_pr_comment", handler)
+    restarted.start()
+    try:
+        for _ in range(200):
+            if handler.called:
+                break
+            restarted._wake.wait(0.01)
+    finally:
+        restarted.stop()
+    handler.assert_called_once_with({"pr_number": 6, "message": "x"})
+
+def test_pr_sync_closes_through_outbox(db, tmp_path):
+    gl_client, gh_client = MagicMock(), MagicMock()
+    gl_client.get_merge_requests.return_value = [MagicMock(iid=7, state="merged")]
+    db.add_synced_pr(42, 7)
+    outbox = Outbox(db)
+    outbox.register("github.close_pr", lambda p: gh_client.close_pr(p["pr_number"]))
+
+    sync = PRSync(gl_client, gh_client, db, state_file=str(tmp_path / "synced.json"), outbox=outbox)
+    sync.sync_gitlab_closures_to_github()
+    gh_client.close_pr.assert_not_called()
+    assert db.get_all_synced_prs() == {}
+
+    outbox.drain(timeout=5)
+    gh_client.close_pr.assert_called_once_with(42)
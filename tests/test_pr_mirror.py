@@ -0,0 +1,66 @@
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+import pytest
+from src.core.database import Database
+from src.logic.pr_mirror import PRMirror
+
+@pytest.fixture
+def db(tmp_path):
+    database = Database(str(tmp_path / "ato.db"))
+    yield database
+    database.conn.close()
+
+def _pr(number, minute, state="open", sha=None):
+    return SimpleNamespace(
+        number=number, state=state, draft=False, title=f"Change {number}", html_url=f"https://github.com/o/r/pull/{number}",
+        head=SimpleNamespace(sha=sha or f"sha{number}", ref=f"feature-{number}"), base=SimpleNamespace(sha="base"),
+        created_at=datetime(2024, 1, 1, tzinfo=timezone.utc),
+        updated_at=datetime(2024, 1, 1, 0, minute, tzinfo=timezone.utc),
+    )
+
+def test_incremental_refresh_stops_at_watermark(db):
+    gh_client = MagicMock()
+    gh_client.get_pull_requests.return_value = [_pr(1, 1), _pr(2, 2), _pr(3, 3)]
+    mirror = PRMirror(gh_client, db)
+    mirror.refresh()
+    assert [pr.number for pr in mirror.open_prs()] == [3, 2, 1]
+
+    consumed = []
+    def listing(**kwargs):
+        assert kwargs == {"state": "all", "sort": "updated", "direction": "desc"}
+        for pr in [_pr(2, 5, state="closed"), _pr(1, 4, sha="new"), _pr(3, 3), _pr(9, 0), _pr(8, 0)]:
+            consumed.append(pr.number)
+            yield pr
+    gh_client.get_pull_requests.side_effect = listing
+    mirror.refresh()
+
+    # The listing stops at PR 9, the first one older than the watermark.
+    assert consumed == [2, 1, 3, 9]
+    assert [(pr.number, pr.head.sha) for pr in mirror.open_prs()] == [(3, "sha3"), (1, "new")]
+
+def test_on_demand_fields_are_cached_until_the_pr_changes(db):
+    gh_client = MagicMock()
+    gh_client.get_pull_requests.return_value = [_pr(1, 1)]
+    gh_client.get_pull_request.return_value.mergeable = False
+    gh_client.get_pr_comments.return_value = [SimpleNamespace(body="first"), SimpleNamespace(body="last")]
+    mirror = PRMirror(gh_client, db)
+    mirror.refresh()
+
+    pr = mirror.open_prs()[0]
+    assert mirror.mergeable(pr) is False
+    assert mirror.comments(pr) == (2, "last")
+    mirror.record_ci_status(pr, "failure")
+
+    pr = mirror.open_prs()[0]
+    assert (mirror.mergeable(pr), mirror.comments(pr), pr.ci_status) == (False, (2, "last"), "failure")
+    assert gh_client.get_pull_request.call_count == 1
+    assert gh_client.get_pr_comments.call_count == 1
+
+    # A new push invalidates everything read on demand.
+    gh_client.get_pull_requests.side_effect = lambda **kwargs: iter([_pr(1, 9, sha="pushed")])
+    mirror.refresh()
+    pr = mirror.open_prs()[0]
+    assert (pr.mergeable, pr.comments_at, pr.ci_status) == (None, None, None)
+    mirror.mergeable(pr)
+    assert gh_client.get_pull_request.call_count == 2
@@ -0,0 +1,112 @@
+import pytest
+from src.core.database import Database
+from src.logic.pr_sync import PRSync
+from tests.performance.fake_backends import Scale, git_blob_sha
+
+@pytest.fixture
+def world(fake_world):
+    return fake_world(Scale(open_prs=1, ai_issues=0, active_sessions=0))
+
+@pytest.fixture
+def sync(world, tmp_path):
+    from src.core.github_client import GitHubClient
+    from src.core.gitlab_client import GitLabClient
+    db = Database(str(tmp_path / "ato.db"))
+    world.github.add_pull(1, files=3)
+    pr_sync = PRSync(GitLabClient(), GitHubClient(), db, state_file=str(tmp_path / "synced.json"))
+    pr_sync.sync_github_to_gitlab()
+    yield pr_sync
+    db.conn.close()
+
+def test_pushes_are_synced_as_a_delta(world, sync):
+    assert sync.db.get_synced_pr_heads() == {1: world.github.pulls[1]["head"]["sha"]}
+    commits = len(world.gitlab.commits)
+
+    # Nothing moved: no compare, no commit.
+    sync.sync_github_to_gitlab()
+    assert len(world.gitlab.commits) == commits
+
+    head = world.github.push(1, {"src/pr1/file0.py": b"fixed\n", "src/pr1/new.py": b"new\n", "src/pr1/file2.py": None})
+    world.reset_calls()
+    sync.sync_github_to_gitlab()
+
+    commit = world.gitlab.commits[-1]
+    assert "force" not in commit
+    assert sorted((a["action"], a["file_path"]) for a in commit["actions"]) == [
+        ("create", "src/pr1/new.py"), ("delete", "src/pr1/file2.py"), ("update", "src/pr1/file0.py")]
+    assert world.gitlab.branches["sync-gh-1"] == {
+        "src/pr1/file0.py": git_blob_sha(b"fixed\n"), "src/pr1/file1.py": git_blob_sha(b"print(1, 1)\n"),
+        "src/pr1/new.py": git_blob_sha(b"new\n")}
+    calls = world.calls()["github"]
+    assert calls["GET /repos/org/repo/compare/{basehead}"] == 1
+    assert calls["GET /repos/org/repo/git/blobs/{sha}"] == 2  # only the two changed files
+    assert "GET /repos/org/repo/pulls/{number}/files" not in calls
+    assert not any("repository/files" in call for call in world.calls()["gitlab"])  # no existence checks
+    assert sync.db.get_synced_pr_heads() == {1: head}
+
+def test_force_push_rebuilds_the_branch(world, sync):
+    world.github.push(1, {"src/pr1/file0.py": b"one\n"})
+    sync.sync_github_to_gitlab()
+    head = world.github.push(1, {"src/pr1/file1.py": b"rewritten\n"}, force=True)
+    sync.sync_github_to_gitlab()
+
+    commit = world.gitlab.commits[-1]
+    assert (commit["force"], commit["start_branch"]) == (True, "master")
+    assert sorted(a["file_path"] for a in commit["actions"]) == ["src/pr1/file0.py", "src/pr1/file1.py",
+                                                                 "src/pr1/file2.py"]
+    assert world.gitlab.branches["sync-gh-1"]["src/pr1/file1.py"] == git_blob_sha(b"rewritten\n")
+    assert sync.db.get_synced_pr_heads() == {1: head}
+
+def test_pushes_without_changes_are_recorded(world, sync):
+    commits = len(world.gitlab.commits)
+    # A fast-forward that touches no file (e.g. an empty commit) needs no commit and no rebuild.
+    head = world.github.push(1, {})
+    world.reset_calls()
+    sync.sync_github_to_gitlab()
+    assert len(world.gitlab.commits) == commits
+    assert "GET /repos/org/repo/pulls/{number}/files" not in world.calls()["github"]
+    assert sync.db.get_synced_pr_heads() == {1: head}
+
+    # A rebuild that finds every file already on the starting branch stores the head instead of retrying.
+    world.gitlab.branches["master"].update({f["filename"]: f["sha"] for f in world.github.files[1]})
+    head = world.github.push(1, {}, force=True)
+    sync.sync_github_to_gitlab()
+    assert len(world.gitlab.commits) == commits
+    assert sync.db.get_synced_pr_heads() == {1: head}
+    world.reset_calls()
+    sync.sync_github_to_gitlab()
+    assert "GET /repos/org/repo/pulls/{number}/files" not in world.calls()["github"]
+
+def test_unfetchable_files_keep_the_synced_head(world, sync):
+    synced = sync.db.get_synced_pr_heads()
+    commits = len(world.gitlab.commits)
+    head = world.github.push(1, {"src/pr1/file0.py": b"fixed\n", "src/pr1/file1.py": b"lost\n"})
+    del world.github.blobs[git_blob_sha(b"lost\n")]
+    sync.sync_github_to_gitlab()
+    # Committing only the fetched file would record a head the branch does not match.
+    assert len(world.gitlab.commits) == commits
+    assert sync.db.get_synced_pr_heads() == synced
+
+    world.github.blobs[git_blob_sha(b"lost\n")] = b"lost\n"
+    sync.sync_github_to_gitlab()
+    assert sorted(a["file_path"] for a in world.gitlab.commits[-1]["actions"]) == ["src/pr1/file0.py",
+                                                                                  "src/pr1/file1.py"]
+    assert sync.db.get_synced_pr_heads() == {1: head}
+
+def test_closures_are_found_with_one_listing(world, sync):
+    from src.logic.pr_sync import CLOSURES_WATERMARK_KEY
+    world.github.add_pull(2, files=1)
+    sync.sync_github_to_gitlab()
+    world.reset_calls()
+    sync.sync_gitlab_closures_to_github()
+    # The first pass looks the synced MRs up by IID; later passes list what changed since the watermark.
+    assert world.calls()["gitlab"] == {"GET /api/v4/projects/1/merge_requests": 1}
+    assert sync.db.get_state(CLOSURES_WATERMARK_KEY)
+
+    mr_iid = sync.db.get_all_synced_prs()[2]
+    world.gitlab.merge_requests[mr_iid].update(state="merged", updated_at="2999-01-01T00:00:00Z")
+    world.reset_calls()
+    sync.sync_gitlab_closures_to_github()
+    assert world.calls()["gitlab"] == {"GET /api/v4/projects/1/merge_requests": 1}
+    assert world.github.pulls[2]["state"] == "closed"
+    assert list(sync.db.get_all_synced_prs()) == [1]
@@ -0,0 +1,36 @@
+from unittest.mock import MagicMock, patch
+from src.logic.prompt_builder import PromptBuilder, compact_history, drop_repeated_quotes, estimate_tokens, strip_boilerplate
+
+def test_strips_boilerplate_and_repeated_quotes():
+    body = "Thanks!\n<!-- template: bug -->\n\n\n\nOn Mon, Alice wrote:\n> Steps to reproduce\n> New detail\n-- \nBob\nACME"
+    seen = {"steps to reproduce"}
+    assert drop_repeated_quotes(strip_boilerplate(body), seen) == "Thanks!\n\nOn Mon, Alice wrote:\n> New detail"
+    assert drop_repeated_quotes("On Mon, Alice wrote:\n> Steps to reproduce", seen) == ""
+
+def test_compacts_oldest_comments_first():
+    comments = [(f"user{i}", f"2024-01-0{i + 1}", f"comment {i} " + "x" * 2000) for i in range(5)]
+    history, reduced = compact_history(comments, max_tokens=1000)
+    assert estimate_tokens(history) <= 1000
+    assert reduced > 0
+    # The newest comment survives in full; the oldest are compacted or dropped.
+    assert comments[-1][2] in history
+    assert "(compacted)" in history or "earlier comment(s) omitted" in history
+
+@patch("src.logic.prompt_builder.settings")
+def test_prompt_respects_budget_and_caches_history_per_update(mock_settings):
+    mock_settings.PROMPT_MAX_TOKENS = 2000
+    mock_settings.PROMPT_GUIDELINES_MAX_TOKENS = 300
+    issue = MagicMock(iid=7, title="Long ticket", description="![shot](/uploads/a.png) Details", updated_at="2024-05-01T00:00:00Z")
+    load_comments = MagicMock(return_value=[("Ann", "2024-01-01", "y" * 20000), ("Ben", "2024-01-02", "Latest ![b](/uploads/b.png)")])
+    builder = PromptBuilder()
+
+    prompt, urls = builder.build_issue_prompt(issue, "G" * 50000, load_comments)
+    assert estimate_tokens(prompt) <= 2000
+    assert "Conversation History:" in prompt and "Comment by Ben" in prompt
+    assert urls == ["/uploads/a.png", "/uploads/b.png"]
+
+    assert builder.build_issue_prompt(issue, "G" * 50000, load_comments) == (prompt, urls)
+    load_comments.assert_called_once()
+    issue.updated_at = "2024-05-02T00:00:00Z"
+    builder.build_issue_prompt(issue, "G" * 50000, load_comments)
+    assert load_comments.call_count == 2
@@ -0,0 +1,108 @@
+import subprocess
+import sys
+from unittest.mock import MagicMock, patch
+import pytest
+import requests
+from src.core.gitlab_client import GitLabClient
+from src.main import phase
+from src.utils.metrics import metrics
+from src.utils.resilience import CircuitBreakers, CircuitOpenError, endpoint_class
+
+@pytest.fixture
+def breaker_settings():
+    with patch("src.utils.resilience.settings") as mock_settings:
+        mock_settings.GITHUB_API_URL = "https://api.github.com"
+        mock_settings.GITLAB_URL = "https://gitlab.com"
+        mock_settings.JULES_API_URL = "https://jules.googleapis.com/v1alpha"
+        mock_settings.HTTP_CONNECT_TIMEOUT = 5.0
+        mock_settings.HTTP_READ_TIMEOUT = 30.0
+        mock_settings.BREAKER_FAILURE_THRESHOLD = 2
+        mock_settings.BREAKER_BACKEND_FAILURE_THRESHOLD = 5
+        mock_settings.BREAKER_RESET_SECONDS = 0
+        yield mock_settings
+
+def _request(url):
+    return requests.Request("GET", url).prepare()
+
+def _response(status):
+    response = requests.Response()
+    response.status_code = status
+    return response
+
+def test_endpoint_class():
+    assert endpoint_class("/repos/o/r/pulls/1/files") == "pulls"
+    assert endpoint_class("/api/v4/projects/123/merge_requests/4") == "merge_requests"
+    assert endpoint_class("/v1alpha/sessions/9:sendMessage") == "sessions"
+    assert endpoint_class("/") == "root"
+
+def test_breaker_opens_fails_fast_and_recovers(breaker_settings):
+    breakers = CircuitBreakers()
+    send = MagicMock(side_effect=requests.exceptions.ConnectTimeout("slow"))
+    url = "https://api.github.com/repos/o/r/pulls"
+
+    for _ in range(2):
+        with pytest.raises(requests.exceptions.ConnectTimeout):
+            breakers.middleware(_request(url), send)
+    assert breakers.get("github", "pulls").state == "open"
+    # A bare read timeout gets the connect timeout added.
+    assert send.call_args.kwargs["timeout"] == (5.0, 30.0)
+
+    # Other endpoint classes of the same backend stay available.
+    send.side_effect = None
+    send.return_value = _response(200)
+    breakers.middleware(_request("https://api.github.com/repos/o/r/commits/abc/status"), send, timeout=10)
+    assert send.call_args.kwargs["timeout"] == (5.0, 10)
+
+    breakers.get("github", "pulls").reset_seconds = 3600
+    calls = send.call_count
+    with pytest.raises(CircuitOpenError):
+        breakers.middleware(_request(url), send)
+    assert send.call_count == calls
+    assert metrics.get_counter("ato_circuit_rejections_total", {"breaker": "github.pulls"}) >= 1
+
+    # Once the reset window passes a single trial request closes it again.
+    breakers.get("github", "pulls").reset_seconds = 0
+    assert breakers.middleware(_request(url), send).status_code == 200
+    assert breakers.get("github", "pulls").state == "closed"
+
+def test_server_errors_open_breaker_and_other_hosts_pass_through(breaker_settings):
+    breakers = CircuitBreakers()
+    send = MagicMock(return_value=_response(503))
+    url = "https://jules.googleapis.com/v1alpha/sessions"
+    breakers.middleware(_request(url), send)
+    breakers.middleware(_request(url), send)
+    assert breakers.get("jules", "sessions").state == "open"
+
+    send.return_value = _response(500)
+    for _ in range(5):
+        breakers.middleware(_request("https://example.com/image.png"), send)
+    assert send.call_args.kwargs == {}
+
+@patch("src.core.gitlab_client.gitlab.Gitlab")
+def test_transient_errors_are_not_swallowed(mock_gitlab):
+    mock_project = MagicMock()
+    mock_gitlab.return_value.projects.get.return_value = mock_project
+    client = GitLabClient()
+
+    mock_project.issues.get.side_effect = CircuitOpenError("Circuit gitlab is open")
+    with pytest.raises(CircuitOpenError):
+        client.has_open_mr(1)
+
+    mock_project.issues.get.side_effect = Exception("404 Not Found")
+    assert client.has_open_mr(1) is False
+
+def test_failing_phase_does_not_abort_the_cycle():
+    ran = []
+    before = metrics.get_counter("ato_phase_failures_total", {"phase": "sync"})
+    with phase("sync"):
+        raise CircuitOpenError("Circuit github is open")
+    with phase("monitor"):
+        ran.append("monitor")
+    assert ran == ["monitor"]
+    assert metrics.get_counter("ato_phase_failures_total", {"phase": "sync"}) == before + 1
+
+def test_startup_does_not_import_requests():
+    # Importing the entry point loads resilience and http_cache; requests stays off the startup path.
+    out = subprocess.run([sys.executable, "-c", "import sys, src.main; print('requests' in sys.modules)"],
+                         capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "False"
@@ -0,0 +1,73 @@
+import gzip
+import json
+import time
+from unittest.mock import patch
+import pytest
+from src.core.database import Database, SessionStatus
+from src.logic.retention import Retention
+
+DAY = 86400
+
+@pytest.fixture
+def db(tmp_path):
+    database = Database(str(tmp_path / "ato.db"))
+    yield database
+    database.conn.close()
+
+@pytest.fixture
+def retention_settings(tmp_path):
+    with patch("src.logic.retention.settings") as mock_settings:
+        mock_settings.RETENTION_DAYS = 30
+        mock_settings.RETENTION_INTERVAL = DAY
+        mock_settings.RETENTION_EXPORT_DIR = str(tmp_path / "archive")
+        mock_settings.RETENTION_VACUUM_PAGES = 100
+        yield mock_settings
+
+def test_old_terminal_sessions_are_archived(db, retention_settings, tmp_path):
+    now = time.time()
+    for session_id, task_id in (("old", "1"), ("recent", "2"), ("running", "3")):
+        db.add_session(session_id, task_id, "gitlab_issue", github_pr_id=int(task_id) + 10)
+    db.update_session_status("old", SessionStatus.COMPLETED)
+    db.update_session_status("recent", SessionStatus.FAILED)
+    db.conn.execute("UPDATE sessions SET created_at = ?, completed_at = ? WHERE session_id = 'old'",
+                    (now - 41 * DAY, now - 40 * DAY))
+    db.conn.execute("UPDATE sessions SET created_at = ? WHERE session_id = 'running'", (now - 90 * DAY,))
+    db.save_activities("old", [("a1", "2024-01-01T00:00:00Z", "progress", "Planning")], None, "a1", None, now)
+    db.conn.commit()
+
+    assert Retention(db).run_if_due(now) is True
+    assert Retention(db).run_if_due(now + 60) is False  # not due again until RETENTION_INTERVAL passes
+
+    assert sorted(row[0] for row in db.conn.execute("SELECT session_id FROM sessions")) == ["recent", "running"]
+    assert db.get_session_activities("old") == []
+    # The archive still stops the task from being delegated again and keeps its duration sample.
+    assert db.get_session_by_task("1", "gitlab_issue") == ("old", "completed")
+    assert db.get_gl_issue_id_by_gh_pr(11) == 1
+    assert db.get_session_duration_stats()["gitlab_issue"][0] == 1
+    with gzip.open(next((tmp_path / "archive").iterdir()), "rt") as f:
+        assert [json.loads(line)["activity_id"] for line in f] == ["a1"]
+
+def test_unresolvable_rows_are_pruned_and_the_database_compacted(db, retention_settings):
+    now = time.time()
+    db.add_synced_pr(1, 0)  # legacy row, PR closed since
+    db.add_synced_pr(2, 0)  # legacy row, PR still open
+    db.add_synced_pr(3, 7)
+    db.upsert_mirror_prs([
+        (2, "open", 0, "Open", None, "sha2", "b2", "base", None, "2020-01-01T00:00:00Z"),
+        (4, "closed", 0, "Old", None, "sha4", "b4", "base", None, "2020-01-01T00:00:00Z"),
+    ])
+    db.enqueue_outbox("done-old", "github.add_pr_comment", "{}", now - 40 * DAY)
+    db.enqueue_outbox("pending-old", "github.add_pr_comment", "{}", now - 40 * DAY)
+    db.conn.execute("UPDATE outbox SET status = 'done' WHERE idempotency_key = 'done-old'")
+    db.conn.execute("CREATE TABLE filler (data BLOB)")
+    db.conn.executemany("INSERT INTO filler VALUES (?)", [(b"x" * 4000,) for _ in range(200)])
+    db.conn.execute("DROP TABLE filler")
+    db.conn.commit()
+
+    Retention(db).run(now)
+
+    assert db.get_all_synced_prs() == {2: 0, 3: 7}
+    assert [row[0] for row in db.conn.execute("SELECT number FROM pr_mirror")] == [2]
+    assert [row[0] for row in db.conn.execute("SELECT idempotency_key FROM outbox")] == ["pending-old"]
+    assert db.conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2  # converted to incremental vacuum
+    assert db.conn.execute("PRAGMA freelist_count").fetchone()[0] == 0
@@ -0,0 +1,46 @@
+import sqlite3
+from unittest.mock import patch
+from src.core.database import Database, SessionStatus
+from src.logic.session_scheduler import SessionScheduler, poll_delay
+
+def test_migrates_old_sessions_table_and_reports_durations(tmp_path):
+    path = tmp_path / "ato.db"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE sessions (session_id TEXT PRIMARY KEY, task_id TEXT NOT NULL, task_type TEXT NOT NULL, "
+                 "github_pr_id INTEGER, gitlab_mr_id INTEGER, status TEXT NOT NULL)")
+    conn.execute("INSERT INTO sessions VALUES ('old', '1', 'gitlab_issue', NULL, NULL, 'active')")
+    conn.commit()
+    conn.close()
+
+    db = Database(str(path))
+    assert db.get_session_poll_schedule() == {"old": (None, None)}
+    with patch("src.core.database.time.time", return_value=1000.0):
+        db.add_session("s1", "2", "gitlab_issue")
+    with patch("src.core.database.time.time", return_value=1600.0):
+        db.update_session_status("s1", SessionStatus.COMPLETED)
+    assert db.get_session_duration_stats() == {"gitlab_issue": (1, 600.0, 600.0, 600.0)}
+    db.conn.close()
+
+@patch("src.logic.session_scheduler.settings")
+def test_polls_sparse_early_and_dense_near_expected_completion(mock_settings, tmp_path):
+    mock_settings.JULES_MAX_POLL_INTERVAL = 1800
+    mock_settings.JULES_ETA_MIN_SAMPLES = 1
+    assert poll_delay(0, 7200) == 1800
+    assert poll_delay(6000, 7200) == 600
+    assert poll_delay(8000, 7200) == 0
+
+    db = Database(str(tmp_path / "ato.db"))
+    with patch("src.core.database.time.time", return_value=0.0):
+        db.add_session("done", "1", "gitlab_issue")
+        db.add_session("running", "2", "gitlab_issue")
+    with patch("src.core.database.time.time", return_value=3000.0):
+        db.update_session_status("done", SessionStatus.COMPLETED)
+
+    scheduler = SessionScheduler(db)
+    scheduler.refresh()
+    assert scheduler.is_due("running", now=1000.0)
+    scheduler.schedule_next("running", "gitlab_issue", now=1000.0)
+    scheduler.refresh()
+    assert not scheduler.is_due("running", now=1500.0)
+    assert scheduler.is_due("running", now=2000.0)
+    db.conn.close()
@@ -0,0 +1,68 @@
+import json
+import time
+from unittest.mock import MagicMock, patch
+import pytest
+from src.logic.prompt_builder import PromptBuilder
+from src.utils.resilience import OPEN, CircuitBreakers
+from src.utils.snapshot import SNAPSHOT_VERSION, StateSnapshot
+
+@pytest.fixture
+def snapshot_settings():
+    with patch("src.utils.snapshot.settings") as mock_settings:
+        mock_settings.SNAPSHOT_INTERVAL = 300
+        mock_settings.SNAPSHOT_MAX_AGE = 3600
+        yield mock_settings
+
+@pytest.fixture
+def breaker_settings():
+    with patch("src.utils.resilience.settings") as mock_settings:
+        mock_settings.BREAKER_FAILURE_THRESHOLD = 1
+        mock_settings.BREAKER_BACKEND_FAILURE_THRESHOLD = 1
+        mock_settings.BREAKER_RESET_SECONDS = 60
+        yield mock_settings
+
+def test_caches_and_open_breakers_survive_a_restart(snapshot_settings, breaker_settings, tmp_path):
+    path = str(tmp_path / "state.json")
+    builder, breakers = PromptBuilder(), CircuitBreakers()
+    builder._history_cache[(7, "2026-01-01T00:00:00Z", 1000)] = ("history", ["https://x/a.png"])
+    breakers.get("github", "pulls").record_failure()
+    breakers.get("gitlab").record_success()
+    snapshot = StateSnapshot()
+    snapshot.register("prompt_history", builder.dump_state, builder.load_state)
+    snapshot.register("circuit_breakers", breakers.dump_state, breakers.load_state)
+    snapshot.save(path)
+
+    restored_builder, restored_breakers = PromptBuilder(), CircuitBreakers()
+    restarted = StateSnapshot()
+    restarted.register("prompt_history", restored_builder.dump_state, restored_builder.load_state)
+    restarted.register("circuit_breakers", restored_breakers.dump_state, restored_breakers.load_state)
+    # Twenty seconds pass between the shutdown and the next start.
+    with patch("src.utils.resilience.time.time", return_value=time.time() + 20):
+        assert restarted.load(path) == 2
+
+    history = restored_builder._history(MagicMock(iid=7, updated_at="2026-01-01T00:00:00Z"), "", 1000,
+                                        MagicMock(side_effect=AssertionError("notes refetched")))
+    assert history == ("history", ["https://x/a.png"])
+    breaker = restored_breakers.get("github", "pulls")
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    # The breaker keeps its remaining open time rather than starting a fresh period.
+    assert 35 < breaker.reset_seconds - (time.monotonic() - breaker.opened_at) <= 40
+    assert ("gitlab", "*") not in restored_breakers._breakers
+
+def test_stale_or_foreign_snapshots_are_ignored(snapshot_settings, tmp_path):
+    path = tmp_path / "state.json"
+    load = MagicMock()
+    snapshot = StateSnapshot()
+    snapshot.register("section", lambda: {}, load)
+
+    assert snapshot.load(str(path)) == 0
+    path.write_text(json.dumps({"version": SNAPSHOT_VERSION, "written_at": time.time() - 7200,
+                                "sections": {"section": {}}}))
+    assert snapshot.load(str(path)) == 0
+    path.write_text(json.dumps({"version": SNAPSHOT_VERSION + 1, "written_at": time.time(),
+                                "sections": {"section": {}}}))
+    assert snapshot.load(str(path)) == 0
+    path.write_text("{truncated")
+    assert snapshot.load(str(path)) == 0
+    load.assert_not_called()
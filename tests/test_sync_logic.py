@@ -1,6 +1,8 @@
 import unittest
 from unittest.mock import MagicMock, patch
 import os
+import tempfile
+from src.core.database import Database
 from src.logic.pr_sync import PRSync
 
 class TestSyncLogic(unittest.TestCase):
@@ -38,7 +40,7 @@ class TestSyncLogic(unittest.TestCase):
 
         # Mock GitLab
         self.mock_gl.has_open_mr.return_value = False
-        self.mock_gl.file_exists.return_value = True
+        self.mock_gl.get_blob_ids.return_value = {"src/main.py": "old-blob"}
         self.mock_gl.create_branch.return_value = True
         self.mock_gl.commit_changes.return_value = True
 
@@ -55,7 +57,7 @@ class TestSyncLogic(unittest.TestCase):
         self.assertEqual(kwargs["title"], "Sync: GL Issue #456: Fix bug")
 
         # Verify DB was updated
-        self.mock_db.add_synced_pr.assert_called_with(123, 789, 456)
+        self.mock_db.add_synced_pr.assert_called_with(123, 789, 456, head_sha="abcdef")
 
     def test_sync_github_to_gitlab_with_db_lookup(self):
         # Mock GitHub PR without ID in title
@@ -79,7 +81,7 @@ class TestSyncLogic(unittest.TestCase):
 
         # Mock GitLab
         self.mock_gl.has_open_mr.return_value = False
-        self.mock_gl.file_exists.return_value = True
+        self.mock_gl.get_blob_ids.return_value = {"src/main.py": "old-blob"}
         self.mock_gl.create_branch.return_value = True
         self.mock_gl.commit_changes.return_value = True
 
@@ -95,7 +97,7 @@ class TestSyncLogic(unittest.TestCase):
         self.assertIn("Closes #456", kwargs["description"])
 
         # Verify DB was updated
-        self.mock_db.add_synced_pr.assert_called_with(123, 789, 456)
+        self.mock_db.add_synced_pr.assert_called_with(123, 789, 456, head_sha="abcdef")
 
     def test_skip_sync_if_mr_exists(self):
         mock_pr = MagicMock()
@@ -122,6 +124,7 @@ class TestSyncLogic(unittest.TestCase):
         mock_file.filename = "deleted.txt"
         mock_file.status = "removed"
         self.mock_gh.get_pr_diff.return_value = [mock_file]
+        self.mock_gl.get_blob_ids.return_value = {"deleted.txt": "old-blob"}
 
         self.mock_gl.create_branch.return_value = True
         self.mock_gl.commit_changes.return_value = True
@@ -136,5 +139,55 @@ class TestSyncLogic(unittest.TestCase):
         self.assertEqual(actions[0]["action"], "delete")
         self.assertEqual(actions[0]["file_path"], "deleted.txt")
 
+    def test_identical_files_are_left_out_of_the_commit(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db = Database(os.path.join(tmp, "ato.db"))
+            sync = PRSync(self.mock_gl, self.mock_gh, db, state_file=self.state_file)
+            mock_pr = MagicMock()
+            mock_pr.number = 123
+            mock_pr.draft = False
+            mock_pr.title = "Test PR"
+            mock_pr.head.sha = "abcdef"
+            self.mock_gh.get_pull_requests.return_value = [mock_pr]
+
+            same = MagicMock(filename="src/same.py", status="modified", sha="blob1")
+            changed = MagicMock(filename="src/changed.py", status="modified", sha="blob2")
+            gone = MagicMock(filename="src/gone.py", status="removed")
+            self.mock_gh.get_pr_diff.return_value = [same, changed, gone]
+            self.mock_gl.get_blob_ids.return_value = {"src/same.py": "blob1", "src/changed.py": "old-blob"}
+            self.mock_gl.has_open_mr.return_value = False
+            self.mock_gl.create_branch.return_value = True
+            self.mock_gl.commit_changes.return_value = True
+            self.mock_gl.create_merge_request.return_value = MagicMock(iid=9)
+
+            sync.sync_github_to_gitlab()
+
+            actions = self.mock_gl.commit_changes.call_args[0][2]
+            self.assertEqual([(a["action"], a["file_path"]) for a in actions], [("update", "src/changed.py")])
+            self.mock_gh.get_file_content.assert_called_once_with("src/changed.py", "abcdef", sha="blob2")
+
+            # Nothing left to send: no branch, commit or MR.
+            identical = MagicMock(number=124, draft=False, title="Same PR")
+            identical.head.sha = "123456"
+            self.mock_gh.get_pull_requests.return_value = [identical]
+            self.mock_gl.reset_mock()
+            self.mock_gh.get_pr_diff.return_value = [same]
+            sync.sync_github_to_gitlab()
+            self.mock_gl.create_branch.assert_not_called()
+            self.mock_gl.commit_changes.assert_not_called()
+
+            # The decision is kept for that head: the next cycle does not list the PR's files again.
+            self.mock_gl.reset_mock()
+            self.mock_gh.get_pr_diff.reset_mock()
+            sync.sync_github_to_gitlab()
+            self.mock_gh.get_pr_diff.assert_not_called()
+            self.mock_gl.get_blob_ids.assert_not_called()
+
+            # A push makes the PR a candidate again.
+            identical.head.sha = "7890ab"
+            sync.sync_github_to_gitlab()
+            self.mock_gh.get_pr_diff.assert_called_once()
+            db.conn.close()
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,77 @@
+import json
+import pytest
+from unittest.mock import patch
+from src.utils import transport
+from src.utils.tracing import _http_span_middleware, traced, tracer
+
+@traced
+class FakeSync:
+    def sync_pr(self, pr_number: int):
+        return self.lookup(sha="abc123")
+
+    def lookup(self, sha: str):
+        return sha
+
+    def fail(self, issue_iid: int):
+        error = RuntimeError("boom")
+        error.response_code = 502
+        raise error
+
+@pytest.fixture
+def enabled_tracer():
+    tracer.enable()
+    yield tracer
+    tracer.enabled = False
+    transport.uninstall(_http_span_middleware)
+
+def _settings(mock_settings, tmp_path, **overrides):
+    mock_settings.TRACE_MAX_SPANS_PER_CYCLE = 1000
+    mock_settings.TRACE_EXPORT_FORMAT = "jsonl"
+    mock_settings.TRACE_EXPORT_PATH = str(tmp_path / "traces.jsonl")
+    mock_settings.TRACE_SLOW_CYCLE_THRESHOLD = 0
+    mock_settings.TRACE_SLOW_CYCLE_DIR = str(tmp_path / "slow")
+    for key, value in overrides.items():
+        setattr(mock_settings, key, value)
+
+@patch("src.utils.tracing.settings")
+def test_cycle_produces_span_tree_with_attributes(mock_settings, tmp_path, enabled_tracer):
+    _settings(mock_settings, tmp_path)
+
+    with enabled_tracer.cycle():
+        FakeSync().sync_pr(42)
+        with pytest.raises(RuntimeError):
+            FakeSync().fail(issue_iid=7)
+
+    spans = {s.name: s for s in enabled_tracer.last_trace}
+    root = spans["cycle"]
+    assert spans["FakeSync.sync_pr"].parent_id == root.span_id
+    assert spans["FakeSync.lookup"].parent_id == spans["FakeSync.sync_pr"].span_id
+    assert spans["FakeSync.sync_pr"].attributes == {"github.pr_number": 42}
+    assert spans["FakeSync.lookup"].attributes == {"git.sha": "abc123"}
+    assert spans["FakeSync.fail"].attributes["gitlab.issue_iid"] == 7
+    assert spans["FakeSync.fail"].attributes["http.status_code"] == 502
+
+    lines = (tmp_path / "traces.jsonl").read_text().splitlines()
+    assert len(lines) == 4
+    assert {json.loads(line)["trace_id"] for line in lines} == {root.trace_id}
+    assert not (tmp_path / "slow").exists()
+
+@patch("src.utils.tracing.settings")
+def test_slow_cycle_is_dumped_as_otlp(mock_settings, tmp_path, enabled_tracer):
+    _settings(mock_settings, tmp_path, TRACE_EXPORT_PATH="", TRACE_EXPORT_FORMAT="otlp",
+              TRACE_SLOW_CYCLE_THRESHOLD=0.000001)
+
+    with enabled_tracer.cycle():
+        FakeSync().sync_pr(1)
+
+    dumps = list((tmp_path / "slow").iterdir())
+    assert len(dumps) == 1
+    payload = json.loads(dumps[0].read_text())
+    spans = payload["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert {s["name"] for s in spans} == {"cycle", "FakeSync.sync_pr", "FakeSync.lookup"}
+
+def test_disabled_tracer_records_nothing():
+    assert tracer.enabled is False
+    assert FakeSync().sync_pr(1) == "abc123"
+    with tracer.cycle() as root:
+        assert root is None